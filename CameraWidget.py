@@ -1,14 +1,11 @@
-import queue
-import threading
 import time
 
 from PIL import Image
 import io
 
-import cv2
 from PyQt5.QtWidgets import *
-from PyQt5.QtGui import QImage, QPixmap, QIcon, QPainter, QPen
-from PyQt5.QtCore import QTimer, QSize, Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QIcon, QPainter, QPen, QColor
+from PyQt5.QtCore import QTimer, QSize, Qt, QThread, pyqtSignal, QRectF
 from datetime import datetime
 import base64
 from unidecode import unidecode
@@ -18,152 +15,13 @@ from queue import Queue
 import gc
 from display_image import *
 
-import os
 from pathlib import Path
 from Logging import Logger
 
-from yolo_engine import get_yolo_engine, safe_name
-from ffmpeg_capture import FFmpegCapture
-
-
-class VideoCapture:
-
-    def __init__(self, name, logger: Logger = None):
-        self.logger = logger
-        self.source = name
-        self.is_file = isinstance(name, str) and os.path.isfile(name)
-        self.cap = None
-        self.running = True
-        self._last_frame_ok_ts = 0.0
-        self._stall_timeout_sec = 5.0
-        self._reconnect_delay_sec = 2.0
-        self._reconnect_delay_max_sec = 30.0
-        self._ffmpeg: FFmpegCapture | None = None
-
-        # Nếu là RTSP và ffmpeg khả dụng: ưu tiên FFmpegCapture (ổn định 24/7)
-        if isinstance(self.source, str) and self.source.lower().startswith("rtsp") and FFmpegCapture.is_available():
-            try:
-                # target_width có thể set theo imgsz nếu bạn muốn; tạm dùng None để giữ nguyên
-                self._ffmpeg = FFmpegCapture(self.source, target_width=None, logger=self.logger)
-            except Exception as e:
-                self._ffmpeg = None
-                if self.logger:
-                    self.logger.warning(f"FFmpegCapture init failed, fallback OpenCV: {e}")
-
-        # Fallback OpenCV capture
-        if self._ffmpeg is None:
-            # mở kết nối lần đầu
-            self._open_capture()
-            self.q = queue.Queue(maxsize=1)
-            self._t = threading.Thread(target=self._reader, name=f"VideoReader-{self.source}", daemon=True)
-            self._t.start()
-        else:
-            self.q = None
-            self._t = None
-
-    # read frames as soon as they are available, keeping only most recent one
-    def _reader(self):
-        """
-        Vòng lặp đọc frame với cơ chế reconnect cho RTSP:
-        - Nếu mất kết nối (ret=False), thử mở lại sau một khoảng delay.
-        - Tránh break hẳn thread để RTSP tạm mất tín hiệu không làm crash app.
-        """
-        reconnect_delay = float(self._reconnect_delay_sec)
-        while self.running:
-            # đảm bảo cap đang mở; nếu không, thử mở lại
-            if self.cap is None or not self.cap.isOpened():
-                self._open_capture()
-                if self.cap is None or not self.cap.isOpened():
-                    time.sleep(reconnect_delay)
-                    reconnect_delay = min(reconnect_delay * 2.0, float(self._reconnect_delay_max_sec))
-                    continue
-
-            ret, frame = self.cap.read()
-            if not ret:
-                if self.logger:
-                    self.logger.warning(f"FAIL READ FRAME from {self.source}, try reconnect...")
-                else:
-                    print(f"FAIL READ FRAME from {self.source}, try reconnect...")
-                # đóng lại và chờ rồi reconnect
-                try:
-                    self.cap.release()
-                except Exception:
-                    pass
-                self.cap = None
-                time.sleep(reconnect_delay)
-                reconnect_delay = min(reconnect_delay * 2.0, float(self._reconnect_delay_max_sec))
-                continue
-            # reset backoff khi đã đọc được frame
-            reconnect_delay = float(self._reconnect_delay_sec)
-            self._last_frame_ok_ts = time.monotonic()
-
-            if not self.q.empty():
-                try:
-                    self.q.get_nowait()  # discard previous (unprocessed) frame
-                except queue.Empty:
-                    pass
-            self.q.put(frame)
-        
-            # Không check stall ở đây (vì vừa có frame OK); stall sẽ được phát hiện bởi nhánh read() fail/timeout.
-
-    def read(self):
-        if self._ffmpeg is not None:
-            return self._ffmpeg.read(timeout=0.5)
-        try:
-            return self.q.get(timeout=0.5)
-        except queue.Empty:
-            return None
-
-    def release(self):
-        try:
-            self.running = False
-            if self._ffmpeg is not None:
-                self._ffmpeg.release()
-                self._ffmpeg = None
-            if self.cap is not None:
-                self.cap.release()
-        finally:
-            if hasattr(self, '_t') and self._t is not None and self._t.is_alive():
-                try:
-                    self._t.join(timeout=0.2)
-                except Exception:
-                    pass
-
-    def _open_capture(self):
-        """Mở hoặc mở lại VideoCapture với cấu hình phù hợp (RTSP/USB/file)."""
-        try:
-            # Ưu tiên FFmpeg backend cho RTSP để ổn định hơn (nếu build OpenCV có FFmpeg)
-            if isinstance(self.source, str) and self.source.lower().startswith("rtsp"):
-                try:
-                    self.cap = cv2.VideoCapture(self.source, cv2.CAP_FFMPEG)
-                except Exception:
-                    self.cap = cv2.VideoCapture(self.source)
-            else:
-                self.cap = cv2.VideoCapture(self.source)
-
-            # set timeout nếu OpenCV build hỗ trợ (không phải build nào cũng có)
-            try:
-                self.cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 5000)
-            except Exception:
-                pass
-            try:
-                self.cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, 5000)
-            except Exception:
-                pass
-
-            if not self.is_file and self.cap is not None and self.cap.isOpened():
-                try:
-                    self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                except Exception:
-                    pass
-        except Exception as e:
-            if self.logger:
-                self.logger.error(f"Error opening capture {self.source}: {e}")
-            else:
-                print(f"Error opening capture {self.source}: {e}")
-            self.cap = None
-
-
+from yolo_engine import get_yolo_engine, safe_name, DetectionResult
+from video_capture import SEND_INTERVAL_TOLERANCE, VideoCapture, capture_fps_for
+from motion_gate import MotionGate
+from dataclasses import replace
 
 
 class CameraWidget(QWidget):
@@ -171,7 +29,9 @@ class CameraWidget(QWidget):
                  classes=["", "Helmet", "Fall", "No Helmet"], roi_check=[],
                  colors=[(0, 0, 255), (0, 255, 0), (255, 0, 0), (255, 0, 0)], is_fell_check=True, is_fire_check=False,
                  is_smoke_check=False,
-                 is_heltmet_check=False, is_jacket_check=False, timer_delay=10, parent=None, logger: Logger = None):
+                 is_heltmet_check=False, is_jacket_check=False, timer_delay=10, parent=None, logger: Logger = None,
+                 preprocess_in_capture=False, capture_fps=None, capture_mode="continuous",
+                 sparse_interval_sec=5.0, capture_process=False, capture_async=False, motion_gate=None):
         super().__init__(parent)
         self.frame_count = None
         self.camera_name = camera_name
@@ -202,14 +62,38 @@ class CameraWidget(QWidget):
         self.engine = get_yolo_engine()
 
         # Video capture riêng cho từng camera (thread nhẹ đọc frame)
-        self.video_capture = VideoCapture(camera_src, logger=self.logger)
-
         # Cờ và tham số điều phối FPS gửi vào YOLO
         self._infer_in_flight = False
         # Mặc định ưu tiên ổn định RTSP 24/7 cho 4–6 camera
         self._target_fps = 6.0  # tối đa 6 inference/giây cho mỗi camera
+        # rate_control của engine bật: fps do engine điều chỉnh theo latency/hàng đợi/hoạt động camera
+        self._target_fps = self.engine.camera_fps(self.camera_name) or self._target_fps
         self._infer_interval = 1.0 / self._target_fps
         self._last_sent_ts = 0.0
+        # motion gate: cảnh tĩnh thì không gửi YOLO, vẽ lại detections lần trước lên frame mới
+        self._motion_gate = MotionGate.from_config(motion_gate)
+        self._last_result: DetectionResult | None = None
+        # tracking: frame mới nhất đã hiển thị / frame đang inference (để vẽ box dự đoán giữa 2 lần inference)
+        self._latest_frame = None
+        self._latest_frame_ts = 0.0
+        self._sent_frame_ts = 0.0
+        self._motion_log_interval_sec = 300.0
+        self._last_motion_log_ts = time.monotonic()
+
+        # preprocess_in_capture: letterbox về img_size ngay trên thread capture (giảm tải thread inference)
+        # capture_fps: mặc định = fps cao nhất engine có thể yêu cầu (_target_fps, rate_control, escalation)
+        # x CAPTURE_FPS_HEADROOM -> chỉ decode số frame thực sự có thể gửi vào YOLO (cộng chút dư cho jitter)
+        # capture_mode keyframe/periodic: camera chỉ cần kiểm tra vài giây 1 lần
+        self.video_capture = VideoCapture(camera_src, logger=self.logger,
+                                          preprocess_size=self.img_size if preprocess_in_capture else None,
+                                          capture_fps=capture_fps or capture_fps_for(self.engine.max_camera_fps(self._target_fps)),
+                                          capture_mode=capture_mode,
+                                          sparse_interval_sec=sparse_interval_sec,
+                                          capture_process=capture_process,
+                                          capture_async=capture_async)
+        if capture_mode != "continuous":
+            # frame thưa -> nới ngưỡng NO SIGNAL theo chu kỳ lấy frame
+            self._signal_timeout_sec = max(self._signal_timeout_sec, 3.0 * float(sparse_interval_sec))
 
         # Log camera ID
         i = int(camera_src) if isinstance(camera_src, int) else camera_src
@@ -225,14 +109,15 @@ class CameraWidget(QWidget):
             'smoke': self.is_smoke_check
         }
 
-        # Nhận kết quả inference từ YoloEngine (broadcast, mỗi widget tự lọc theo camera_name)
-        self.engine.result_ready.connect(self._on_infer_result)
+        # Nhận kết quả inference từ kênh riêng của camera (1 kết quả chỉ đánh thức đúng 1 widget)
+        self.engine.channel(self.camera_name).detections_ready.connect(self._on_detections)
 
         # Timer để lấy frame mới và gửi request inference (đã throttle)
         self.frame_timer = QTimer(self)
         self.frame_timer.timeout.connect(self._on_frame_timer)
-        # 30 ms ~ 33 FPS đọc frame; inference vẫn bị giới hạn bởi _target_fps
-        self.frame_timer.start(30)
+        # 30 ms ~ 33 FPS đọc frame; inference vẫn bị giới hạn bởi _target_fps.
+        # keyframe/periodic: vài giây mới có 1 frame -> poll 200 ms (đọc không chờ, xem _on_frame_timer)
+        self.frame_timer.start(30 if capture_mode == "continuous" else 200)
 
         # UI warning display throttle: show at most once every 10 minutes
         self._last_ui_warn_ts = 0.0
@@ -383,8 +268,10 @@ class CameraWidget(QWidget):
 
     def _on_frame_timer(self):
         """Đọc frame mới và (nếu đủ điều kiện) gửi request inference vào YoloEngine."""
-        frame = self.video_capture.read()
-        if frame is None:
+        # không chờ trên GUI thread: camera keyframe / periodic / capture giảm fps thường chưa có frame mới,
+        # chờ ở đây sẽ treo UI (cộng dồn theo số camera) -> tick sau đọc lại
+        prepared = self.video_capture.read_prepared(timeout=0)
+        if prepared is None:
             # nếu quá timeout thì báo mất tín hiệu
             now_ts = time.monotonic()
             if self._last_frame_ts <= 0 or (now_ts - self._last_frame_ts) > float(self._signal_timeout_sec):
@@ -397,12 +284,23 @@ class CameraWidget(QWidget):
             self._set_signal_state(True)
 
         now_ts = time.monotonic()
-        if (not self._infer_in_flight) and (now_ts - self._last_sent_ts >= self._infer_interval):
-            self._infer_in_flight = True
+        # ring clip pre/post-roll (bỏ qua nhanh nếu chưa tới lượt record_fps)
+        self.engine.record_frame(self.camera_name, prepared.frame, now_ts)
+        adaptive_fps = self.engine.camera_fps(self.camera_name, self._target_fps)
+        if adaptive_fps:
+            self._infer_interval = 1.0 / adaptive_fps
+        if (not self._infer_in_flight) and (now_ts - self._last_sent_ts >= self._infer_interval * SEND_INTERVAL_TOLERANCE):
             self._last_sent_ts = now_ts
+            if self._motion_gate is not None and self._last_result is not None:
+                self._log_motion_stats(now_ts)
+                if not self._motion_gate.should_infer(prepared.frame):
+                    self._show_predicted(prepared.frame, now_ts)
+                    return
+            self._infer_in_flight = True
+            self._sent_frame_ts = now_ts
             self.engine.request_inference(
                 camera_name=self.camera_name,
-                frame=frame,
+                frame=prepared.frame,
                 model_path=self.yolo_model_path,
                 img_size=self.img_size,
                 yolo_rate=self.yolo_rate,
@@ -411,26 +309,106 @@ class CameraWidget(QWidget):
                 colors=self.colors,
                 enable_flags=self.enable_flags,
                 logger=self.logger,
+                prepared=prepared,
             )
+        else:
+            # frame không gửi inference: vẽ box track dự đoán -> hiển thị không đứng hình giữa 2 lần inference
+            self._show_predicted(prepared.frame, now_ts, keep_last=False)
 
-    def _on_infer_result(self, camera_name: str, q_image: QImage, is_warning: bool, meta: dict):
-        """Nhận kết quả inference từ YoloEngine (broadcast cho tất cả camera)."""
-        if camera_name != self.camera_name:
+    def _show_predicted(self, frame, now_ts: float, keep_last: bool = True):
+        """
+        Vẽ frame với box các track dự đoán tới now_ts. Tắt tracking / không còn track sống: keep_last=True
+        thì dùng lại detections lần trước (motion gate), ngược lại giữ nguyên ảnh đang hiển thị.
+        """
+        result = self.engine.predicted_result(self.camera_name, frame, now_ts)
+        if result is None:
+            if not keep_last or self._last_result is None:
+                return
+            result = replace(self._last_result, frame=frame, meta=dict(self._last_result.meta, reused=True))
+        self._latest_frame = frame
+        self._latest_frame_ts = now_ts
+        self.image_label.setPixmap(self._render_result(result))
+
+    def _on_detections(self, result: DetectionResult):
+        """Nhận DetectionResult của camera này từ YoloEngine."""
+        if result.camera_name != self.camera_name:
             return
 
         self._infer_in_flight = False
-        self.is_warning = is_warning
+        self._last_result = result
+        self.is_warning = result.is_warning
+
+        shown = result
+        if self._latest_frame is not None and self._latest_frame_ts > self._sent_frame_ts:
+            # đã hiển thị frame mới hơn frame vừa inference -> không quay lại frame cũ,
+            # vẽ track (đã cập nhật theo kết quả này) lên frame mới nhất
+            predicted = self.engine.predicted_result(self.camera_name, self._latest_frame)
+            if predicted is not None:
+                shown = predicted
+        self.image_label.setPixmap(self._render_result(shown))
+
+        # Cập nhật cảnh báo trên UI (giữ cơ chế cooldown)
+        self._on_warning_changed(result.is_warning)
 
-        # Cập nhật hình ảnh với giữ tỉ lệ và smoothing cho UI đẹp hơn
-        pix = QPixmap.fromImage(q_image).scaled(
+    def motion_stats(self) -> dict:
+        """Số frame motion gate đã kiểm tra / bỏ qua (skip rate); {} nếu không bật gate."""
+        return self._motion_gate.stats() if self._motion_gate is not None else {}
+
+    def _log_motion_stats(self, now_ts: float):
+        if now_ts - self._last_motion_log_ts < self._motion_log_interval_sec:
+            return
+        self._last_motion_log_ts = now_ts
+        stats = self._motion_gate.stats()
+        if self.logger:
+            self.logger.info(f"{self.camera_name}: motion gate skipped {stats['skipped']}/{stats['checked']} "
+                             f"({stats['skip_rate'] * 100:.0f}%)")
+
+    def _render_result(self, result: DetectionResult) -> QPixmap:
+        """
+        Scale frame BGR về kích thước label (không convert RGB / deep copy full-frame),
+        sau đó vẽ box + label bằng QPainter ở độ phân giải hiển thị.
+        """
+        frame = result.frame
+        h, w = frame.shape[:2]
+        if hasattr(QImage, "Format_BGR888"):
+            q_image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888)
+        else:
+            q_image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_RGB888).rgbSwapped()
+        # scaled() tạo ảnh mới (nhỏ) nên không còn tham chiếu tới buffer numpy của frame
+        pix = QPixmap.fromImage(q_image.scaled(
             self.image_label.size(),
             Qt.KeepAspectRatio,
             Qt.SmoothTransformation
-        )
-        self.image_label.setPixmap(pix)
+        ))
+        if pix.isNull():
+            return pix
 
-        # Cập nhật cảnh báo trên UI (giữ cơ chế cooldown)
-        self._on_warning_changed(is_warning)
+        sx = pix.width() / float(w)
+        sy = pix.height() / float(h)
+        painter = QPainter(pix)
+        try:
+            font = painter.font()
+            font.setPixelSize(max(10, int(16 * sy)))
+            painter.setFont(font)
+            for (bx1, by1, bx2, by2), label, color in zip(result.boxes.tolist(), result.labels, result.colors):
+                qcolor = QColor(*[int(c) for c in color[:3]])
+                painter.setPen(QPen(qcolor, 2))
+                rect = QRectF(bx1 * sx, by1 * sy, (bx2 - bx1) * sx, (by2 - by1) * sy)
+                painter.drawRect(rect)
+                if label:
+                    metrics = painter.fontMetrics()
+                    tw = metrics.horizontalAdvance(label) + 4
+                    th = metrics.height()
+                    ty = rect.top() - th if rect.top() - th >= 0 else rect.top()
+                    painter.fillRect(QRectF(rect.left(), ty, tw, th), qcolor)
+                    painter.setPen(QColor(255, 255, 255))
+                    painter.drawText(QRectF(rect.left() + 2, ty, tw, th), Qt.AlignVCenter | Qt.AlignLeft, label)
+            if result.is_warning:
+                painter.setPen(QPen(QColor(255, 0, 0), 3))
+                painter.drawRect(QRectF(2, 2, pix.width() - 4, pix.height() - 4))
+        finally:
+            painter.end()
+        return pix
 
     def _set_signal_state(self, has_signal: bool):
         """Cập nhật UI trạng thái tín hiệu: LIVE (green) / NO SIGNAL (yellow)."""
@@ -5,9 +5,12 @@ import glob
 from datetime import datetime
 from PyQt5.QtCore import QObject, pyqtSignal
 import csv
+import threading
 import cv2
 import numpy as np
 
+from evidence_writer import get_evidence_writer
+
 
 class Logger(QObject):
     signalLog = pyqtSignal(str)
@@ -29,6 +32,10 @@ class Logger(QObject):
         # Tạo các handler cho log
         self.__create_log_handlers()
 
+        # Đường dẫn ảnh đã đưa vào EvidenceWriter nhưng chưa ghi xong (tránh trùng tên)
+        self.__pending_images = set()
+        self.__pending_lock = threading.Lock()
+
     def __create_log_handlers(self):
         """Tạo các handler cho log mỗi ngày."""
         today = datetime.now().strftime('%Y_%m_%d')
@@ -143,18 +150,20 @@ class Logger(QObject):
         
         # Kiểm tra và tạo tên file không trùng
         image_path = self._get_unique_filename(image_path)
-        
+        submitted = False
+
         try:
             if image is None:
                 raise ValueError("Invalid image (None). Cannot save")
-            success = cv2.imwrite(image_path, image)
-
-            if not success:
-                raise IOError("Error saving image")
+            # Encode + ghi đĩa trên EvidenceWriter (không chặn thread gọi); ghi bản copy
+            # -> caller được dùng lại / sửa buffer ngay sau khi gọi
+            submitted = get_evidence_writer().submit(image_path, image.copy(), key=image_folder, logger=self,
+                                                     on_done=self.__on_image_written,
+                                                     on_error=self.__on_image_failed)
+            if not submitted:
+                raise IOError("Error saving image (writer queue full)")
 
             image_path_fixed = image_path.replace("\\", "/")
-            log_message = f'Image logged at {image_path_fixed}'
-            self.info(log_message)
 
             if log_csv == True:
                 # ✅ Ghi log vào file CSV
@@ -171,11 +180,32 @@ class Logger(QObject):
 
             return image_path_fixed
         except Exception as ex:
+            if not submitted:
+                with self.__pending_lock:
+                    self.__pending_images.discard(image_path)
             self.error(ex)
 
+    def __on_image_failed(self, image_path):
+        """Gọi trên thread của EvidenceWriter khi ghi ảnh lỗi -> trả lại tên file."""
+        with self.__pending_lock:
+            self.__pending_images.discard(image_path)
+
+    def __on_image_written(self, image_path):
+        """Gọi trên thread của EvidenceWriter khi ảnh đã ghi xong."""
+        with self.__pending_lock:
+            self.__pending_images.discard(image_path)
+        image_path_fixed = image_path.replace("\\", "/")
+        self.info(f'Image logged at {image_path_fixed}')
+
     def _get_unique_filename(self, filepath):
-        """Tạo tên file duy nhất, thêm (1), (2), ... nếu file đã tồn tại"""
-        if not os.path.exists(filepath):
+        """Tạo tên file duy nhất, thêm (1), (2), ... nếu file đã tồn tại (hoặc đang chờ ghi)"""
+        with self.__pending_lock:
+            filepath = self.__unique_filename(filepath)
+            self.__pending_images.add(filepath)
+        return filepath
+
+    def __unique_filename(self, filepath):
+        if not os.path.exists(filepath) and filepath not in self.__pending_images:
             return filepath
         
         # Tách đường dẫn, tên file và extension
@@ -188,7 +218,7 @@ class Logger(QObject):
             new_filename = f"{name}({counter}){ext}"
             new_filepath = os.path.join(directory, new_filename)
             
-            if not os.path.exists(new_filepath):
+            if not os.path.exists(new_filepath) and new_filepath not in self.__pending_images:
                 return new_filepath
             
             counter += 1
@@ -12,6 +12,7 @@ from config_data_log import *
 
 from list_widget import ImageListWidget
 from Logging import Logger
+from yolo_engine import get_yolo_engine
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -42,6 +43,8 @@ class MainWindow(QMainWindow):
         # load config file
         # try:
         self.config_info = load_config_file("config_data.json")
+        # Tạo engine dùng chung theo mục "engine" trong config (backend, num_workers, ...)
+        get_yolo_engine(**self.config_info.engine)
         # Lọc camera theo enable_flags.use_camera (1: dùng, 0: bỏ qua)
         enabled_camera_infos = []
         for ci in self.config_info.camera_infos:
@@ -80,7 +83,14 @@ class MainWindow(QMainWindow):
                                   yolo_model_path=yolo_model_path,
                                   yolo_rate=yolo_rate, is_fell_check=is_fell_check, is_heltmet_check=is_helmet_check,
                                   is_jacket_check=is_jacket_check,is_fire_check=is_fire_check,is_smoke_check=is_smoke_check,
-                                  timer_delay=timer_delay, classes=classes, colors=colors, roi_check=roi_check,logger=self.logger)
+                                  timer_delay=timer_delay, classes=classes, colors=colors, roi_check=roi_check,logger=self.logger,
+                                  preprocess_in_capture=cam_info.preprocess_in_capture,
+                                  capture_fps=cam_info.capture_fps,
+                                  capture_mode=cam_info.capture_mode,
+                                  sparse_interval_sec=cam_info.sparse_interval_sec,
+                                  capture_process=cam_info.capture_process,
+                                  capture_async=cam_info.capture_async,
+                                  motion_gate=cam_info.motion_gate)
             no_of_column = i % max_column
             no_of_row = i // max_column
             self.layout_cam.addWidget(widget, no_of_row, no_of_column)
@@ -0,0 +1,241 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Set
+
+import cv2
+import numpy as np
+
+from ffmpeg_capture import FFmpegCapture, JpegFrameSplitter
+
+
+class AsyncFFmpegCapture(FFmpegCapture):
+    """
+    FFmpegCapture do AsyncCaptureSupervisor quản lý: không có thread reader riêng.
+
+    - ffmpeg chạy bằng asyncio.create_subprocess_exec, đọc pipe không chặn trên event loop chung.
+    - Reconnect / backoff / periodic là asyncio.sleep (timer), không chiếm thread.
+    - Decode MJPEG / copy rawvideo / letterbox chạy trên thread pool decode dùng chung;
+      mỗi camera tối đa 1 frame đang decode, frame đến khi đang bận bị bỏ (dropped_frames).
+    Cùng interface với FFmpegCapture: read_prepared / read / release.
+    """
+
+    def __init__(self, supervisor: "AsyncCaptureSupervisor", source: str, **kwargs):
+        super().__init__(source, autostart=False, **kwargs)
+        self._supervisor = supervisor
+        self._aproc: Optional[asyncio.subprocess.Process] = None
+        self._task: Optional[asyncio.Task] = None
+        self._decoding = False
+        self.dropped_frames = 0
+
+    # --------- chạy trên event loop ----------
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        backoff = float(self.reconnect_delay_sec)
+        while self._running:
+            # ffprobe (trong _select_mode) là lệnh chặn -> chạy ở executor mặc định
+            await loop.run_in_executor(None, self._select_mode)
+            if not self._running:
+                break
+            error = await self._session()
+            if not self._running:
+                break
+            if self.capture_mode == "periodic" and self._session_frames > 0:
+                # periodic: ffmpeg thoát sau khi trả 1 frame -> chờ tới lượt kế tiếp, không phải lỗi
+                await asyncio.sleep(self.sparse_interval_sec)
+                continue
+            if self._session_frames > 0:
+                backoff = float(self.reconnect_delay_sec)
+            if self.logger:
+                self.logger.warning(f"FFmpegCapture reconnect... ({error})")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2.0, float(self.reconnect_delay_max_sec))
+
+    async def _session(self) -> str:
+        """1 phiên ffmpeg: spawn, đọc tới khi hết stream / bị watchdog kill. Trả lý do kết thúc."""
+        self._session_frames = 0
+        if self.logger:
+            self.logger.info(f"FFmpegCapture start ({self._active_mode}, async): {self.source}")
+        frame_bytes = 0
+        if self._active_mode == "rawvideo":
+            w, h = self._frame_size
+            frame_bytes = w * h * 3
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *self._build_cmd(),
+                stdout=asyncio.subprocess.PIPE,
+                # tránh deadlock nếu ffmpeg spam log
+                stderr=asyncio.subprocess.DEVNULL,
+                limit=max(1 << 16, frame_bytes),
+            )
+        except Exception as e:
+            return f"spawn error: {e}"
+        self._aproc = proc
+        # watchdog của supervisor tính stall từ lúc bắt đầu phiên
+        self._last_frame_ok_ts = time.monotonic()
+        splitter = JpegFrameSplitter() if frame_bytes == 0 else None
+        try:
+            while self._running:
+                if frame_bytes:
+                    data = await proc.stdout.readexactly(frame_bytes)
+                    self._submit(self._raw_frame, data)
+                    continue
+                chunk = await proc.stdout.read(splitter.chunk_size)
+                if not chunk:
+                    raise EOFError
+                splitter.feed(chunk)
+                for jpg in splitter.frames():
+                    # bytes(): buffer của splitter bị ghi tiếp ngay khi có chunk mới
+                    self._submit(self._decode_jpeg, bytes(jpg))
+            return "stopped"
+        except (asyncio.IncompleteReadError, EOFError):
+            return "ffmpeg stdout ended"
+        except Exception as e:
+            return str(e)
+        finally:
+            self._aproc = None
+            await self._kill_aproc(proc)
+
+    @staticmethod
+    async def _kill_aproc(proc: asyncio.subprocess.Process) -> None:
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=2.0)
+        except Exception:
+            pass
+
+    def _submit(self, fn, data: bytes) -> None:
+        if self._decoding:
+            self.dropped_frames += 1
+            return
+        self._decoding = True
+        fut = self._supervisor.decode_pool.submit(fn, data)
+        fut.add_done_callback(self._on_decoded)
+
+    def _on_decoded(self, fut) -> None:
+        self._decoding = False
+        e = fut.exception()
+        if e is not None and self.logger:
+            self.logger.error(f"FFmpegCapture decode error: {e}")
+
+    # --------- chạy trên thread pool decode ----------
+    def _raw_frame(self, data: bytes) -> None:
+        w, h = self._frame_size
+        frame = self._next_buffer()
+        np.copyto(frame, np.frombuffer(data, dtype=np.uint8).reshape(h, w, 3))
+        self._mark_frame_ok(frame)
+
+    def _decode_jpeg(self, data: bytes) -> None:
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            self._mark_frame_ok(frame)
+
+    def _mark_frame_ok(self, frame: np.ndarray) -> None:
+        self._put_frame(frame)
+        self._last_frame_ok_ts = time.monotonic()
+
+    # --------- public ----------
+    def release(self) -> None:
+        self._running = False
+        self._supervisor.close(self)
+
+
+class AsyncCaptureSupervisor:
+    """
+    1 thread asyncio quản lý tiến trình ffmpeg của mọi camera (thay cho 1 thread reader / camera).
+
+    - Watchdog: 1 task duy nhất, mỗi watchdog_interval_sec kiểm tra mọi stream;
+      stream đứng quá _stall_timeout_sec thì kill ffmpeg -> phiên kết thúc -> reconnect theo backoff.
+    - decode_pool: thread pool decode dùng chung (cv2.imdecode / copy nhả GIL).
+    """
+
+    def __init__(self, decode_workers: Optional[int] = None, watchdog_interval_sec: float = 1.0, logger=None):
+        self.logger = logger
+        self.watchdog_interval_sec = float(watchdog_interval_sec)
+        self.decode_pool = ThreadPoolExecutor(
+            max_workers=int(decode_workers or min(8, os.cpu_count() or 1)),
+            thread_name_prefix="AsyncCaptureDecode",
+        )
+        self._streams: Set[AsyncFFmpegCapture] = set()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="AsyncCaptureSupervisor", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._watchdog(), self._loop)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def open(self, source: str, **kwargs) -> AsyncFFmpegCapture:
+        """Tạo capture cho 1 camera (kwargs giống FFmpegCapture) và chạy trên event loop."""
+        cap = AsyncFFmpegCapture(self, source, logger=kwargs.pop("logger", self.logger), **kwargs)
+        self._loop.call_soon_threadsafe(self._start_stream, cap)
+        return cap
+
+    def close(self, cap: AsyncFFmpegCapture, timeout: float = 3.0) -> None:
+        fut = asyncio.run_coroutine_threadsafe(self._stop_stream(cap), self._loop)
+        try:
+            fut.result(timeout=timeout)
+        except Exception:
+            pass
+
+    def stop(self, timeout: float = 5.0) -> None:
+        for cap in list(self._streams):
+            cap.release()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+        self.decode_pool.shutdown(wait=False)
+
+    def _start_stream(self, cap: AsyncFFmpegCapture) -> None:
+        self._streams.add(cap)
+        cap._task = self._loop.create_task(cap._run())
+
+    async def _stop_stream(self, cap: AsyncFFmpegCapture) -> None:
+        self._streams.discard(cap)
+        cap._running = False
+        task = cap._task
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+        proc = cap._aproc
+        if proc is not None:
+            await cap._kill_aproc(proc)
+
+    async def _watchdog(self) -> None:
+        while True:
+            await asyncio.sleep(self.watchdog_interval_sec)
+            now_ts = time.monotonic()
+            for cap in list(self._streams):
+                proc = cap._aproc
+                if proc is None or proc.returncode is not None:
+                    continue
+                if now_ts - cap._last_frame_ok_ts > float(cap._stall_timeout_sec):
+                    if cap.logger:
+                        cap.logger.warning("FFmpegCapture watchdog: stalled stream, restarting...")
+                    # kill -> read trong _session nhận EOF -> reconnect theo backoff
+                    try:
+                        proc.kill()
+                    except ProcessLookupError:
+                        pass
+
+
+_SUPERVISOR_INSTANCE: Optional[AsyncCaptureSupervisor] = None
+_SUPERVISOR_LOCK = threading.Lock()
+
+
+def get_capture_supervisor(**kwargs) -> AsyncCaptureSupervisor:
+    """Supervisor dùng chung; kwargs (decode_workers, ...) chỉ có tác dụng ở lần tạo đầu tiên."""
+    global _SUPERVISOR_INSTANCE
+    with _SUPERVISOR_LOCK:
+        if _SUPERVISOR_INSTANCE is None:
+            _SUPERVISOR_INSTANCE = AsyncCaptureSupervisor(**kwargs)
+        return _SUPERVISOR_INSTANCE
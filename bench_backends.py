@@ -0,0 +1,85 @@
+import argparse
+import time
+from typing import List, Optional
+
+import numpy as np
+from ultralytics import YOLO
+
+from bench_yolo_engine import load_frames
+from tracker import box_iou
+from yolo_engine import INFERENCE_BACKENDS, DEFAULT_MODEL_CACHE_DIR, Detections, export_model
+
+
+def match_ratio(ref: List[Detections], other: List[Detections], iou_thr: float = 0.5) -> float:
+    """Tỉ lệ box của backend tham chiếu có box cùng class (IoU >= iou_thr) ở backend kia."""
+    total = 0
+    matched = 0
+    for r, o in zip(ref, other):
+        total += len(r.xyxy)
+        if len(r.xyxy) == 0 or len(o.xyxy) == 0:
+            continue
+        iou = box_iou(r.xyxy, o.xyxy)
+        same_cls = r.cls[:, None] == o.cls[None, :]
+        matched += int(((iou >= iou_thr) & same_cls).any(axis=1).sum())
+    return matched / total if total else 1.0
+
+
+def run_backend(model_path: str, backend: str, frames: List[np.ndarray], batch: int, img_size: int,
+                conf: float, repeat: int, cache_dir: str, calibration_data: Optional[str] = None):
+    model = YOLO(export_model(model_path, backend, cache_dir, calibration_data=calibration_data), task="detect")
+    params = {"imgsz": img_size, "conf": conf, "device": "cpu", "verbose": False, "agnostic_nms": True}
+
+    # warmup (khởi tạo runtime, cấp phát buffer)
+    model.predict(frames[:batch], **params)
+
+    dets: List[Detections] = []
+    n_frames = 0
+    start = time.perf_counter()
+    for rep in range(repeat):
+        for i in range(0, len(frames), batch):
+            results = model.predict(frames[i : i + batch], **params)
+            n_frames += len(results)
+            if rep == 0:
+                dets.extend(Detections.from_result(r) for r in results)
+    elapsed = time.perf_counter() - start
+    return dets, n_frames / elapsed, elapsed * 1000.0 / n_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh backend inference (torch / onnx / openvino) trên cùng frame")
+    parser.add_argument("--model", default="yolo11n.pt")
+    parser.add_argument("--source", default="", help="video để lấy frame test (mặc định: frame ngẫu nhiên)")
+    parser.add_argument("--backends", default="",
+                        help="mặc định: mọi backend (INT8 chỉ khi có --calibration-data)")
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--img-size", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cache-dir", default=DEFAULT_MODEL_CACHE_DIR)
+    parser.add_argument("--calibration-data", default=None,
+                        help="data.yaml hoặc thư mục ảnh để calibrate backend INT8")
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames)
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if not backends:
+        backends = [b for b, spec in INFERENCE_BACKENDS.items()
+                    if args.calibration_data or not (spec or {}).get("int8")]
+
+    rows = []
+    ref = None
+    for backend in backends:
+        dets, fps, ms = run_backend(args.model, backend, frames, args.batch, args.img_size,
+                                    args.conf, args.repeat, args.cache_dir, args.calibration_data)
+        if ref is None:
+            ref = dets
+        rows.append((backend, fps, ms, sum(len(d.xyxy) for d in dets), match_ratio(ref, dets)))
+
+    print(f"{'backend':>10} {'fps':>8} {'ms/frame':>9} {'boxes':>7} {'match':>7}")
+    for backend, fps, ms, boxes, match in rows:
+        print(f"{backend:>10} {fps:>8.1f} {ms:>9.2f} {boxes:>7} {match * 100:>6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
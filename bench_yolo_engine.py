@@ -0,0 +1,124 @@
+import argparse
+import os
+import threading
+import time
+from typing import List
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import Qt
+
+from yolo_engine import YoloEngine
+
+
+def load_frames(source: str, count: int, width: int = 1280, height: int = 720) -> List[np.ndarray]:
+    """Lấy frame test: từ video/ảnh nếu có source, nếu không thì sinh frame ngẫu nhiên."""
+    frames: List[np.ndarray] = []
+    if source and os.path.isfile(source):
+        cap = cv2.VideoCapture(source)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    if not frames:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+    return frames
+
+
+def run_once(model_path: str, frames: List[np.ndarray], num_cameras: int, num_workers: int,
+             threads_per_worker: int, img_size: int, warmup_sec: float, duration_sec: float) -> dict:
+    """
+    Chạy engine với num_workers worker, mô phỏng num_cameras camera theo kiểu closed-loop
+    (mỗi camera gửi frame mới ngay khi nhận kết quả, giống cờ _infer_in_flight của CameraWidget).
+    """
+    engine = YoloEngine(num_workers=num_workers, threads_per_worker=threads_per_worker)
+    counter = {"n": 0}
+    lock = threading.Lock()
+    frame_idx = {}
+
+    def submit(camera_name: str):
+        i = frame_idx.get(camera_name, 0)
+        frame_idx[camera_name] = i + 1
+        engine.request_inference(
+            camera_name=camera_name,
+            frame=frames[i % len(frames)],
+            model_path=model_path,
+            img_size=img_size,
+            yolo_rate=0.5,
+            roi_check=None,
+            classes=[],
+            colors=[],
+            enable_flags={},
+        )
+
+    def on_result(result):
+        with lock:
+            counter["n"] += 1
+        if engine._running:
+            submit(result.camera_name)
+
+    # không có event loop Qt -> gọi callback trực tiếp trên thread của engine
+    engine.detections_ready.connect(on_result, Qt.DirectConnection)
+
+    for c in range(num_cameras):
+        submit(f"BENCH {c:02d}")
+
+    time.sleep(warmup_sec)
+    with lock:
+        start_n = counter["n"]
+    start = time.perf_counter()
+    time.sleep(duration_sec)
+    with lock:
+        end_n = counter["n"]
+    elapsed = time.perf_counter() - start
+
+    stats = engine.get_stats()
+    engine.stop()
+    return {
+        "workers": num_workers,
+        "fps": (end_n - start_n) / elapsed,
+        "avg_batch_occupancy": stats["avg_batch_occupancy"],
+        "avg_infer_ms": stats["avg_infer_ms"],
+        "avg_post_ms": stats["avg_post_ms"],
+        "avg_post_wait_ms": stats["avg_post_wait_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FPS tổng của YoloEngine theo số worker")
+    parser.add_argument("--model", default="yolo11n.pt")
+    parser.add_argument("--source", default="", help="video/ảnh để lấy frame test (mặc định: frame ngẫu nhiên)")
+    parser.add_argument("--cameras", type=int, default=16)
+    parser.add_argument("--workers", default="1,2,4", help="danh sách số worker, vd 1,2,4,8")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="torch threads mỗi worker (0: chia đều số core cho các worker)")
+    parser.add_argument("--img-size", type=int, default=640)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, 32)
+    cpu_count = os.cpu_count() or 1
+    rows = []
+    for n in [int(x) for x in args.workers.split(",") if x.strip()]:
+        threads = args.threads or max(1, cpu_count // n)
+        row = run_once(args.model, frames, args.cameras, n, threads, args.img_size, args.warmup, args.duration)
+        row["threads"] = threads
+        rows.append(row)
+        print(f"workers={n} threads/worker={threads} fps={row['fps']:.1f} "
+              f"batch={row['avg_batch_occupancy']:.2f} infer={row['avg_infer_ms']:.1f}ms/batch "
+              f"post={row['avg_post_ms']:.1f}ms/frame post_wait={row['avg_post_wait_ms']:.1f}ms")
+
+    base = rows[0]["fps"] if rows and rows[0]["fps"] > 0 else 0.0
+    print()
+    print(f"{'workers':>8} {'threads':>8} {'fps':>8} {'speedup':>8}")
+    for row in rows:
+        speedup = row["fps"] / base if base else 0.0
+        print(f"{row['workers']:>8} {row['threads']:>8} {row['fps']:>8.1f} {speedup:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,7 +29,9 @@ class CameraInfo:
                  img_size, yolo_model_path,
                  yolo_rate, classes, colors, is_fell_check,is_helmet_check,is_jacket_check,is_smoke_check,
                  is_fire_check,
-                 timer_delay, roi_check, enable_flags=None):
+                 timer_delay, roi_check, enable_flags=None, preprocess_in_capture=False, capture_fps=None,
+                 capture_mode="continuous", sparse_interval_sec=5.0, capture_process=False,
+                 capture_async=False, motion_gate=None):
         self.camera_name = camera_name
         self.camera_src = camera_src
         self.img_size = img_size
@@ -49,6 +51,19 @@ class CameraInfo:
         self.enable_flags = enable_flags or {}
 
         self.roi_check = roi_check
+        # letterbox frame về img_size ngay trên thread capture thay vì thread inference
+        self.preprocess_in_capture = bool(preprocess_in_capture)
+        # số frame/giây capture decode (None: theo nhịp inference của CameraWidget)
+        self.capture_fps = capture_fps
+        # chế độ capture: "continuous" | "keyframe" (chỉ decode I-frame) | "periodic" (1 frame mỗi sparse_interval_sec)
+        self.capture_mode = capture_mode
+        self.sparse_interval_sec = sparse_interval_sec
+        # capture_process: decode trong tiến trình con, frame chuyển qua shared memory ring
+        self.capture_process = capture_process
+        # capture_async: RTSP/ffmpeg chạy trên event loop asyncio dùng chung (nhiều camera, ít thread)
+        self.capture_async = capture_async
+        # motion_gate: {"enabled": true, "area_ratio": 0.002, "max_skip_sec": 5, ...}; None -> luôn inference
+        self.motion_gate = motion_gate
 
     def to_dict(self):
         return {
@@ -66,7 +81,14 @@ class CameraInfo:
             'is_fire_check': self.is_fire_check,
             'is_smoke_check': self.is_smoke_check,
             'timer_delay': self.timer_delay,
-            'roi_check': self.roi_check
+            'roi_check': self.roi_check,
+            'preprocess_in_capture': self.preprocess_in_capture,
+            'capture_fps': self.capture_fps,
+            'capture_mode': self.capture_mode,
+            'sparse_interval_sec': self.sparse_interval_sec,
+            'capture_process': self.capture_process,
+            'capture_async': self.capture_async,
+            'motion_gate': self.motion_gate
         }
 
     @classmethod
@@ -108,19 +130,30 @@ class CameraInfo:
                    camera_info.get('yolo_model_path', ''), camera_info.get('yolo_rate', 0.5), camera_info.get('classes', []),
                    colors, is_fell_check, is_helmet_check,
                    is_jacket_check, is_fire_check, is_smoke_check,
-                   camera_info.get('timer_delay', 100), camera_info.get('roi_check', [-1, 9999, -1, 9999]), enable_flags=enable_flags)
+                   camera_info.get('timer_delay', 100), camera_info.get('roi_check', [-1, 9999, -1, 9999]), enable_flags=enable_flags,
+                   preprocess_in_capture=camera_info.get('preprocess_in_capture', False),
+                   capture_fps=camera_info.get('capture_fps'),
+                   capture_mode=camera_info.get('capture_mode', 'continuous'),
+                   sparse_interval_sec=camera_info.get('sparse_interval_sec', 5.0),
+                   capture_process=camera_info.get('capture_process', False),
+                   capture_async=camera_info.get('capture_async', False),
+                   motion_gate=camera_info.get('motion_gate'))
 
 
 class ConfigInfo:
-    def __init__(self, no_of_camera, max_column, camera_infos):
+    def __init__(self, no_of_camera, max_column, camera_infos, engine=None):
         self.no_of_camera = no_of_camera
         self.max_column = max_column
         self.camera_infos = camera_infos  # This is an instance of the Address class
+        # Tham số khởi tạo YoloEngine dùng chung (tuỳ chọn), ví dụ:
+        # {"backend": "openvino", "num_workers": 2, "threads_per_worker": 4}
+        self.engine = engine or {}
 
     def to_dict(self):
         return {
             'no_of_camera': self.no_of_camera,
             'max_column': self.max_column,
+            'engine': self.engine,
             'camera_infos': [camera_info.to_dict() for camera_info in self.camera_infos]
             # Convert each Address to a dictionary
         }
@@ -128,7 +161,8 @@ class ConfigInfo:
     @classmethod
     def from_dict(cls, config_info):
         camera_infos = [CameraInfo.from_dict(camera_info) for camera_info in config_info['camera_infos']]
-        return cls(config_info['no_of_camera'], config_info['max_column'], camera_infos)
+        return cls(config_info['no_of_camera'], config_info['max_column'], camera_infos,
+                   engine=config_info.get('engine'))
 
 
 
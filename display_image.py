@@ -22,6 +22,7 @@ from queue import Queue
 import os
 from pathlib import Path
 from list_widget import ImageListWidget
+from event_index import get_event_index
 
 
 class LogWidget(QWidget):
@@ -42,14 +43,14 @@ class LogWidget(QWidget):
         self.max_items = max_items
         self.list_image = list_image
 
-
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.decode_frame)
-        self.timer.start(5000)  # Cập nhật mỗi 1s
-
-        self.timer_last = QTimer(self)
-        self.timer_last.timeout.connect(self.delete_file_encode)
-        self.timer_last.start(10000)  # Cập nhật mỗi 10s
+        # Ảnh cảnh báo lấy từ event index (engine ghi khi lưu bằng chứng), không quét thư mục
+        self.event_index = get_event_index()
+        if directory:
+            self.event_index.backfill(directory)
+        self._shown_event_id = 0
+        # Cập nhật khi index có sự kiện mới (thay cho 2 QTimer poll 5s / 10s): không I/O khi không có cảnh báo
+        self.event_index.events_added.connect(self.on_events_added)
+        self.decode_frame()
 
     def initUI(self, camera_name="None"):
 
@@ -90,22 +91,25 @@ class LogWidget(QWidget):
         self.frame_count = 0
 
 
+    def on_events_added(self, last_id):
+        self.decode_frame()
+        self.delete_file_encode()
+
     def delete_file_encode(self):
-        image_path_decode = "./LastDetectionWarning/"
-        files = os.listdir(self.directory)
-        files = [f for f in files if os.path.isfile(os.path.join(self.directory, f))]
-        if len(files) > 10:
-            files.sort(key=lambda x: os.path.getmtime(os.path.join(self.directory, x)), reverse=True)
-            for file_name in files[10:]:
-                image_path_decode = "./LastDetectionWarning/" + file_name
-                # print(image_path_decode)
-                os.remove(image_path_decode)
+        # Chỉ giữ max_items ảnh cảnh báo mới nhất (theo index, không listdir + getmtime);
+        # index phát events_removed -> danh sách lịch sử bỏ các dòng tương ứng
+        for file_path in self.event_index.prune(keep=self.max_items):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
 
     def decode_frame(self):
 
-        file_name = self.last_detector_warning()
-        if file_name == None:
+        record = self.event_index.latest()
+        if record is None or record.id == self._shown_event_id:
             return
+        file_name = record.path
 
         # Chuyển đổi bytes thành QImage
         image = QImage(file_name)
@@ -116,17 +120,15 @@ class LogWidget(QWidget):
 
         resized_pixmap.size()
         self.image_label.setPixmap(resized_pixmap)
+        self._shown_event_id = record.id
 
 
 
     def last_detector_warning(self):
-        files = os.listdir(self.directory)
-        files = [f for f in files if os.path.isfile(os.path.join(self.directory, f))]
-        files.sort(key=lambda x: os.path.getmtime(os.path.join(self.directory, x)), reverse=True)
-        if files == None or len(files) == 0:
+        record = self.event_index.latest()
+        if record is None:
             return
-        file_name = os.path.join(self.directory, files[0])
-        return file_name
+        return record.path
 
     def capture_warning(self):
         return 0
@@ -0,0 +1,270 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class _PendingClip:
+    path: str
+    start_ts: float
+    end_ts: float
+    frames: List[Tuple[float, bytes]] = field(default_factory=list)
+
+
+@dataclass
+class _CameraRing:
+    """JPEG gần nhất của 1 camera, tổng dung lượng <= byte_budget."""
+    frames: Deque[Tuple[float, bytes]] = field(default_factory=deque)
+    nbytes: int = 0
+    last_push_ts: float = 0.0
+    encoding: bool = False
+    active: Optional[_PendingClip] = None
+    dropped: int = 0
+
+
+class EventClipService:
+    """
+    Clip trước / sau sự kiện cho mọi camera.
+
+    - push(): mỗi camera giữ ring JPEG (thu nhỏ về max_width, record_fps frame/giây) của pre_roll_sec gần nhất,
+      giới hạn byte_budget_mb / camera -> 32 camera x 8MB vẫn vừa RAM. Encode trên thread pool dùng chung,
+      mỗi camera tối đa 1 frame đang encode (bận thì bỏ frame).
+    - trigger(): lấy các frame pre-roll trong ring, ghi tiếp post_roll_sec rồi giao clip cho thread ghi
+      (ffmpeg -> H.264 mp4 nếu có, không thì cv2.VideoWriter). Sự kiện mới khi clip còn đang ghi chỉ kéo dài
+      clip đó (tối đa max_clip_sec).
+    """
+
+    def __init__(self, output_dir: str = "./EventClips", pre_roll_sec: float = 5.0, post_roll_sec: float = 5.0,
+                 record_fps: float = 5.0, max_width: int = 960, jpeg_quality: int = 70,
+                 byte_budget_mb: float = 8.0, max_clip_sec: float = 60.0, encode_workers: int = 2, logger=None):
+        self.output_dir = Path(output_dir)
+        self.pre_roll_sec = float(pre_roll_sec)
+        self.post_roll_sec = float(post_roll_sec)
+        self.record_interval = 1.0 / max(0.1, float(record_fps))
+        self.max_width = int(max_width)
+        self.jpeg_quality = int(jpeg_quality)
+        self.byte_budget = int(float(byte_budget_mb) * 1024 * 1024)
+        self.max_clip_sec = float(max_clip_sec)
+        self.logger = logger
+        self._ffmpeg = shutil.which("ffmpeg")
+
+        self._lock = threading.Lock()
+        self._cameras: Dict[str, _CameraRing] = {}
+        self._encode_pool = ThreadPoolExecutor(max_workers=max(1, int(encode_workers)),
+                                               thread_name_prefix="EventClipEncode")
+        self._write_queue: "queue.Queue[Optional[_PendingClip]]" = queue.Queue()
+        self._stats = {"clips": 0, "errors": 0}
+        self._running = True
+        self._writer = threading.Thread(target=self._writer_loop, name="EventClipWriter", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict[str, Any]]) -> Optional["EventClipService"]:
+        """cfg từ mục engine.event_clips; mặc định tắt, chỉ ghi clip khi enabled=true."""
+        cfg = dict(cfg or {})
+        if not cfg.pop("enabled", False):
+            return None
+        return cls(**cfg)
+
+    # --------- public ----------
+    def push(self, camera_name: str, frame: np.ndarray, ts: Optional[float] = None) -> None:
+        """Đưa frame BGR mới của camera vào ring (bỏ qua nếu chưa tới lượt theo record_fps hoặc đã stop())."""
+        ts = time.monotonic() if ts is None else ts
+        with self._lock:
+            if not self._running:
+                return
+            ring = self._cameras.get(camera_name)
+            if ring is None:
+                ring = self._cameras[camera_name] = _CameraRing()
+            if ts - ring.last_push_ts < self.record_interval:
+                return
+            if ring.encoding:
+                ring.dropped += 1
+                return
+            ring.last_push_ts = ts
+            ring.encoding = True
+        h, w = frame.shape[:2]
+        if w > self.max_width:
+            # resize tạo mảng mới -> buffer capture được dùng lại ngay
+            small = cv2.resize(frame, (self.max_width, max(1, int(h * self.max_width / w))),
+                               interpolation=cv2.INTER_AREA)
+        else:
+            small = frame.copy()
+        try:
+            self._encode_pool.submit(self._encode, camera_name, ring, small, ts)
+        except RuntimeError:
+            # stop() vừa shutdown pool giữa lúc kiểm tra _running và submit
+            with self._lock:
+                ring.encoding = False
+
+    def trigger(self, camera_name: str, path: str, ts: Optional[float] = None) -> Optional[str]:
+        """
+        Bắt đầu clip cho sự kiện tại ts (mặc định: bây giờ). Trả đường dẫn clip sẽ được ghi
+        (clip đang ghi nếu sự kiện rơi vào post-roll của nó), None nếu camera chưa có frame nào.
+        """
+        ts = time.monotonic() if ts is None else ts
+        with self._lock:
+            ring = self._cameras.get(camera_name)
+            if ring is None or not ring.frames:
+                return None
+            clip = ring.active
+            if clip is not None:
+                clip.end_ts = min(max(clip.end_ts, ts + self.post_roll_sec), clip.start_ts + self.max_clip_sec)
+                return clip.path
+            frames = [f for f in ring.frames if f[0] >= ts - self.pre_roll_sec]
+            start_ts = frames[0][0] if frames else ts
+            ring.active = _PendingClip(path=str(path), start_ts=start_ts, end_ts=ts + self.post_roll_sec,
+                                       frames=frames)
+            return ring.active.path
+
+    def clip_path(self, camera_slug: str, stamp: str) -> str:
+        return str(self.output_dir / f"{camera_slug}_{stamp}_warning.mp4")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            self._running = False
+            for ring in self._cameras.values():
+                if ring.active is not None:
+                    self._write_queue.put(ring.active)
+                    ring.active = None
+        self._write_queue.put(None)
+        self._writer.join(timeout=timeout)
+        self._encode_pool.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["buffered_mb"] = sum(r.nbytes for r in self._cameras.values()) / (1024.0 * 1024.0)
+            stats["dropped_frames"] = sum(r.dropped for r in self._cameras.values())
+            stats["recording"] = sum(1 for r in self._cameras.values() if r.active is not None)
+        return stats
+
+    # --------- thread pool encode ----------
+    def _encode(self, camera_name: str, ring: _CameraRing, frame: np.ndarray, ts: float) -> None:
+        try:
+            ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        except Exception:
+            ok = False
+        with self._lock:
+            ring.encoding = False
+            if not ok:
+                return
+            data = buf.tobytes()
+            ring.frames.append((ts, data))
+            ring.nbytes += len(data)
+            # cắt theo thời gian pre-roll và byte budget (luôn giữ frame mới nhất)
+            while len(ring.frames) > 1 and (ring.nbytes > self.byte_budget
+                                            or ts - ring.frames[0][0] > self.pre_roll_sec):
+                _, old = ring.frames.popleft()
+                ring.nbytes -= len(old)
+            clip = ring.active
+            if clip is not None:
+                if ts <= clip.end_ts:
+                    clip.frames.append((ts, data))
+                if ts >= clip.end_ts:
+                    ring.active = None
+                    self._write_queue.put(clip)
+
+    # --------- thread ghi clip ----------
+    def _writer_loop(self) -> None:
+        while True:
+            try:
+                clip = self._write_queue.get(timeout=1.0)
+            except queue.Empty:
+                self._flush_stale()
+                continue
+            if clip is None:
+                return
+            self._write_clip(clip)
+
+    def _flush_stale(self) -> None:
+        """Camera mất tín hiệu giữa post-roll: không còn frame mới -> ghi clip với các frame đã có."""
+        now_ts = time.monotonic()
+        with self._lock:
+            for ring in self._cameras.values():
+                clip = ring.active
+                if clip is not None and now_ts > clip.end_ts + 2.0:
+                    ring.active = None
+                    self._write_queue.put(clip)
+
+    def _write_clip(self, clip: _PendingClip) -> None:
+        if not clip.frames:
+            return
+        duration = clip.frames[-1][0] - clip.frames[0][0]
+        fps = max(1.0, (len(clip.frames) - 1) / duration) if duration > 0 else 1.0
+        # file tạm giữ đuôi .mp4 (cv2.VideoWriter chọn container theo đuôi)
+        tmp = str(Path(clip.path).with_suffix(".part" + Path(clip.path).suffix))
+        try:
+            Path(clip.path).parent.mkdir(parents=True, exist_ok=True)
+            if self._ffmpeg:
+                self._write_ffmpeg(clip, tmp, fps)
+            else:
+                self._write_cv2(clip, tmp, fps)
+            os.replace(tmp, clip.path)
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            if self.logger:
+                self.logger.error(f"event clip error: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._stats["clips"] += 1
+        if self.logger:
+            self.logger.info(f"Event clip saved: {clip.path} ({len(clip.frames)} frames, {duration:.1f}s)")
+
+    def _write_ffmpeg(self, clip: _PendingClip, tmp: str, fps: float) -> None:
+        # JPEG trong ring được đưa thẳng vào ffmpeg (image2pipe), không decode lại trong Python
+        cmd = [
+            self._ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "image2pipe", "-c:v", "mjpeg", "-framerate", f"{fps:.3f}", "-i", "-",
+            "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+            # kích thước chẵn cho yuv420p
+            "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+            "-movflags", "+faststart", "-f", "mp4", tmp,
+        ]
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            for _, data in clip.frames:
+                proc.stdin.write(data)
+            proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        _, err = proc.communicate(timeout=60)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited {proc.returncode}: {err.decode(errors='ignore').strip()}")
+
+    @staticmethod
+    def _write_cv2(clip: _PendingClip, tmp: str, fps: float) -> None:
+        writer = None
+        size = None
+        try:
+            for _, data in clip.frames:
+                frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    continue
+                if writer is None:
+                    size = (frame.shape[1], frame.shape[0])
+                    writer = cv2.VideoWriter(tmp, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+                    if not writer.isOpened():
+                        raise RuntimeError("cv2.VideoWriter cannot open output")
+                elif (frame.shape[1], frame.shape[0]) != size:
+                    frame = cv2.resize(frame, size)
+                writer.write(frame)
+        finally:
+            if writer is not None:
+                writer.release()
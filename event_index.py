@@ -0,0 +1,245 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from qt_compat import QObject, pyqtSignal
+
+DEFAULT_INDEX_PATH = "event_index.sqlite3"
+
+_IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".txt")
+# {camera_slug}_{YYYYmmddHHMMSS}_warning.jpg (tên file YoloEngine lưu bằng chứng)
+_EVIDENCE_NAME_RE = re.compile(r"^(?P<camera>.+)_(?P<stamp>\d{14})_warning$")
+
+
+@dataclass
+class EventRecord:
+    id: int
+    ts: float  # epoch giây
+    camera: str
+    path: str
+    clip_path: Optional[str] = None
+    labels: List[str] = field(default_factory=list)
+    confidence: float = 0.0
+    track_ids: List[int] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+
+class EventIndex(QObject):
+    """
+    Chỉ mục sự kiện (ảnh bằng chứng) trên SQLite WAL, thay cho os.listdir + sort theo mtime.
+
+    - add(): chỉ put vào queue; 1 thread ghi gom lô -> 1 transaction (post thread / writer không chờ I/O).
+    - query() / latest() / newer_than(): đọc theo index (ts, camera+ts, id) trên connection riêng
+      của thread gọi (WAL: đọc không bị chặn bởi ghi).
+    - backfill(): quét thư mục ảnh cũ 1 lần (chạy trên thread ghi), INSERT OR IGNORE theo path.
+    - events_added(last_id): phát sau mỗi lô có sự kiện mới đã commit -> UI cập nhật ngay, không cần timer poll.
+      Phát từ thread ghi; slot Qt nhận qua queued connection (index được tạo trên GUI thread).
+    - events_removed(paths): phát từ prune() (thread gọi prune) -> model danh sách bỏ các dòng đã xoá.
+    """
+
+    events_added = pyqtSignal(int)
+    events_removed = pyqtSignal(list)
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, logger=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.logger = logger
+        self._local = threading.local()
+        db = self._conn()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, camera TEXT NOT NULL, path TEXT NOT NULL UNIQUE, "
+            "clip_path TEXT, labels TEXT, confidence REAL, track_ids TEXT)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON events(camera, ts)")
+        db.commit()
+        self._q: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        self._backfilled = set()
+        self._t = threading.Thread(target=self._loop, name="EventIndex", daemon=True)
+        self._t.start()
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _norm(path: str) -> str:
+        return os.path.normpath(os.path.abspath(path))
+
+    # --------- ghi (không chặn) ----------
+    def add(self, camera: str, path: str, ts: Optional[float] = None, labels: Optional[List[str]] = None,
+            confidence: float = 0.0, clip_path: Optional[str] = None,
+            track_ids: Optional[List[int]] = None) -> None:
+        row = (
+            time.time() if ts is None else float(ts),
+            camera,
+            self._norm(path),
+            self._norm(clip_path) if clip_path else None,
+            json.dumps(list(labels or []), ensure_ascii=False),
+            float(confidence),
+            json.dumps([int(i) for i in (track_ids or [])]),
+        )
+        self._q.put(("add", row))
+
+    def backfill(self, directory: str) -> None:
+        """Đưa ảnh đã có trong directory (trước khi có index) vào index; chạy nền trên thread ghi, 1 lần / thư mục."""
+        key = self._norm(directory)
+        if key in self._backfilled:
+            return
+        self._backfilled.add(key)
+        self._q.put(("backfill", directory))
+
+    # --------- đọc ----------
+    _COLUMNS = "id, ts, camera, path, clip_path, labels, confidence, track_ids"
+
+    @staticmethod
+    def _record(row) -> EventRecord:
+        return EventRecord(
+            id=row[0], ts=row[1], camera=row[2], path=row[3], clip_path=row[4],
+            labels=json.loads(row[5] or "[]"), confidence=row[6] or 0.0, track_ids=json.loads(row[7] or "[]"),
+        )
+
+    def query(self, camera: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = 100, newest_first: bool = True,
+              before: Optional[Tuple[float, int]] = None) -> List[EventRecord]:
+        """
+        Sự kiện trong khoảng [since, until) (epoch giây), lọc theo camera nếu có.
+        before=(ts, id) của record cuối trang trước -> trang kế tiếp (newest_first, phân trang theo index).
+        """
+        where, args = [], []
+        if before is not None:
+            where.append("(ts < ? OR (ts = ? AND id < ?))")
+            args += [float(before[0]), float(before[0]), int(before[1])]
+        if camera is not None:
+            where.append("camera = ?")
+            args.append(camera)
+        if since is not None:
+            where.append("ts >= ?")
+            args.append(float(since))
+        if until is not None:
+            where.append("ts < ?")
+            args.append(float(until))
+        sql = f"SELECT {self._COLUMNS} FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        order = "DESC" if newest_first else "ASC"
+        sql += f" ORDER BY ts {order}, id {order} LIMIT ?"
+        args.append(int(limit))
+        return [self._record(r) for r in self._conn().execute(sql, args)]
+
+    def latest(self, camera: Optional[str] = None) -> Optional[EventRecord]:
+        records = self.query(camera=camera, limit=1)
+        return records[0] if records else None
+
+    def newer_than(self, last_id: int, limit: int = 100) -> List[EventRecord]:
+        """Sự kiện có id > last_id theo thứ tự thêm vào (cập nhật danh sách tăng dần)."""
+        rows = self._conn().execute(
+            f"SELECT {self._COLUMNS} FROM events WHERE id > ? ORDER BY id LIMIT ?", (int(last_id), int(limit))
+        )
+        return [self._record(r) for r in rows]
+
+    def last_id(self) -> int:
+        row = self._conn().execute("SELECT MAX(id) FROM events").fetchone()
+        return int(row[0] or 0)
+
+    def prune(self, keep: int) -> List[str]:
+        """Xoá khỏi index các sự kiện cũ hơn keep sự kiện mới nhất; trả path ảnh để caller xoá file."""
+        db = self._conn()
+        rows = db.execute(
+            "SELECT id, path FROM events ORDER BY ts DESC, id DESC LIMIT -1 OFFSET ?", (int(keep),)
+        ).fetchall()
+        if not rows:
+            return []
+        with db:
+            db.executemany("DELETE FROM events WHERE id = ?", [(r[0],) for r in rows])
+        paths = [r[1] for r in rows]
+        self.events_removed.emit(paths)
+        return paths
+
+    # --------- thread ghi ----------
+    def _loop(self) -> None:
+        while True:
+            batch = [self._q.get()]
+            while len(batch) < 512:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            added = 0
+            try:
+                rows = [arg for op, arg in batch if op == "add"]
+                if rows:
+                    added += self._insert(rows)
+                for op, arg in batch:
+                    if op == "backfill":
+                        added += self._backfill(arg)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"EventIndex write error: {e}")
+            if added:
+                self.events_added.emit(self.last_id())
+
+    def _insert(self, rows: List[tuple]) -> int:
+        """Trả số dòng thực sự thêm (path đã có thì bỏ qua)."""
+        db = self._conn()
+        before = db.total_changes
+        with db:
+            db.executemany(
+                "INSERT OR IGNORE INTO events(ts, camera, path, clip_path, labels, confidence, track_ids) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return db.total_changes - before
+
+    def _backfill(self, directory: str) -> int:
+        if not os.path.isdir(directory):
+            return 0
+        rows = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not entry.is_file() or not entry.name.lower().endswith(_IMAGE_EXTS):
+                    continue
+                stem = os.path.splitext(entry.name)[0]
+                m = _EVIDENCE_NAME_RE.match(stem)
+                ts = entry.stat().st_mtime
+                camera = ""
+                if m:
+                    camera = m.group("camera")
+                    try:
+                        ts = datetime.strptime(m.group("stamp"), "%Y%m%d%H%M%S").timestamp()
+                    except ValueError:
+                        pass
+                rows.append((ts, camera, self._norm(entry.path), None, "[]", 0.0, "[]"))
+        added = self._insert(rows) if rows else 0
+        if added and self.logger:
+            self.logger.info(f"EventIndex backfill {directory}: {added} files")
+        return added
+
+
+_INDEX_INSTANCE: Optional[EventIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_event_index(**kwargs) -> EventIndex:
+    """Index dùng chung (engine ghi, UI đọc); kwargs (path, ...) chỉ có tác dụng ở lần tạo đầu tiên."""
+    global _INDEX_INSTANCE
+    with _INDEX_LOCK:
+        if _INDEX_INSTANCE is None:
+            _INDEX_INSTANCE = EventIndex(**kwargs)
+        return _INDEX_INSTANCE
@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class EvidenceWriter:
+    """
+    Ghi ảnh bằng chứng / ảnh log xuống đĩa: 1 hàng đợi có giới hạn + pool nhỏ thread cố định
+    (thay cho 1 thread mới mỗi lần lưu). Đĩa chậm / treo không làm tăng số thread, không chặn inference.
+
+    - Backpressure: mỗi key (camera) tối đa max_pending_per_key ảnh chờ, cả hàng đợi tối đa max_queue;
+      vượt giới hạn thì bỏ ảnh mới (submit trả False, dropped tăng) -> ảnh đã nhận vẫn được ghi đủ.
+    - Ghi file tạm rồi os.replace: UI quét thư mục không bao giờ đọc phải JPEG ghi dở.
+    - fsync theo lô: file đã ghi được fsync mỗi fsync_interval_sec hoặc khi đủ fsync_batch file
+      (fsync_interval_sec = 0: không fsync, để OS tự flush).
+    - Encode JPEG bằng cv2.imencode với jpeg_quality (và jpeg_optimize) cấu hình được.
+    """
+
+    def __init__(self, num_workers: int = 2, max_queue: int = 64, max_pending_per_key: int = 2,
+                 jpeg_quality: int = 90, jpeg_optimize: bool = False, fsync_interval_sec: float = 2.0,
+                 fsync_batch: int = 16, logger=None):
+        self.max_queue = max(1, int(max_queue))
+        self.max_pending_per_key = max(1, int(max_pending_per_key))
+        self.jpeg_quality = int(jpeg_quality)
+        self.jpeg_optimize = bool(jpeg_optimize)
+        self.fsync_interval_sec = float(fsync_interval_sec)
+        self.fsync_batch = max(1, int(fsync_batch))
+        self.logger = logger
+
+        self._cond = threading.Condition()
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._pending_by_key: Dict[str, int] = {}
+        self._busy = 0
+        self._running = True
+
+        # file đã ghi nhưng chưa fsync (path, thời điểm ghi)
+        self._sync_lock = threading.Lock()
+        self._unsynced: List[Tuple[str, float]] = []
+        self._last_sync_ts = time.monotonic()
+
+        self._stats = {"submitted": 0, "written": 0, "dropped": 0, "errors": 0, "write_ms": 0.0, "fsyncs": 0}
+
+        self._threads: List[threading.Thread] = []
+        for i in range(max(1, int(num_workers))):
+            t = threading.Thread(target=self._loop, name=f"EvidenceWriter-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _encode_params(self) -> List[int]:
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        if self.jpeg_optimize:
+            params += [int(cv2.IMWRITE_JPEG_OPTIMIZE), 1]
+        return params
+
+    # --------- public ----------
+    def submit(self, path: str, image: np.ndarray, key: str = "", rgb: bool = False, logger=None,
+               on_done: Optional[Callable[[str], None]] = None,
+               on_error: Optional[Callable[[str], None]] = None) -> bool:
+        """
+        Đưa 1 ảnh vào hàng đợi ghi (không chặn). image là BGR (rgb=True: ảnh RGB, đổi sang BGR trên thread ghi).
+        on_done(path) được gọi trên thread ghi sau khi file đã nằm đúng chỗ; on_error(path) khi encode / ghi lỗi.
+        image được giữ nguyên tới khi ghi xong -> caller không được sửa buffer (truyền bản copy nếu cần).
+        Trả False nếu ảnh bị bỏ do hàng đợi đầy (của key này hoặc toàn bộ).
+        """
+        job = {"path": str(path), "image": image, "key": key, "rgb": rgb, "logger": logger, "on_done": on_done,
+               "on_error": on_error}
+        with self._cond:
+            if not self._running:
+                return False
+            self._stats["submitted"] += 1
+            pending = self._pending_by_key.get(key, 0)
+            if pending >= self.max_pending_per_key or len(self._queue) >= self.max_queue:
+                self._stats["dropped"] += 1
+                return False
+            self._pending_by_key[key] = pending + 1
+            self._queue.append(job)
+            self._cond.notify()
+        return True
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue) + self._busy
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Chờ ghi hết hàng đợi rồi fsync các file còn lại. Trả False nếu hết timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        self._sync(force=True)
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self.flush(timeout=timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=1.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._queue) + self._busy
+        written = stats["written"]
+        stats["avg_write_ms"] = stats.pop("write_ms") / written if written else 0.0
+        return stats
+
+    # --------- thread ghi ----------
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    # rảnh: tranh thủ fsync lô đang chờ
+                    if not self._cond.wait(timeout=max(0.1, self.fsync_interval_sec or 1.0)):
+                        break
+                if not self._running:
+                    return
+                job = self._queue.popleft() if self._queue else None
+                if job is not None:
+                    self._busy += 1
+            if job is None:
+                self._sync()
+                continue
+            try:
+                self._write(job)
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    key = job["key"]
+                    left = self._pending_by_key.get(key, 1) - 1
+                    if left > 0:
+                        self._pending_by_key[key] = left
+                    else:
+                        self._pending_by_key.pop(key, None)
+                    self._cond.notify_all()
+            self._sync()
+
+    def _write(self, job: Dict[str, Any]) -> None:
+        path = job["path"]
+        logger = job["logger"] or self.logger
+        t0 = time.monotonic()
+        try:
+            img = job["image"]
+            if job["rgb"]:
+                img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+            ok, buf = cv2.imencode(".jpg", img, self._encode_params())
+            if not ok:
+                raise IOError(f"JPEG encode failed: {path}")
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            tmp = f"{path}.part"
+            with open(tmp, "wb") as f:
+                f.write(buf.tobytes())
+            os.replace(tmp, path)
+        except Exception as e:
+            with self._cond:
+                self._stats["errors"] += 1
+            if logger:
+                logger.error(f"save image error: {e}")
+            self._callback(job["on_error"], path, logger)
+            return
+        with self._cond:
+            self._stats["written"] += 1
+            self._stats["write_ms"] += (time.monotonic() - t0) * 1000.0
+        if self.fsync_interval_sec > 0:
+            with self._sync_lock:
+                self._unsynced.append((path, time.monotonic()))
+        self._callback(job["on_done"], path, logger)
+
+    @staticmethod
+    def _callback(callback: Optional[Callable[[str], None]], path: str, logger) -> None:
+        if callback is None:
+            return
+        try:
+            callback(path)
+        except Exception as e:
+            if logger:
+                logger.error(f"evidence callback error: {e}")
+
+    def _sync(self, force: bool = False) -> None:
+        """fsync lô file đã ghi (và thư mục chứa) khi đủ fsync_batch hoặc quá fsync_interval_sec."""
+        with self._sync_lock:
+            if not self._unsynced:
+                return
+            due = time.monotonic() - self._last_sync_ts >= self.fsync_interval_sec
+            if not (force or due or len(self._unsynced) >= self.fsync_batch):
+                return
+            batch = self._unsynced
+            self._unsynced = []
+            self._last_sync_ts = time.monotonic()
+        dirs = set()
+        for path, _ in batch:
+            self._fsync_path(path)
+            dirs.add(os.path.dirname(path) or ".")
+        if os.name != "nt":
+            # Windows không fsync được thư mục; os.replace ở đó đã ghi metadata đồng bộ
+            for d in dirs:
+                self._fsync_path(d, directory=True)
+        with self._cond:
+            self._stats["fsyncs"] += 1
+
+    @staticmethod
+    def _fsync_path(path: str, directory: bool = False) -> None:
+        try:
+            fd = os.open(path, os.O_RDONLY if directory else os.O_RDWR)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+_WRITER_INSTANCE: Optional[EvidenceWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_evidence_writer(**kwargs) -> EvidenceWriter:
+    """Writer dùng chung (engine + Logger.log_image); kwargs chỉ có tác dụng ở lần tạo đầu tiên."""
+    global _WRITER_INSTANCE
+    with _WRITER_LOCK:
+        if _WRITER_INSTANCE is None:
+            _WRITER_INSTANCE = EvidenceWriter(**kwargs)
+        return _WRITER_INSTANCE
@@ -1,4 +1,5 @@
 import subprocess
+import sys
 import threading
 import queue
 import time
@@ -8,15 +9,128 @@ from typing import Optional, Tuple
 import cv2
 import numpy as np
 
+from preprocess import Letterboxer, PreparedFrame
+
+
+OUTPUT_MODES = ("auto", "rawvideo", "mjpeg")
+# continuous: decode liên tục; keyframe: chỉ decode I-frame (-skip_frame nokey);
+# periodic: mỗi sparse_interval_sec mở stream lấy 1 frame rồi thoát
+CAPTURE_MODES = ("continuous", "keyframe", "periodic")
+
+
+class JpegFrameSplitter:
+    """
+    Tách luồng MJPEG (image2pipe của ffmpeg) thành từng ảnh JPEG, parse tăng dần.
+
+    - fill(): readinto chunk lớn vào bytearray cấp phát sẵn (không tạo bytes mới mỗi chunk).
+    - Nhớ vị trí đã quét (_scan): mỗi byte chỉ find() một lần, không quét lại từ đầu buffer.
+    - frames(): trả memoryview trỏ thẳng vào buffer (không copy) -> chỉ hợp lệ tới lần fill/feed kế tiếp.
+    - feed(): nạp bytes có sẵn (dữ liệu pipe đã ghi lại, cắt chunk tuỳ ý) thay cho stream.
+    """
+
+    SOI = b"\xff\xd8"  # JPEG start
+    EOI = b"\xff\xd9"  # JPEG end
+
+    def __init__(self, chunk_size: int = 256 * 1024, max_frame_bytes: int = 16 * 1024 * 1024):
+        self.chunk_size = int(chunk_size)
+        self.max_frame_bytes = int(max_frame_bytes)
+        self._buf = bytearray(max(4 * self.chunk_size, 1024 * 1024))
+        self._view = memoryview(self._buf)
+        self._head = 0  # đầu dữ liệu chưa tiêu thụ
+        self._tail = 0  # cuối dữ liệu hợp lệ
+        self._scan = 0  # vị trí quét tiếp theo
+        self._frame_start = -1  # vị trí SOI của frame đang chờ EOI (-1: chưa thấy SOI)
+        self.dropped_bytes = 0
+
+    def reset(self) -> None:
+        """Bỏ dữ liệu dở dang (gọi khi restart ffmpeg)."""
+        self._head = self._tail = self._scan = 0
+        self._frame_start = -1
+
+    def _reserve(self, n: int) -> None:
+        """Đảm bảo còn >= n byte trống sau _tail: dồn phần chưa tiêu thụ về đầu buffer, nới buffer nếu thiếu."""
+        if self._tail + n <= len(self._buf):
+            return
+        head = self._head
+        pending = self._tail - head
+        if head > 0:
+            if pending:
+                self._view[:pending] = self._view[head : self._tail]
+            self._head = 0
+            self._tail = pending
+            self._scan -= head
+            if self._frame_start >= 0:
+                self._frame_start -= head
+        if pending + n > len(self._buf):
+            new_buf = bytearray(max(2 * len(self._buf), pending + n))
+            new_buf[:pending] = self._view[:pending]
+            self._buf = new_buf
+            self._view = memoryview(new_buf)
+
+    def fill(self, stream) -> int:
+        """Đọc 1 chunk từ stream vào buffer; trả số byte đọc được (0: hết stream)."""
+        self._reserve(self.chunk_size)
+        target = self._view[self._tail : self._tail + self.chunk_size]
+        # readinto1: trả ngay dữ liệu đang có trong pipe, không chờ đầy chunk (giữ latency thấp)
+        read = getattr(stream, "readinto1", None) or stream.readinto
+        n = read(target)
+        if n:
+            self._tail += n
+        return n or 0
+
+    def feed(self, data) -> None:
+        n = len(data)
+        self._reserve(n)
+        self._view[self._tail : self._tail + n] = data
+        self._tail += n
+
+    def frames(self):
+        """Sinh memoryview của từng JPEG hoàn chỉnh hiện có trong buffer."""
+        while True:
+            buf = self._buf
+            if self._frame_start < 0:
+                start = buf.find(self.SOI, self._scan, self._tail)
+                if start < 0:
+                    # không có SOI: bỏ rác, chỉ giữ byte cuối (có thể là nửa đầu của marker)
+                    keep = max(self._head, self._tail - 1)
+                    self.dropped_bytes += keep - self._head
+                    self._head = self._scan = keep
+                    return
+                self.dropped_bytes += start - self._head
+                self._head = self._frame_start = start
+                self._scan = start + 2
+
+            end = buf.find(self.EOI, self._scan, self._tail)
+            if end < 0:
+                if self._tail - self._frame_start > self.max_frame_bytes:
+                    # frame hỏng (mất EOI): bỏ, tìm SOI kế tiếp từ cuối buffer
+                    keep = self._tail - 1
+                    self.dropped_bytes += keep - self._head
+                    self._head = self._scan = keep
+                    self._frame_start = -1
+                else:
+                    self._scan = max(self._scan, self._tail - 1)
+                return
+
+            start = self._frame_start
+            self._frame_start = -1
+            self._head = self._scan = end + 2
+            yield self._view[start : end + 2]
+
 
 class FFmpegCapture:
     """
     Production-ish RTSP capture bằng ffmpeg:
     - RTSP over TCP, timeout, low-latency flags.
-    - Output MJPEG qua stdout (image2pipe) để không cần biết trước width/height.
-    - Thread reader parse JPEG SOI/EOI, decode thành BGR frame.
+    - Output rawvideo bgr24 qua stdout (mặc định khi biết width/height qua ffprobe hoặc target_width):
+      đọc frame kích thước cố định bằng readinto vào ring buffer numpy cấp phát sẵn,
+      không tốn encode/decode JPEG mỗi frame.
+    - Fallback MJPEG (image2pipe) khi không biết trước width/height:
+      thread reader tách JPEG bằng JpegFrameSplitter (parse tăng dần), decode thành BGR frame.
     - Queue maxsize=1 (drop frame cũ) để giữ latency thấp.
     - Auto-restart với exponential backoff khi ffmpeg lỗi / stream đứt.
+    - Tuỳ chọn preprocess_size: letterbox sẵn cho YOLO ngay trên thread reader.
+    - capture_mode "keyframe"/"periodic" cho camera ưu tiên thấp (chỉ cần kiểm tra vài giây 1 lần).
     """
 
     def __init__(
@@ -29,6 +143,13 @@ class FFmpegCapture:
         reconnect_delay_sec: float = 2.0,
         reconnect_delay_max_sec: float = 30.0,
         logger=None,
+        preprocess_size: Optional[int] = None,
+        output_mode: str = "auto",
+        ring_size: int = 6,
+        target_fps: Optional[float] = None,
+        capture_mode: str = "continuous",
+        sparse_interval_sec: float = 5.0,
+        autostart: bool = True,
     ):
         self.source = source
         self.target_width = target_width
@@ -38,21 +159,120 @@ class FFmpegCapture:
         self.reconnect_delay_sec = float(reconnect_delay_sec)
         self.reconnect_delay_max_sec = float(reconnect_delay_max_sec)
         self.logger = logger
+        # giới hạn frame ffmpeg xuất ra (filter fps) theo nhu cầu inference của camera
+        self.target_fps = float(target_fps) if target_fps and target_fps > 0 else None
+        if capture_mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown FFmpegCapture capture mode: {capture_mode!r}")
+        self.capture_mode = capture_mode
+        self.sparse_interval_sec = max(0.5, float(sparse_interval_sec))
+        # số frame đã đọc từ tiến trình ffmpeg hiện tại (periodic: thoát sau 1 frame là bình thường)
+        self._session_frames = 0
+
+        self._letterbox = Letterboxer(preprocess_size) if preprocess_size else None
+
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown FFmpegCapture output mode: {output_mode!r}")
+        self.output_mode = output_mode
+        # mode thực tế của tiến trình ffmpeg hiện tại ("rawvideo" hoặc "mjpeg")
+        self._active_mode = "mjpeg"
+        # kích thước frame output (rawvideo) và ring buffer frame.
+        # ring_size đủ lớn để frame chưa bị ghi đè khi UI/engine còn giữ: queue + engine + đang ghi.
+        self._frame_size: Optional[Tuple[int, int]] = None
+        self._ring_size = max(3, int(ring_size))
+        self._ring: list = []
+        self._ring_idx = 0
 
         self._proc: Optional[subprocess.Popen] = None
         self._running = True
-        self._q: "queue.Queue[np.ndarray]" = queue.Queue(maxsize=1)
+        self._q: "queue.Queue[PreparedFrame]" = queue.Queue(maxsize=1)
         self._t = threading.Thread(target=self._reader_loop, name="FFmpegCaptureReader", daemon=True)
         self._last_frame_ok_ts = 0.0
         self._stall_timeout_sec = 5.0
+        if self.capture_mode == "keyframe":
+            # khoảng cách I-frame (GOP) của camera có thể vài giây
+            self._stall_timeout_sec = 20.0
+        elif self.capture_mode == "periodic":
+            self._stall_timeout_sec = self.sparse_interval_sec + self.open_timeout_sec + self.read_timeout_sec + 5.0
 
-        self._start_ffmpeg()
-        self._t.start()
+        # autostart=False: chỉ dựng cấu hình/buffer, tiến trình do nơi khác quản lý (async_capture.py)
+        if autostart:
+            self._start_ffmpeg()
+            self._t.start()
 
     @staticmethod
     def is_available() -> bool:
         return shutil.which("ffmpeg") is not None
 
+    def _probe_size(self) -> Optional[Tuple[int, int]]:
+        """Lấy (width, height) của stream video bằng ffprobe; None nếu không được."""
+        if shutil.which("ffprobe") is None:
+            return None
+        cmd = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-rtsp_transport",
+            self.rtsp_transport,
+            "-stimeout",
+            str(int(self.open_timeout_sec * 1_000_000)),
+            "-rw_timeout",
+            str(int(self.read_timeout_sec * 1_000_000)),
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "stream=width,height",
+            "-of",
+            "csv=p=0:s=x",
+            self.source,
+        ]
+        try:
+            out = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                timeout=self.open_timeout_sec + self.read_timeout_sec + 5.0,
+            ).stdout.decode("ascii", "ignore")
+            w, h = out.strip().splitlines()[0].split("x")[:2]
+            w, h = int(w), int(h)
+            return (w, h) if w > 0 and h > 0 else None
+        except Exception:
+            return None
+
+    def _resolve_frame_size(self) -> Optional[Tuple[int, int]]:
+        """Kích thước frame rawvideo output: theo ffprobe, scale về target_width nếu có (giữ aspect)."""
+        probed = self._probe_size()
+        if probed is None:
+            # mất kết nối lúc restart: dùng lại kích thước đã biết
+            return self._frame_size
+        w, h = probed
+        if isinstance(self.target_width, int) and self.target_width > 0:
+            h = int(round(h * self.target_width / float(w) / 2.0)) * 2
+            w = self.target_width
+        return w, h
+
+    def _next_buffer(self) -> np.ndarray:
+        """
+        Buffer kế tiếp trong ring mà không còn ai giữ (queue, engine, UI).
+        Buffer còn được tham chiếu thì bỏ qua; nếu cả ring đang bận thì cấp thêm 1 buffer
+        (tối đa gấp đôi ring_size) thay vì ghi đè frame đang dùng.
+        """
+        n = len(self._ring)
+        for step in range(n):
+            idx = (self._ring_idx + step) % n
+            buf = self._ring[idx]
+            # 3 = list ring + biến buf + tham số của getrefcount
+            if sys.getrefcount(buf) <= 3:
+                self._ring_idx = (idx + 1) % n
+                return buf
+        if n < self._ring_size * 2:
+            w, h = self._frame_size
+            buf = np.empty((h, w, 3), dtype=np.uint8)
+            self._ring.append(buf)
+            return buf
+        buf = self._ring[self._ring_idx]
+        self._ring_idx = (self._ring_idx + 1) % n
+        return buf
+
     def _build_cmd(self) -> list:
         # ffmpeg timeouts are in microseconds for -stimeout, and in microseconds for -rw_timeout
         stimeout_us = int(self.open_timeout_sec * 1_000_000)
@@ -69,6 +289,11 @@ class FFmpegCapture:
             str(stimeout_us),
             "-rw_timeout",
             str(rw_timeout_us),
+        ]
+        if self.capture_mode == "keyframe":
+            # decoder bỏ qua mọi frame không phải keyframe (option input, đặt trước -i)
+            cmd += ["-skip_frame", "nokey"]
+        cmd += [
             "-i",
             self.source,
             "-fflags",
@@ -78,9 +303,29 @@ class FFmpegCapture:
             "-an",
         ]
 
+        if self.capture_mode == "keyframe":
+            # giữ nguyên nhịp keyframe, không nhân bản frame cho đủ fps output
+            cmd += ["-fps_mode", "passthrough"]
+        elif self.capture_mode == "periodic":
+            cmd += ["-frames:v", "1"]
+
+        # fps trước scale: frame bị bỏ không phải scale/convert
+        filters = []
+        if self.target_fps and self.capture_mode == "continuous":
+            filters.append(f"fps={self.target_fps:g}")
+
+        if self._active_mode == "rawvideo":
+            # kích thước cố định để reader đọc đúng w*h*3 byte mỗi frame
+            w, h = self._frame_size
+            filters.append(f"scale={w}:{h}")
+            cmd += ["-vf", ",".join(filters), "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+            return cmd
+
         if isinstance(self.target_width, int) and self.target_width > 0:
             # giữ aspect ratio
-            cmd += ["-vf", f"scale={self.target_width}:-1"]
+            filters.append(f"scale={self.target_width}:-1")
+        if filters:
+            cmd += ["-vf", ",".join(filters)]
 
         # MJPEG stream to stdout
         cmd += [
@@ -94,9 +339,32 @@ class FFmpegCapture:
         ]
         return cmd
 
+    def _select_mode(self) -> None:
+        """Chọn rawvideo nếu biết kích thước frame, ngược lại fallback MJPEG."""
+        self._active_mode = "mjpeg"
+        if self.output_mode == "mjpeg":
+            return
+        if self.capture_mode == "periodic" and self._frame_size and self._ring:
+            # periodic khởi động lại ffmpeg mỗi lần lấy frame: không probe lại mỗi lần
+            self._active_mode = "rawvideo"
+            return
+        size = self._resolve_frame_size()
+        if size is None:
+            if self.logger:
+                self.logger.warning("FFmpegCapture: unknown frame size, fallback MJPEG output")
+            return
+        if size != self._frame_size or not self._ring:
+            w, h = size
+            self._ring = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(self._ring_size)]
+            self._ring_idx = 0
+            self._frame_size = size
+        self._active_mode = "rawvideo"
+
     def _start_ffmpeg(self) -> None:
+        self._select_mode()
+        self._session_frames = 0
         if self.logger:
-            self.logger.info(f"FFmpegCapture start: {self.source}")
+            self.logger.info(f"FFmpegCapture start ({self._active_mode}): {self.source}")
         try:
             self._proc = subprocess.Popen(
                 self._build_cmd(),
@@ -132,21 +400,21 @@ class FFmpegCapture:
     def _put_frame(self, frame_bgr: np.ndarray) -> None:
         if frame_bgr is None:
             return
+        item = self._letterbox(frame_bgr) if self._letterbox is not None else PreparedFrame(frame_bgr)
+        self._session_frames += 1
         if not self._q.empty():
             try:
                 self._q.get_nowait()
             except Exception:
                 pass
         try:
-            self._q.put_nowait(frame_bgr)
+            self._q.put_nowait(item)
         except Exception:
             pass
 
     def _reader_loop(self) -> None:
         backoff = float(self.reconnect_delay_sec)
-        buf = bytearray()
-        soi = b"\xff\xd8"  # JPEG start
-        eoi = b"\xff\xd9"  # JPEG end
+        splitter = JpegFrameSplitter()
 
         while self._running:
             # watchdog: nếu lâu không có frame OK thì restart
@@ -155,7 +423,7 @@ class FFmpegCapture:
                     self.logger.warning("FFmpegCapture watchdog: stalled stream, restarting...")
                 self._restart(backoff)
                 backoff = min(backoff * 2.0, float(self.reconnect_delay_max_sec))
-                buf.clear()
+                splitter.reset()
                 self._last_frame_ok_ts = time.monotonic()
 
             proc = self._proc
@@ -172,49 +440,59 @@ class FFmpegCapture:
                 continue
 
             try:
-                chunk = proc.stdout.read(4096)
-                if not chunk:
+                if self._active_mode == "rawvideo":
+                    self._put_frame(self._read_raw_frame(proc.stdout))
+                    self._last_frame_ok_ts = time.monotonic()
+                    backoff = float(self.reconnect_delay_sec)
+                    continue
+
+                if not splitter.fill(proc.stdout):
                     raise RuntimeError("ffmpeg stdout ended")
-                buf += chunk
-
-                # parse JPEG frames from buffer
-                while True:
-                    start = buf.find(soi)
-                    if start < 0:
-                        # giữ buffer nhỏ gọn
-                        if len(buf) > 2_000_000:
-                            buf = buf[-1_000_000:]
-                        break
-                    end = buf.find(eoi, start + 2)
-                    if end < 0:
-                        # chưa đủ frame
-                        if start > 0:
-                            del buf[:start]
-                        break
-
-                    jpg = bytes(buf[start : end + 2])
-                    del buf[: end + 2]
-
-                    arr = np.frombuffer(jpg, dtype=np.uint8)
-                    frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+
+                for jpg in splitter.frames():
+                    frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
                     if frame is not None:
                         self._put_frame(frame)
                         self._last_frame_ok_ts = time.monotonic()
                         backoff = float(self.reconnect_delay_sec)
 
             except Exception as e:
+                if self.capture_mode == "periodic" and self._session_frames > 0:
+                    # periodic: ffmpeg thoát sau khi trả 1 frame -> chờ tới lượt kế tiếp, không phải lỗi
+                    self._restart(self.sparse_interval_sec)
+                    splitter.reset()
+                    continue
                 if self.logger:
                     self.logger.warning(f"FFmpegCapture reconnect... ({e})")
                 self._restart(backoff)
                 backoff = min(backoff * 2.0, float(self.reconnect_delay_max_sec))
-                buf.clear()
+                splitter.reset()
 
-    def read(self, timeout: float = 0.5):
+    def _read_raw_frame(self, stdout) -> np.ndarray:
+        """Đọc đúng 1 frame bgr24 vào buffer kế tiếp của ring (readinto, không cấp phát)."""
+        frame = self._next_buffer()
+        view = memoryview(frame).cast("B")
+        total = len(view)
+        got = 0
+        while got < total:
+            n = stdout.readinto(view[got:])
+            if not n:
+                raise RuntimeError("ffmpeg stdout ended")
+            got += n
+        return frame
+
+    def read_prepared(self, timeout: float = 0.5) -> Optional[PreparedFrame]:
         try:
+            if timeout <= 0:
+                return self._q.get_nowait()
             return self._q.get(timeout=timeout)
         except queue.Empty:
             return None
 
+    def read(self, timeout: float = 0.5):
+        item = self.read_prepared(timeout=timeout)
+        return item.frame if item is not None else None
+
     def release(self) -> None:
         self._running = False
         self._kill_proc()
@@ -0,0 +1,342 @@
+import abc
+import argparse
+import json
+import logging
+import queue
+import signal
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config_data import CameraInfo, load_config_file
+from motion_gate import MotionGate
+from video_capture import SEND_INTERVAL_TOLERANCE, VideoCapture, capture_fps_for
+from yolo_engine import DetectionResult, get_yolo_engine
+
+
+class EventSink(abc.ABC):
+    """
+    Ghi record (dict) ra file từ 1 thread riêng: post thread của engine chỉ put vào queue,
+    không chờ I/O. Queue đầy (đĩa chậm) -> bỏ record detection ngay, record violation chờ tối đa
+    violation_timeout_sec rồi mới bỏ (post thread không bao giờ treo vì sink).
+    Mở file lỗi thì thử lại mỗi giây; lô ghi lỗi bị bỏ và tính vào dropped.
+    """
+
+    def __init__(self, path: str, max_pending: int = 10000, violation_timeout_sec: float = 1.0,
+                 logger: Optional[logging.Logger] = None):
+        self.path = path
+        self.logger = logger
+        self.violation_timeout_sec = float(violation_timeout_sec)
+        self.dropped = 0
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._running = True
+        self._t = threading.Thread(target=self._loop, name=f"EventSink-{path}", daemon=True)
+        self._t.start()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            if record.get("type") == "violation":
+                try:
+                    self._q.put(record, timeout=self.violation_timeout_sec)
+                    return
+                except queue.Full:
+                    if self.logger:
+                        self.logger.warning(f"EventSink queue full, violation record dropped: {self.path}")
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._running = False
+        self._t.join(timeout=timeout)
+
+    def _loop(self) -> None:
+        opened = False
+        try:
+            while self._running or not self._q.empty():
+                if not opened:
+                    try:
+                        self._open()
+                        opened = True
+                    except Exception as e:
+                        if self.logger:
+                            self.logger.error(f"EventSink open error: {e}")
+                        if not self._running:
+                            break
+                        time.sleep(1.0)
+                        continue
+                try:
+                    batch = [self._q.get(timeout=0.5)]
+                except queue.Empty:
+                    continue
+                # gom record đang chờ -> 1 lần ghi + flush/commit cho cả lô
+                while len(batch) < 512:
+                    try:
+                        batch.append(self._q.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    if self.logger:
+                        self.logger.error(f"EventSink write error: {e}")
+        finally:
+            if opened:
+                try:
+                    self._close()
+                except Exception as e:
+                    if self.logger:
+                        self.logger.error(f"EventSink close error: {e}")
+
+    @abc.abstractmethod
+    def _open(self) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _write_batch(self, records: List[Dict[str, Any]]) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _close(self) -> None:
+        ...
+
+
+class JsonlSink(EventSink):
+    """Mỗi record 1 dòng JSON (append)."""
+
+    def _open(self) -> None:
+        self._f = open(self.path, "a", encoding="utf-8")
+
+    def _write_batch(self, records: List[Dict[str, Any]]) -> None:
+        self._f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+        self._f.flush()
+
+    def _close(self) -> None:
+        self._f.close()
+
+
+class SqliteSink(EventSink):
+    """Bảng events(ts, camera, type, is_warning, payload JSON); 1 transaction mỗi lô."""
+
+    def _open(self) -> None:
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, camera TEXT, type TEXT, is_warning INTEGER, payload TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON events(camera, ts)")
+        self._db.commit()
+
+    def _write_batch(self, records: List[Dict[str, Any]]) -> None:
+        rows = [
+            (r["ts"], r["camera"], r["type"], int(r["is_warning"]), json.dumps(r, ensure_ascii=False))
+            for r in records
+        ]
+        with self._db:
+            self._db.executemany("INSERT INTO events(ts, camera, type, is_warning, payload) VALUES (?, ?, ?, ?, ?)",
+                                 rows)
+
+    def _close(self) -> None:
+        self._db.close()
+
+
+def open_sink(path: str, logger: Optional[logging.Logger] = None) -> EventSink:
+    """Chọn sink theo đuôi file: .db / .sqlite / .sqlite3 -> SQLite, còn lại -> JSONL."""
+    if path.lower().endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteSink(path, logger=logger)
+    return JsonlSink(path, logger=logger)
+
+
+def result_record(result: DetectionResult, record_type: str) -> Dict[str, Any]:
+    return {
+        "ts": result.meta.get("timestamp"),
+        "camera": result.camera_name,
+        "type": record_type,
+        "is_warning": bool(result.is_warning),
+        "boxes": [[round(v, 1) for v in box] for box in result.boxes.tolist()],
+        "class_ids": result.class_ids.tolist(),
+        "confidences": [round(c, 3) for c in result.confidences.tolist()],
+        "labels": list(result.labels),
+        "warn_mask": result.warn_mask.tolist(),
+        "track_ids": result.track_ids.tolist() if result.track_ids is not None else None,
+        "violation_track_ids": result.meta.get("violation_track_ids"),
+        "evidence_path": result.meta.get("evidence_path"),
+        "clip_path": result.meta.get("clip_path"),
+        "timings": result.meta.get("timings"),
+    }
+
+
+class HeadlessCamera:
+    """
+    Tương đương CameraWidget nhưng không có UI: thread đọc frame, throttle theo target_fps,
+    tối đa 1 frame đang inference; kết quả nhận qua engine.subscribe() (không cần Qt).
+    """
+
+    def __init__(self, info: CameraInfo, engine, sink: EventSink, logger: logging.Logger,
+                 target_fps: float = 6.0, write_detections: bool = True, violation_interval_sec: float = 5.0,
+                 in_flight_timeout_sec: float = 10.0):
+        self.info = info
+        self.camera_name = info.camera_name
+        self.engine = engine
+        self.sink = sink
+        self.logger = logger
+        self.write_detections = write_detections
+        self.violation_interval_sec = float(violation_interval_sec)
+        self.in_flight_timeout_sec = float(in_flight_timeout_sec)
+        self._target_fps = float(target_fps)
+        self._infer_interval = 1.0 / self._target_fps
+
+        # Ưu tiên enable_flags (mới), fallback sang is_*_check (cũ) - giống Program.py
+        flags = getattr(info, "enable_flags", None) or {}
+        self.enable_flags = {
+            "fell": int(flags.get("fell", info.is_fell_check)) == 1,
+            "helmet": int(flags.get("helmet", info.is_helmet_check)) == 1,
+            "jacket": int(flags.get("jacket", info.is_jacket_check)) == 1,
+            "fire": int(flags.get("fire", info.is_fire_check)) == 1,
+            "smoke": int(flags.get("smoke", info.is_smoke_check)) == 1,
+        }
+        self.colors = tuple(map(tuple, info.colors))
+
+        self._in_flight_since = 0.0
+        self._last_sent_ts = 0.0
+        self._was_warning = False
+        self._last_violation_ts = 0.0
+        self.results = 0
+        # motion gate: cảnh tĩnh thì không gửi YOLO (không có record detection mới cho frame bị bỏ)
+        self.motion_gate = MotionGate.from_config(info.motion_gate)
+
+        self.video_capture = VideoCapture(info.camera_src, logger=logger,
+                                          preprocess_size=info.img_size if info.preprocess_in_capture else None,
+                                          capture_fps=info.capture_fps or capture_fps_for(engine.max_camera_fps(target_fps)),
+                                          capture_mode=info.capture_mode,
+                                          sparse_interval_sec=info.sparse_interval_sec,
+                                          capture_process=info.capture_process,
+                                          capture_async=info.capture_async)
+        self.engine.subscribe(self.camera_name, self._on_detections)
+        self._running = True
+        self._t = threading.Thread(target=self._loop, name=f"Headless-{self.camera_name}", daemon=True)
+        self._t.start()
+
+    def _loop(self) -> None:
+        while self._running:
+            prepared = self.video_capture.read_prepared()
+            if prepared is None:
+                continue
+            now_ts = time.monotonic()
+            self.engine.record_frame(self.camera_name, prepared.frame, now_ts)
+            adaptive_fps = self.engine.camera_fps(self.camera_name, self._target_fps)
+            if adaptive_fps:
+                self._infer_interval = 1.0 / adaptive_fps
+            in_flight = self._in_flight_since > 0 and now_ts - self._in_flight_since < self.in_flight_timeout_sec
+            if in_flight or now_ts - self._last_sent_ts < self._infer_interval * SEND_INTERVAL_TOLERANCE:
+                continue
+            self._last_sent_ts = now_ts
+            if self.motion_gate is not None and not self.motion_gate.should_infer(prepared.frame):
+                continue
+            self._in_flight_since = now_ts
+            self.engine.request_inference(
+                camera_name=self.camera_name,
+                frame=prepared.frame,
+                model_path=self.info.yolo_model_path,
+                img_size=self.info.img_size,
+                yolo_rate=self.info.yolo_rate,
+                roi_check=self.info.roi_check,
+                classes=self.info.classes,
+                colors=self.colors,
+                enable_flags=self.enable_flags,
+                logger=self.logger,
+                prepared=prepared,
+            )
+
+    def _on_detections(self, result: DetectionResult) -> None:
+        """Chạy trên post thread của engine: chỉ dựng record và đẩy vào sink."""
+        self._in_flight_since = 0.0
+        self.results += 1
+        now_ts = time.monotonic()
+        # violation: khi bắt đầu cảnh báo, rồi nhắc lại mỗi violation_interval_sec nếu còn kéo dài.
+        # Có tracking: 1 record / người vi phạm mới (engine đã dedup theo track id)
+        if result.track_ids is not None:
+            new_violation = bool(result.meta.get("violation_track_ids"))
+        else:
+            new_violation = result.is_warning and (
+                not self._was_warning or now_ts - self._last_violation_ts >= self.violation_interval_sec
+            )
+        if new_violation:
+            self._last_violation_ts = now_ts
+            self.sink.write(result_record(result, "violation"))
+        elif self.write_detections and len(result.boxes):
+            self.sink.write(result_record(result, "detection"))
+        self._was_warning = result.is_warning
+
+    def release(self) -> None:
+        self._running = False
+        self.engine.unsubscribe(self.camera_name, self._on_detections)
+        self.video_capture.release()
+        self._t.join(timeout=1.0)
+
+
+def enabled_cameras(camera_infos: List[CameraInfo]) -> List[CameraInfo]:
+    """Lọc camera theo enable_flags.use_camera (1: dùng, 0: bỏ qua)."""
+    return [ci for ci in camera_infos if int((getattr(ci, "enable_flags", None) or {}).get("use_camera", 1)) == 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy capture + YOLO cho mọi camera, không UI (không cần PyQt)")
+    parser.add_argument("--config", default="config_data.json")
+    parser.add_argument("--sink", default="events.jsonl", help="file kết quả: .jsonl hoặc .db/.sqlite (SQLite)")
+    parser.add_argument("--fps", type=float, default=6.0, help="số inference tối đa / giây / camera")
+    parser.add_argument("--violations-only", action="store_true", help="chỉ ghi violation, không ghi detection")
+    parser.add_argument("--violation-interval", type=float, default=5.0,
+                        help="nhắc lại violation đang kéo dài mỗi N giây")
+    parser.add_argument("--stats-interval", type=float, default=60.0, help="log thống kê engine mỗi N giây (0: tắt)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s - %(levelname)s - %(message)s",
+                        datefmt="%Y/%m/%d %H:%M:%S")
+    logger = logging.getLogger("CCTV")
+
+    config_info = load_config_file(args.config)
+    engine = get_yolo_engine(**config_info.engine)
+    sink = open_sink(args.sink, logger=logger)
+
+    cameras = []
+    for info in enabled_cameras(config_info.camera_infos):
+        logger.info(f"Camera {info.camera_name}: {info.camera_src}")
+        cameras.append(HeadlessCamera(info, engine, sink, logger, target_fps=args.fps,
+                                      write_detections=not args.violations_only,
+                                      violation_interval_sec=args.violation_interval))
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    logger.info(f"Headless service started: {len(cameras)} camera(s) -> {args.sink}")
+    last_stats_ts = time.monotonic()
+    while not stop.wait(1.0):
+        if args.stats_interval <= 0 or time.monotonic() - last_stats_ts < args.stats_interval:
+            continue
+        last_stats_ts = time.monotonic()
+        stats = engine.get_stats()
+        gates = [c.motion_gate.stats() for c in cameras if c.motion_gate is not None]
+        checked = sum(g["checked"] for g in gates)
+        skip_rate = sum(g["skipped"] for g in gates) / checked if checked else 0.0
+        if "rate_control" in stats:
+            rc = stats["rate_control"]
+            logger.info(f"rate_control base_fps={rc['base_fps']:.2f} latency_p90={rc['latency_p90_ms']:.0f}ms "
+                        f"capacity={rc['capacity_fps']:.1f}fps")
+        logger.info(f"results={sum(c.results for c in cameras)} batch={stats['avg_batch_occupancy']:.2f} "
+                    f"infer={stats['avg_infer_ms']:.1f}ms post={stats['avg_post_ms']:.1f}ms "
+                    f"pending={stats['pending']} motion_skip={skip_rate * 100:.0f}% sink_dropped={sink.dropped}")
+
+    logger.info("Stopping...")
+    for cam in cameras:
+        cam.release()
+    engine.stop()
+    sink.close()
+
+
+if __name__ == "__main__":
+    main()
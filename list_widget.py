@@ -6,7 +6,7 @@ from PIL import Image
 import io
 from io import BytesIO
 import cv2
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, pyqtSignal
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import QImage, QPixmap, QIcon, QPainter, QPen
 from PyQt5.QtCore import QTimer, QSize
@@ -21,8 +21,154 @@ from WidgetCustom import *
 import os
 from pathlib import Path
 
+import bisect
+from collections import OrderedDict
+
+from event_index import get_event_index
+from thumbnail_cache import get_thumbnail_cache
+
+
+class EventListModel(QAbstractListModel):
+    """
+    Model lịch sử cảnh báo (mới nhất ở trên) đọc từ event index.
+
+    - Phân trang: view gọi canFetchMore / fetchMore khi cuộn tới cuối -> đọc thêm page_size sự kiện cũ hơn.
+    - Icon lazy: data(DecorationRole) chỉ được gọi cho dòng đang hiển thị; chưa có thumbnail thì trả icon tạm
+      và yêu cầu ThumbnailCache tải nền, xong mới dataChanged đúng dòng đó.
+    - QIcon đã dựng giữ trong LRU icon_cache_items phần tử (bytes JPEG có LRU riêng trong ThumbnailCache).
+    - remove_paths(): bỏ các dòng có ảnh đã bị xoá khỏi index (prune) -> model không giữ dòng cũ mãi.
+    """
+
+    # phát từ thread của ThumbnailCache -> slot chạy trên GUI thread
+    thumbnail_loaded = pyqtSignal(str, object)
+
+    def __init__(self, event_index, thumbnails, page_size=200, icon_size=QSize(96, 54), icon_cache_items=512,
+                 parent=None):
+        super().__init__(parent)
+        self.event_index = event_index
+        self.thumbnails = thumbnails
+        self.page_size = page_size
+        self.icon_size = icon_size
+        self.icon_cache_items = icon_cache_items
+        self._records = []
+        self._row_by_path = {}
+        self._exhausted = False
+        self._last_event_id = self.event_index.last_id()
+        self._icons = OrderedDict()
+        self._requested = set()
+        placeholder = QPixmap(icon_size)
+        placeholder.fill(Qt.darkGray)
+        self._placeholder = QIcon(placeholder)
+        self.thumbnail_loaded.connect(self._on_thumbnail_loaded)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def record(self, row):
+        return self._records[row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._records[index.row()]
+        if role == Qt.DisplayRole:
+            return record.name
+        if role == Qt.DecorationRole:
+            return self._icon(record.path)
+        if role == Qt.ToolTipRole:
+            when = datetime.fromtimestamp(record.ts).strftime("%Y-%m-%d %H:%M:%S")
+            labels = ", ".join(record.labels)
+            return f"{record.camera} - {when}" + (f"\n{labels} ({record.confidence:.2f})" if labels else "")
+        if role == Qt.UserRole:
+            return record.path
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        before = (self._records[-1].ts, self._records[-1].id) if self._records else None
+        records = self.event_index.query(limit=self.page_size, before=before)
+        if len(records) < self.page_size:
+            self._exhausted = True
+        if not records:
+            return
+        first = len(self._records)
+        self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+        for i, record in enumerate(records):
+            self._records.append(record)
+            self._row_by_path[record.path] = first + i
+        self.endInsertRows()
+
+    def add_new_events(self):
+        """Sự kiện id > id cuối đã thấy -> chèn đúng vị trí theo thời gian (thường là đầu danh sách)."""
+        records = self.event_index.newer_than(self._last_event_id, limit=self.page_size)
+        if not records:
+            return
+        self._last_event_id = records[-1].id
+        keys = [(-r.ts, -r.id) for r in self._records]
+        for record in sorted(records, key=lambda r: (r.ts, r.id), reverse=True):
+            key = (-record.ts, -record.id)
+            row = bisect.bisect_left(keys, key)
+            if row == len(keys) and not self._exhausted:
+                # cũ hơn trang cuối đã tải (vd ảnh backfill) -> fetchMore sẽ đọc tới
+                continue
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._records.insert(row, record)
+            keys.insert(row, key)
+            self.endInsertRows()
+        self._row_by_path = {r.path: i for i, r in enumerate(self._records)}
+
+    def remove_paths(self, paths):
+        """Xoá các dòng theo path (sự kiện đã bị prune khỏi index), từ dưới lên để số dòng còn đúng."""
+        rows = sorted((self._row_by_path[p] for p in paths if p in self._row_by_path), reverse=True)
+        for row in rows:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            record = self._records.pop(row)
+            self.endRemoveRows()
+            self._icons.pop(record.path, None)
+            self._requested.discard(record.path)
+        if rows:
+            self._row_by_path = {r.path: i for i, r in enumerate(self._records)}
+
+    def _icon(self, path):
+        icon = self._icons.get(path)
+        if icon is not None:
+            self._icons.move_to_end(path)
+            return icon
+        data = self.thumbnails.get(path)
+        if data is not None:
+            return self._store_icon(path, data)
+        if path not in self._requested:
+            self._requested.add(path)
+            self.thumbnails.request(path, self.thumbnail_loaded.emit)
+        return self._placeholder
+
+    def _store_icon(self, path, data):
+        pixmap = QPixmap()
+        if not data or not pixmap.loadFromData(data):
+            # ảnh gốc đã bị xoá / lỗi: giữ icon tạm, không yêu cầu tải lại
+            icon = self._placeholder
+        else:
+            icon = QIcon(pixmap)
+        self._icons[path] = icon
+        while len(self._icons) > self.icon_cache_items:
+            self._icons.popitem(last=False)
+        return icon
+
+    def _on_thumbnail_loaded(self, path, data):
+        self._requested.discard(path)
+        self._store_icon(path, data)
+        row = self._row_by_path.get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class ImageListWidget(QListView):
+    # ảnh gốc đã decode + scale trên thread nền (path, QImage | None)
+    image_loaded = pyqtSignal(str, object)
 
-class ImageListWidget(QListWidget):
     def __init__(self, camera_name="None", img_size=640,
                  colors=[(0, 0, 255), (0, 255, 0), (255, 0, 0)], timer_delay=10, parent=None,directory=None,max_items = 20,list_image=[]):
 
@@ -37,65 +183,62 @@ class ImageListWidget(QListWidget):
 
         self.list_image = list_image
 
-        # self.timer_watch = QTimer(self)
-        # self.timer_watch.timeout.connect(self.update_date_time)
-        # self.timer_watch.start(1000)  # Cập nhật mỗi 10ms
-        # self.capture = cv2.VideoCapture()
         self.is_warning = False
         self.directory = directory
-        self.itemClicked.connect(self.on_item_clicked)
 
-        self.timer_popularlist = QTimer(self)
-        self.timer_popularlist.timeout.connect(self.populate_list)
-        self.timer_popularlist.start(5000)
+        # Model/view ảo hoá: chỉ dòng đang hiển thị mới được vẽ / tải thumbnail
+        self.event_index = get_event_index()
+        if directory:
+            self.event_index.backfill(directory)
+        self.thumbnails = get_thumbnail_cache()
+        self.event_model = EventListModel(self.event_index, self.thumbnails, parent=self)
+        self.setModel(self.event_model)
+        self.setIconSize(self.event_model.icon_size)
+        self.setUniformItemSizes(True)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.clicked.connect(self.on_item_clicked)
+        self.image_loaded.connect(self.show_image)
+
+        # Thêm sự kiện mới khi index báo (thay cho QTimer quét thư mục)
+        self.event_index.events_added.connect(self.on_events_added)
+        self.event_index.events_removed.connect(self.event_model.remove_paths)
 
         self.label = QLabel(self)
 
+    def on_events_added(self, last_id):
+        self.populate_list()
 
     def populate_list(self):
-
-        for filename in os.listdir(self.directory):
-            if filename.lower().endswith(('.jpg', '.jpeg', '.txt')) and filename not in self.list_image:
-                self.list_image.append(filename)
-                name = os.path.splitext(os.path.basename(filename))[0]
-                item = QListWidgetItem(name)
-                if self.count() >= 20:
-                    # Xóa item đầu tiên (cũ nhất) nếu đã đạt giới hạn
-                    self.takeItem(0)
-                    # print(f"delete item{self.takeItem(0).text()}")
-                self.addItem(item)
+        self.event_model.add_new_events()
 
     def decode_frame(self,file_path):
-
-        try:
-            ext = os.path.splitext(file_path)[1].lower()
-
-            if ext == '.txt':
-                with open(file_path, 'r') as text_file:
-                    encoded_string = text_file.read()
-                image_data = base64.b64decode(encoded_string)
-                pixmap = QPixmap()
-                if not pixmap.loadFromData(image_data):
-                    raise ValueError("Cannot load image from base64 data")
+        # Đọc + decode + scale ảnh gốc trên thread nền, hiển thị khi xong (show_image)
+        self.thumbnails.load_full(file_path, self._on_full_image)
+
+    def _on_full_image(self, file_path, data):
+        # chạy trên thread của ThumbnailCache: QImage dùng được ngoài GUI thread (QPixmap thì không)
+        image = None
+        if data:
+            image = QImage.fromData(data)
+            if image.isNull():
+                image = None
             else:
-                if not os.path.exists(file_path):
-                    raise FileNotFoundError(file_path)
-                pixmap = QPixmap(file_path)
-                if pixmap.isNull():
-                    raise ValueError("Cannot load image file")
-
-            dlg = QDialog(self)
-            dlg.setWindowTitle(os.path.basename(file_path))
-            layout = QVBoxLayout(dlg)
-            lbl = QLabel(dlg)
-            lbl.setAlignment(Qt.AlignCenter)
-            lbl.setPixmap(pixmap.scaled(900, 700, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            layout.addWidget(lbl)
-            dlg.resize(920, 720)
-            dlg.exec_()
-
-        except Exception as e:
-            print(f"decode_frame error: {e}")
+                image = image.scaled(900, 700, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.image_loaded.emit(file_path, image)
+
+    def show_image(self, file_path, image):
+        if image is None:
+            print(f"decode_frame error: cannot load {file_path}")
+            return
+        dlg = QDialog(self)
+        dlg.setWindowTitle(os.path.basename(file_path))
+        layout = QVBoxLayout(dlg)
+        lbl = QLabel(dlg)
+        lbl.setAlignment(Qt.AlignCenter)
+        lbl.setPixmap(QPixmap.fromImage(image))
+        layout.addWidget(lbl)
+        dlg.resize(920, 720)
+        dlg.exec_()
 
 
     def initUI(self, camera_name="None"):
@@ -125,9 +268,13 @@ class ImageListWidget(QListWidget):
         self.is_running = False
 
 
-    def on_item_clicked(self,item):
-        # Lấy đường dẫn file từ item đã click
-        name = item.text()
+    def on_item_clicked(self,index):
+        # Lấy đường dẫn file từ dòng đã click
+        file_path = index.data(Qt.UserRole)
+        if file_path and os.path.exists(file_path):
+            self.decode_frame(file_path)
+            return
+        name = index.data(Qt.DisplayRole)
         for ext in ('.jpg', '.jpeg', '.png', '.txt'):
             file_path = os.path.join(self.directory, name + ext)
             if os.path.exists(file_path):
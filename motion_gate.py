@@ -0,0 +1,70 @@
+import time
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Bộ lọc chuyển động rẻ cho 1 camera, chạy trước request_inference.
+
+    - Frame được thu nhỏ (cạnh dài = width px) + grayscale + blur nhẹ, so với frame đã gửi YOLO lần gần nhất.
+    - Tỉ lệ pixel đổi > pixel_threshold (0..255) vượt area_ratio -> có chuyển động -> cho inference.
+      So với frame đã inference (không phải frame ngay trước) nên thay đổi chậm vẫn tích luỹ tới ngưỡng.
+    - Quá max_skip_sec không inference thì vẫn cho 1 frame (ánh sáng đổi dần, người đứng yên...).
+    - Bỏ qua -> caller dùng lại detections lần trước.
+    """
+
+    def __init__(self, width: int = 64, pixel_threshold: int = 12, area_ratio: float = 0.002,
+                 max_skip_sec: float = 5.0):
+        self.width = max(16, int(width))
+        self.pixel_threshold = int(pixel_threshold)
+        self.area_ratio = float(area_ratio)
+        self.max_skip_sec = float(max_skip_sec)
+        self._ref: Optional[np.ndarray] = None
+        self._last_pass_ts = 0.0
+        self.checked = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict[str, Any]]) -> Optional["MotionGate"]:
+        """cfg từ config_data.json ("motion_gate"); None / {} / enabled=false -> không gate."""
+        if not cfg:
+            return None
+        cfg = dict(cfg)
+        if not cfg.pop("enabled", True):
+            return None
+        return cls(**cfg)
+
+    def _small_gray(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        r = self.width / float(max(h, w))
+        small = cv2.resize(frame, (max(1, int(w * r)), max(1, int(h * r))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        # blur nhẹ để nhiễu sensor / nén không bị tính là chuyển động
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    def should_infer(self, frame: np.ndarray) -> bool:
+        """True nếu frame cần gửi YOLO (có chuyển động hoặc đã bỏ qua quá lâu)."""
+        self.checked += 1
+        gray = self._small_gray(frame)
+        now_ts = time.monotonic()
+        moved = True
+        if self._ref is not None and self._ref.shape == gray.shape:
+            diff = cv2.absdiff(gray, self._ref)
+            changed = np.count_nonzero(diff > self.pixel_threshold) / float(diff.size)
+            moved = changed >= self.area_ratio
+        if moved or now_ts - self._last_pass_ts >= self.max_skip_sec:
+            self._ref = gray
+            self._last_pass_ts = now_ts
+            return True
+        self.skipped += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skip_rate": self.skipped / self.checked if self.checked else 0.0,
+        }
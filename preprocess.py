@@ -0,0 +1,86 @@
+import sys
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class PreparedFrame:
+    """
+    Frame từ capture, kèm (tuỳ chọn) ảnh letterbox đã chuẩn bị sẵn cho YOLO.
+
+    - frame: frame BGR gốc (hiển thị, lưu bằng chứng).
+    - tensor: ảnh RGB uint8 (img_size, img_size, 3) đã letterbox, nằm trong ring buffer của capture.
+    - ratio / pad: tham số letterbox để đổi box về toạ độ frame gốc.
+    """
+    frame: np.ndarray
+    tensor: Optional[np.ndarray] = None
+    ratio: float = 1.0
+    pad: Tuple[int, int] = (0, 0)  # (left, top)
+
+
+class Letterboxer:
+    """
+    Letterbox frame về img_size x img_size (giữ tỉ lệ, pad 114 như ultralytics) ngay trên thread capture.
+
+    Ghi vào ring buffer cấp phát sẵn (không cấp phát mỗi frame). Buffer còn được tham chiếu
+    (PreparedFrame trong queue capture, trong hàng đợi / đang predict của engine) thì bỏ qua như
+    FFmpegCapture._next_buffer: thời gian chờ trong engine tăng theo số camera nên không có ring_size
+    cố định nào đủ. Cả ring đang bận thì cấp thêm buffer (tối đa gấp đôi ring_size), sau đó cấp
+    buffer rời cho frame đó -> không bao giờ ghi đè tensor đang được dùng.
+    """
+
+    def __init__(self, img_size: int, ring_size: int = 4, pad_value: int = 114):
+        self.img_size = int(img_size)
+        self.pad_value = int(pad_value)
+        self._ring = [
+            np.full((self.img_size, self.img_size, 3), self.pad_value, dtype=np.uint8)
+            for _ in range(max(2, int(ring_size)))
+        ]
+        self._ring_size = len(self._ring)
+        # hình học letterbox đã ghi trong từng buffer; chỉ fill lại pad khi kích thước frame đổi
+        self._geometry = [None] * len(self._ring)
+        self._idx = 0
+
+    def __call__(self, frame: np.ndarray) -> PreparedFrame:
+        h, w = frame.shape[:2]
+        s = self.img_size
+        r = min(s / h, s / w)
+        nw, nh = int(round(w * r)), int(round(h * r))
+        left, top = (s - nw) // 2, (s - nh) // 2
+
+        idx = self._next_index()
+        geometry = (nw, nh, left, top)
+        if idx is None:
+            buf = np.full((s, s, 3), self.pad_value, dtype=np.uint8)
+        else:
+            buf = self._ring[idx]
+            if self._geometry[idx] != geometry:
+                buf.fill(self.pad_value)
+                self._geometry[idx] = geometry
+
+        if (nw, nh) != (w, h):
+            resized = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        else:
+            resized = frame
+        # BGR -> RGB ngay khi copy vào buffer (ultralytics nhận tensor RGB)
+        buf[top : top + nh, left : left + nw] = resized[..., ::-1]
+        return PreparedFrame(frame=frame, tensor=buf, ratio=r, pad=(left, top))
+
+    def _next_index(self) -> Optional[int]:
+        """Vị trí buffer kế tiếp không còn ai giữ; None nếu ring đã đầy và mọi buffer đều bận."""
+        n = len(self._ring)
+        for step in range(n):
+            idx = (self._idx + step) % n
+            buf = self._ring[idx]
+            # 3 = list ring + biến buf + tham số của getrefcount
+            if sys.getrefcount(buf) <= 3:
+                self._idx = (idx + 1) % n
+                return idx
+        if n < self._ring_size * 2:
+            self._ring.append(np.full((self.img_size, self.img_size, 3), self.pad_value, dtype=np.uint8))
+            self._geometry.append(None)
+            return n
+        return None
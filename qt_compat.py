@@ -0,0 +1,62 @@
+"""
+PyQt5 là tuỳ chọn cho các module lõi (yolo_engine, ...).
+
+Có PyQt5: dùng QObject / pyqtSignal thật (GUI).
+Không có PyQt5 (server headless): fallback tối giản cùng interface connect / disconnect / emit,
+slot được gọi trực tiếp trên thread emit (giống Qt.DirectConnection).
+"""
+import threading
+
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal
+
+    HAS_QT = True
+except ImportError:
+    HAS_QT = False
+
+    class _BoundSignal:
+        def __init__(self):
+            self._lock = threading.Lock()
+            self._slots = []
+
+        def connect(self, slot, *args) -> None:
+            # *args: connection type của Qt, bỏ qua (luôn gọi trực tiếp)
+            with self._lock:
+                self._slots.append(slot)
+
+        def disconnect(self, slot=None) -> None:
+            with self._lock:
+                if slot is None:
+                    self._slots.clear()
+                elif slot in self._slots:
+                    self._slots.remove(slot)
+
+        def emit(self, *args) -> None:
+            with self._lock:
+                slots = list(self._slots)
+            for slot in slots:
+                slot(*args)
+
+    class pyqtSignal:
+        """Khai báo signal ở mức class; mỗi instance có danh sách slot riêng."""
+
+        def __init__(self, *types):
+            self._attr = None
+
+        def __set_name__(self, owner, name):
+            self._attr = f"_signal_{name}"
+
+        def __get__(self, obj, objtype=None):
+            if obj is None:
+                return self
+            sig = obj.__dict__.get(self._attr)
+            if sig is None:
+                sig = obj.__dict__.setdefault(self._attr, _BoundSignal())
+            return sig
+
+    class QObject:
+        def __init__(self, parent=None):
+            self._parent = parent
+
+        def parent(self):
+            return self._parent
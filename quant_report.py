@@ -0,0 +1,51 @@
+import argparse
+
+from ultralytics import YOLO
+
+from yolo_engine import DEFAULT_MODEL_CACHE_DIR, export_model
+
+
+def evaluate(model_path: str, data: str, img_size: int, batch: int) -> dict:
+    """Chạy val trên tập val của data.yaml (CPU), trả về mAP và thời gian inference/ảnh."""
+    model = YOLO(model_path, task="detect")
+    metrics = model.val(data=data, imgsz=img_size, batch=batch, device="cpu", plots=False, verbose=False)
+    return {
+        "map50_95": float(metrics.box.map),
+        "map50": float(metrics.box.map50),
+        "inference_ms": float(metrics.speed.get("inference", 0.0)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Báo cáo độ chính xác / latency của model INT8 (OpenVINO) so với FP32 trên tập val của data.yaml"
+    )
+    parser.add_argument("--model", default="yolo11n.pt")
+    parser.add_argument("--data", default="data.yaml", help="dataset đánh giá (dùng split val)")
+    parser.add_argument("--calib", default="", help="dữ liệu calibrate INT8: data.yaml hoặc thư mục ảnh "
+                                                    "(mặc định: giống --data)")
+    parser.add_argument("--img-size", type=int, default=640)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--cache-dir", default=DEFAULT_MODEL_CACHE_DIR)
+    args = parser.parse_args()
+
+    calib = args.calib or args.data
+    candidates = [
+        ("fp32 torch", args.model),
+        ("fp32 openvino", export_model(args.model, "openvino", args.cache_dir)),
+        ("int8 openvino", export_model(args.model, "openvino_int8", args.cache_dir, calibration_data=calib)),
+    ]
+
+    rows = [(name, evaluate(path, args.data, args.img_size, args.batch)) for name, path in candidates]
+    ref = rows[0][1]
+
+    print(f"{'model':>14} {'mAP50-95':>9} {'ΔmAP':>7} {'mAP50':>7} {'ms/img':>7} {'speedup':>8}")
+    for name, r in rows:
+        delta = r["map50_95"] - ref["map50_95"]
+        speedup = ref["inference_ms"] / r["inference_ms"] if r["inference_ms"] > 0 else 0.0
+        print(f"{name:>14} {r['map50_95']:>9.4f} {delta:>+7.4f} {r['map50']:>7.4f} "
+              f"{r['inference_ms']:>7.2f} {speedup:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
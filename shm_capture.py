@@ -0,0 +1,279 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from preprocess import PreparedFrame
+
+
+# header chung (int64): tổng số frame đã ghi, slot mới nhất (-1: chưa có); còn lại để dành
+_HDR_FRAMES, _HDR_LATEST = 0, 1
+_HDR_FIELDS = 8
+# metadata mỗi slot (int64): seq (lẻ: writer đang ghi), h, w, timestamp (ns), có tensor, pad left, pad top, ratio (float64)
+_SLOT_SEQ, _SLOT_H, _SLOT_W, _SLOT_TS, _SLOT_HAS_TENSOR, _SLOT_PAD_L, _SLOT_PAD_T, _SLOT_RATIO = range(8)
+_SLOT_FIELDS = 8
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    """Mở shared memory do tiến trình khác tạo, không để resource_tracker của tiến trình này unlink khi thoát."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class SharedFrameRing:
+    """
+    Ring buffer frame trên multiprocessing.shared_memory: 1 writer (tiến trình capture) / 1 reader.
+
+    Layout: [header][metadata slot x slots][data slot x slots]; data mỗi slot gồm frame BGR
+    (tối đa max_height x max_width) + ảnh letterbox tensor_size x tensor_size (nếu tensor_size > 0).
+    Đồng bộ kiểu seqlock theo từng slot: writer tăng seq lên lẻ trước khi ghi, lên chẵn khi ghi xong;
+    reader copy frame rồi kiểm tra lại seq, lệch thì đọc lại -> không lock, không pickle.
+    """
+
+    def __init__(self, name: Optional[str] = None, slots: int = 3, max_height: int = 1080, max_width: int = 1920,
+                 tensor_size: int = 0, create: bool = False):
+        self.slots = max(2, int(slots))
+        self.max_height = int(max_height)
+        self.max_width = int(max_width)
+        self.tensor_size = int(tensor_size or 0)
+        self.frame_bytes = self.max_height * self.max_width * 3
+        self.tensor_bytes = self.tensor_size * self.tensor_size * 3
+        self.slot_bytes = self.frame_bytes + self.tensor_bytes
+        meta_bytes = 8 * (_HDR_FIELDS + self.slots * _SLOT_FIELDS)
+
+        self._owner = create
+        if create:
+            self._shm = shared_memory.SharedMemory(create=True, size=meta_bytes + self.slots * self.slot_bytes)
+        else:
+            self._shm = _attach_shm(name)
+        self.name = self._shm.name
+
+        buf = self._shm.buf
+        self._header = np.ndarray((_HDR_FIELDS,), dtype=np.int64, buffer=buf, offset=0)
+        self._meta = np.ndarray((self.slots, _SLOT_FIELDS), dtype=np.int64, buffer=buf, offset=8 * _HDR_FIELDS)
+        self._meta_f = np.ndarray((self.slots, _SLOT_FIELDS), dtype=np.float64, buffer=buf, offset=8 * _HDR_FIELDS)
+        self._data = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=buf, offset=meta_bytes)
+
+        if create:
+            self._header[:] = 0
+            self._header[_HDR_LATEST] = -1
+            self._meta[:] = 0
+        else:
+            # writer trước bị kill giữa lúc ghi -> seq kẹt ở số lẻ; slot đó chưa từng là "mới nhất" nên chỉ cần đưa về chẵn
+            odd = (self._meta[:, _SLOT_SEQ] & 1) == 1
+            self._meta[odd, _SLOT_SEQ] += 1
+
+        self._write_idx = (int(self._header[_HDR_LATEST]) + 1) % self.slots
+        self._last_frames = 0
+
+    def layout(self) -> dict:
+        """Tham số để tiến trình khác attach cùng ring."""
+        return {
+            "slots": self.slots,
+            "max_height": self.max_height,
+            "max_width": self.max_width,
+            "tensor_size": self.tensor_size,
+        }
+
+    def write(self, item: PreparedFrame) -> None:
+        frame = item.frame
+        h, w = frame.shape[:2]
+        tensor = item.tensor
+        ratio, pad = item.ratio, item.pad
+        if h > self.max_height or w > self.max_width:
+            # frame lớn hơn slot: thu nhỏ cho vừa; tensor letterbox tính theo frame gốc nên bỏ
+            r = min(self.max_height / h, self.max_width / w)
+            frame = cv2.resize(frame, (int(w * r), int(h * r)), interpolation=cv2.INTER_AREA)
+            h, w = frame.shape[:2]
+            tensor = None
+        has_tensor = tensor is not None and self.tensor_size > 0 and tensor.shape[:2] == (self.tensor_size,) * 2
+
+        slot = self._write_idx
+        self._write_idx = (slot + 1) % self.slots
+        meta = self._meta[slot]
+        data = self._data[slot]
+
+        meta[_SLOT_SEQ] += 1  # lẻ: đang ghi
+        np.copyto(data[: h * w * 3].reshape(h, w, 3), frame)
+        if has_tensor:
+            np.copyto(data[self.frame_bytes :].reshape(self.tensor_size, self.tensor_size, 3), tensor)
+            meta[_SLOT_PAD_L], meta[_SLOT_PAD_T] = int(pad[0]), int(pad[1])
+            self._meta_f[slot, _SLOT_RATIO] = float(ratio)
+        meta[_SLOT_H], meta[_SLOT_W] = h, w
+        meta[_SLOT_TS] = time.time_ns()
+        meta[_SLOT_HAS_TENSOR] = 1 if has_tensor else 0
+        meta[_SLOT_SEQ] += 1  # chẵn: ghi xong
+
+        self._header[_HDR_LATEST] = slot
+        self._header[_HDR_FRAMES] += 1
+
+    def read_latest(self) -> Optional[PreparedFrame]:
+        """Frame mới nhất chưa đọc (copy sang bộ nhớ của tiến trình gọi); None nếu chưa có frame mới."""
+        for _ in range(4):
+            frames = int(self._header[_HDR_FRAMES])
+            slot = int(self._header[_HDR_LATEST])
+            if frames == self._last_frames or slot < 0:
+                return None
+            meta = self._meta[slot]
+            seq = int(meta[_SLOT_SEQ])
+            if seq & 1:
+                # writer đã quay hết vòng ring và đang ghi đè slot này -> đọc lại slot mới nhất
+                continue
+            h, w = int(meta[_SLOT_H]), int(meta[_SLOT_W])
+            has_tensor = bool(meta[_SLOT_HAS_TENSOR])
+            pad = (int(meta[_SLOT_PAD_L]), int(meta[_SLOT_PAD_T]))
+            ratio = float(self._meta_f[slot, _SLOT_RATIO]) if has_tensor else 1.0
+
+            data = self._data[slot]
+            frame = data[: h * w * 3].reshape(h, w, 3).copy()
+            tensor = None
+            if has_tensor:
+                tensor = data[self.frame_bytes :].reshape(self.tensor_size, self.tensor_size, 3).copy()
+            if int(meta[_SLOT_SEQ]) != seq:
+                continue
+            self._last_frames = frames
+            if tensor is None:
+                return PreparedFrame(frame)
+            return PreparedFrame(frame=frame, tensor=tensor, ratio=ratio, pad=pad)
+        return None
+
+    def close(self) -> None:
+        # bỏ các view numpy trước, nếu không SharedMemory.close() báo BufferError
+        self._header = self._meta = self._meta_f = self._data = None
+        try:
+            self._shm.close()
+        except Exception:
+            pass
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except Exception:
+                pass
+
+
+class ProcessCapture:
+    """
+    Chạy VideoCapture (FFmpegCapture / OpenCV) trong tiến trình con, frame đi qua SharedFrameRing.
+    Decode + letterbox chạy trên core khác, không tranh GIL với UI Qt và worker YOLO.
+
+    - Tiến trình con là interpreter mới chỉ import video_capture (không PyQt/torch).
+    - Tiến trình con tự thoát khi stdin đóng (release() hoặc tiến trình cha chết).
+    - Tiến trình con chết bất thường -> tự chạy lại sau restart_delay_sec.
+    Cùng interface với FFmpegCapture: read_prepared / read / release.
+    """
+
+    def __init__(self, source, logger=None, preprocess_size: Optional[int] = None, slots: int = 3,
+                 max_height: int = 1080, max_width: int = 1920, restart_delay_sec: float = 2.0, **capture_kwargs):
+        self.source = source
+        self.logger = logger
+        self.restart_delay_sec = float(restart_delay_sec)
+        self._capture_kwargs = dict(capture_kwargs, preprocess_size=preprocess_size)
+        self._ring = SharedFrameRing(slots=slots, max_height=max_height, max_width=max_width,
+                                     tensor_size=preprocess_size or 0, create=True)
+        self._proc: Optional[subprocess.Popen] = None
+        self._next_start_ts = 0.0
+        self._lock = threading.Lock()
+        self._running = True
+        self._start_process()
+
+    def _start_process(self) -> None:
+        args = {
+            "shm_name": self._ring.name,
+            "layout": self._ring.layout(),
+            "source": self.source,
+            "capture_kwargs": self._capture_kwargs,
+        }
+        self._proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), json.dumps(args)],
+            stdin=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        self._next_start_ts = time.monotonic() + self.restart_delay_sec
+
+    def _check_process(self) -> None:
+        with self._lock:
+            if not self._running or self._proc is None or self._proc.poll() is None:
+                return
+            if time.monotonic() < self._next_start_ts:
+                return
+            if self.logger:
+                self.logger.warning(f"Capture process exited (code {self._proc.returncode}), restarting: {self.source}")
+            self._start_process()
+
+    def read_prepared(self, timeout: float = 0.5) -> Optional[PreparedFrame]:
+        deadline = time.monotonic() + float(timeout)
+        while True:
+            item = self._ring.read_latest()
+            if item is not None:
+                return item
+            if time.monotonic() >= deadline:
+                self._check_process()
+                return None
+            time.sleep(0.005)
+
+    def read(self, timeout: float = 0.5):
+        item = self.read_prepared(timeout=timeout)
+        return item.frame if item is not None else None
+
+    def release(self) -> None:
+        with self._lock:
+            self._running = False
+            proc, self._proc = self._proc, None
+        if proc is not None:
+            try:
+                proc.stdin.close()
+                proc.wait(timeout=2.0)
+            except Exception:
+                try:
+                    proc.kill()
+                    proc.wait(timeout=1.0)
+                except Exception:
+                    pass
+        self._ring.close()
+
+
+def _capture_process_main(args: dict) -> None:
+    """Vòng lặp của tiến trình con: đọc frame từ VideoCapture, ghi vào shared memory ring."""
+    from video_capture import VideoCapture
+
+    stop = threading.Event()
+
+    def _watch_stdin():
+        # stdin đóng (cha gọi release() hoặc chết) -> dừng
+        try:
+            sys.stdin.buffer.read()
+        except Exception:
+            pass
+        stop.set()
+
+    threading.Thread(target=_watch_stdin, daemon=True).start()
+
+    ring = SharedFrameRing(name=args["shm_name"], **args["layout"])
+    cap = VideoCapture(args["source"], **args["capture_kwargs"])
+    try:
+        while not stop.is_set():
+            item = cap.read_prepared()
+            if item is not None:
+                ring.write(item)
+    finally:
+        cap.release()
+        ring.close()
+
+
+if __name__ == "__main__":
+    _capture_process_main(json.loads(sys.argv[1]))
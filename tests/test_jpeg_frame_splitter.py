@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from ffmpeg_capture import JpegFrameSplitter  # noqa: E402
+
+SOI = JpegFrameSplitter.SOI
+EOI = JpegFrameSplitter.EOI
+
+
+def make_frame(rng: random.Random, size: int) -> bytes:
+    """JPEG giả: SOI + payload không chứa byte 0xFF (không sinh marker giả) + EOI."""
+    payload = bytes(rng.randrange(0, 0xFF) for _ in range(size))
+    return SOI + payload + EOI
+
+
+def make_stream(seed: int = 0, count: int = 20, min_size: int = 10, max_size: int = 3000):
+    rng = random.Random(seed)
+    frames = [make_frame(rng, rng.randint(min_size, max_size)) for _ in range(count)]
+    return frames, b"".join(frames)
+
+
+def split_random(data: bytes, rng: random.Random, max_chunk: int):
+    pos = 0
+    while pos < len(data):
+        n = rng.randint(1, max_chunk)
+        yield data[pos:pos + n]
+        pos += n
+
+
+def feed_all(splitter: JpegFrameSplitter, chunks):
+    out = []
+    for chunk in chunks:
+        splitter.feed(chunk)
+        # memoryview chỉ hợp lệ tới lần feed kế tiếp -> copy ngay
+        out.extend(bytes(f) for f in splitter.frames())
+    return out
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("max_chunk", [3, 64, 4096, 1 << 20])
+def test_random_chunk_boundaries(seed, max_chunk):
+    frames, data = make_stream(seed)
+    splitter = JpegFrameSplitter(chunk_size=1024)
+    got = feed_all(splitter, split_random(data, random.Random(seed + 100), max_chunk))
+    assert got == frames
+    assert splitter.dropped_bytes == 0
+
+
+def test_byte_by_byte():
+    frames, data = make_stream(seed=1, count=5)
+    splitter = JpegFrameSplitter(chunk_size=16)
+    got = feed_all(splitter, (data[i:i + 1] for i in range(len(data))))
+    assert got == frames
+
+
+def test_junk_before_soi_is_dropped():
+    frames, data = make_stream(seed=2, count=3)
+    junk = b"\x00garbage\xff\x01" * 7
+    splitter = JpegFrameSplitter(chunk_size=64)
+    got = feed_all(splitter, split_random(junk + data, random.Random(2), 50))
+    assert got == frames
+    assert splitter.dropped_bytes == len(junk)
+
+
+def test_truncated_trailing_frame_not_emitted():
+    frames, data = make_stream(seed=3, count=4)
+    truncated = frames[-1][: len(frames[-1]) // 2]
+    splitter = JpegFrameSplitter(chunk_size=64)
+    got = feed_all(splitter, split_random(data + truncated, random.Random(3), 200))
+    assert got == frames
+    # phần còn lại tới sau -> frame được ghép đủ
+    rest = frames[-1][len(truncated):]
+    got = feed_all(splitter, [rest])
+    assert got == [frames[-1]]
+
+
+def test_oversized_frame_is_dropped():
+    rng = random.Random(4)
+    small_a = make_frame(rng, 100)
+    huge = make_frame(rng, 5000)
+    small_b = make_frame(rng, 100)
+    splitter = JpegFrameSplitter(chunk_size=64, max_frame_bytes=1000)
+    got = feed_all(splitter, split_random(small_a + huge + small_b, random.Random(4), 64))
+    assert got == [small_a, small_b]
+    assert splitter.dropped_bytes >= len(huge) - 64
@@ -0,0 +1,173 @@
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+ThumbnailCallback = Callable[[str, Optional[bytes]], None]
+
+
+class ThumbnailCache:
+    """
+    Thumbnail JPEG cho ảnh cảnh báo, tạo / đọc trên thread pool (không chạy trên UI thread).
+
+    - 2 tầng: LRU trong RAM (memory_items ảnh, bytes JPEG) -> file trong cache_dir (tên theo sha1 đường dẫn gốc)
+      -> chưa có thì decode ảnh gốc (.jpg hoặc .txt base64), thu nhỏ về width px và ghi vào cache_dir.
+    - prefetch(): gọi khi vừa lưu bằng chứng -> thumbnail có sẵn trước khi UI cần.
+    - request() / load_full(): callback(src, bytes | None) chạy trên thread pool; mỗi ảnh tối đa 1 lần đang tải.
+    - Thư mục cache giữ tối đa max_disk_items file (xoá file cũ nhất).
+    """
+
+    def __init__(self, cache_dir: str = "./.thumbnails", width: int = 160, jpeg_quality: int = 80,
+                 memory_items: int = 1024, workers: int = 2, max_disk_items: int = 20000, logger=None):
+        self.cache_dir = Path(cache_dir)
+        self.width = int(width)
+        self.jpeg_quality = int(jpeg_quality)
+        self.memory_items = max(1, int(memory_items))
+        self.max_disk_items = int(max_disk_items)
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        # src đang tải -> các callback chờ kết quả
+        self._inflight: Dict[str, List[Optional[ThumbnailCallback]]] = {}
+        self._writes = 0
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="ThumbnailCache")
+
+    # --------- public ----------
+    def get(self, src: str) -> Optional[bytes]:
+        """Thumbnail trong RAM (không I/O); None nếu chưa có -> dùng request()."""
+        with self._lock:
+            data = self._memory.get(src)
+            if data is not None:
+                self._memory.move_to_end(src)
+            return data
+
+    def request(self, src: str, callback: ThumbnailCallback) -> None:
+        """Tải thumbnail nền (RAM -> đĩa -> tạo mới) rồi gọi callback; src đang được tải thì chỉ chờ kết quả."""
+        with self._lock:
+            waiting = self._inflight.get(src)
+            if waiting is not None:
+                waiting.append(callback)
+                return
+            self._inflight[src] = [callback]
+        self._pool.submit(self._run, src)
+
+    def prefetch(self, src: str) -> None:
+        self.request(src, None)
+
+    def load_full(self, src: str, callback: ThumbnailCallback) -> None:
+        """Đọc ảnh gốc (bytes JPEG, .txt đã decode base64) trên thread pool -> callback."""
+        self._pool.submit(self._run_full, src, callback)
+
+    # --------- thread pool ----------
+    def _run(self, src: str) -> None:
+        data = None
+        try:
+            data = self._load(src)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"thumbnail error {src}: {e}")
+        finally:
+            with self._lock:
+                callbacks = self._inflight.pop(src, [])
+        for callback in callbacks:
+            if callback is not None:
+                callback(src, data)
+
+    def _run_full(self, src: str, callback: ThumbnailCallback) -> None:
+        try:
+            data = self.read_source(src)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"image load error {src}: {e}")
+            data = None
+        callback(src, data)
+
+    def _load(self, src: str) -> Optional[bytes]:
+        data = self.get(src)
+        if data is not None:
+            return data
+        cached = self._cache_path(src)
+        try:
+            data = cached.read_bytes()
+        except OSError:
+            data = self._generate(src, cached)
+        if data:
+            self._remember(src, data)
+        return data
+
+    def _remember(self, src: str, data: bytes) -> None:
+        with self._lock:
+            self._memory[src] = data
+            self._memory.move_to_end(src)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _cache_path(self, src: str) -> Path:
+        key = hashlib.sha1(os.path.normcase(os.path.abspath(src)).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.jpg"
+
+    @staticmethod
+    def read_source(src: str) -> Optional[bytes]:
+        if not os.path.exists(src):
+            return None
+        if src.lower().endswith(".txt"):
+            with open(src, "r") as f:
+                return base64.b64decode(f.read())
+        with open(src, "rb") as f:
+            return f.read()
+
+    def _generate(self, src: str, cached: Path) -> Optional[bytes]:
+        raw = self.read_source(src)
+        if not raw:
+            return None
+        img = cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        h, w = img.shape[:2]
+        if w > self.width:
+            img = cv2.resize(img, (self.width, max(1, int(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ok:
+            return None
+        data = buf.tobytes()
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_suffix(".part")
+        tmp.write_bytes(data)
+        os.replace(tmp, cached)
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % 256 == 0
+        if trim:
+            self._trim_disk()
+        return data
+
+    def _trim_disk(self) -> None:
+        files = [e for e in os.scandir(self.cache_dir) if e.is_file() and e.name.endswith(".jpg")]
+        if len(files) <= self.max_disk_items:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for entry in files[:len(files) - self.max_disk_items]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+_CACHE_INSTANCE: Optional[ThumbnailCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_thumbnail_cache(**kwargs) -> ThumbnailCache:
+    """Cache dùng chung (engine prefetch, UI đọc); kwargs chỉ có tác dụng ở lần tạo đầu tiên."""
+    global _CACHE_INSTANCE
+    with _CACHE_LOCK:
+        if _CACHE_INSTANCE is None:
+            _CACHE_INSTANCE = ThumbnailCache(**kwargs)
+        return _CACHE_INSTANCE
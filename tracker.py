@@ -0,0 +1,186 @@
+import threading
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU giữa 2 tập box xyxy: (N, 4) x (M, 4) -> (N, M)."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+@dataclass
+class Track:
+    track_id: int
+    box: np.ndarray  # (4,) float32 xyxy, đã làm mượt
+    velocity: np.ndarray  # (4,) px / giây
+    class_id: int
+    confidence: float
+    label: str
+    color: tuple
+    warn: bool
+    last_ts: float
+    hits: int = 1
+    # lần cuối violation của track này được báo (lưu bằng chứng / log); 0: chưa báo
+    reported_ts: float = 0.0
+
+
+@dataclass
+class TrackSnapshot:
+    """Các track còn sống, box dự đoán tới 1 thời điểm (dùng vẽ giữa 2 lần inference)."""
+    track_ids: np.ndarray
+    boxes: np.ndarray
+    class_ids: np.ndarray
+    confidences: np.ndarray
+    labels: List[str]
+    colors: List[tuple]
+    warn_mask: np.ndarray
+
+
+class IoUTracker:
+    """
+    Tracker nhẹ kiểu SORT cho 1 camera: ghép box YOLO với track bằng IoU (greedy, không phân biệt class),
+    box dự đoán theo vận tốc không đổi, làm mượt alpha-beta thay cho Kalman.
+
+    - update(): gọi với kết quả mỗi lần inference (post thread của camera), trả track id cho từng box.
+    - predict(): box các track tới thời điểm bất kỳ -> UI vẽ giữa 2 lần inference.
+    - Track không được ghép quá max_age_sec thì bị xoá; camera inference thưa (periodic, rate_control 1 fps,
+      motion gate bỏ qua) thì tuổi tối đa nới theo khoảng cách trung bình giữa 2 lần update
+      (age_intervals lần), để track còn sống tới lần inference kế tiếp.
+    - Box dự đoán chỉ ngoại suy vận tốc tối đa max_age_sec (track sống lâu hơn thì đứng yên ở vị trí cuối).
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_age_sec: float = 1.0, box_alpha: float = 0.6,
+                 velocity_beta: float = 0.4, age_intervals: float = 2.5):
+        self.iou_threshold = float(iou_threshold)
+        self.max_age_sec = float(max_age_sec)
+        self.age_intervals = float(age_intervals)
+        self.box_alpha = float(box_alpha)
+        self.velocity_beta = float(velocity_beta)
+        self._tracks: List[Track] = []
+        self._next_id = 1
+        # EWMA khoảng cách giữa 2 lần update (giây)
+        self._update_interval = 0.0
+        self._last_update_ts = 0.0
+        # update() chạy trên post thread, predict() trên UI thread
+        self._lock = threading.Lock()
+
+    def _max_age(self) -> float:
+        return max(self.max_age_sec, self.age_intervals * self._update_interval)
+
+    @staticmethod
+    def _predicted_box(track: Track, ts: float, max_dt: float) -> np.ndarray:
+        dt = min(max(ts - track.last_ts, 0.0), max_dt)
+        return track.box + track.velocity * dt
+
+    def update(self, boxes: np.ndarray, class_ids: np.ndarray, confidences: np.ndarray, labels: List[str],
+               colors: List[tuple], warn_mask: np.ndarray, ts: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Ghép detections (đã lọc) vào track. Trả (track_ids (N,), box đã làm mượt (N, 4))."""
+        n = len(boxes)
+        track_ids = np.zeros((n,), dtype=np.int64)
+        smoothed = np.asarray(boxes, dtype=np.float32).copy()
+        with self._lock:
+            if self._last_update_ts > 0 and ts > self._last_update_ts:
+                dt = ts - self._last_update_ts
+                self._update_interval = dt if self._update_interval <= 0 else 0.8 * self._update_interval + 0.2 * dt
+            self._last_update_ts = max(self._last_update_ts, ts)
+            max_age = self._max_age()
+            self._tracks = [t for t in self._tracks if ts - t.last_ts <= max_age]
+            preds = (
+                np.stack([self._predicted_box(t, ts, self.max_age_sec) for t in self._tracks])
+                if self._tracks else np.zeros((0, 4), dtype=np.float32)
+            )
+            iou = box_iou(preds, smoothed)
+
+            # greedy: cặp IoU cao nhất trước
+            matched_tracks = set()
+            matched_dets = set()
+            if iou.size:
+                order = np.argsort(-iou, axis=None)
+                for flat in order:
+                    ti, di = divmod(int(flat), n)
+                    if iou[ti, di] < self.iou_threshold:
+                        break
+                    if ti in matched_tracks or di in matched_dets:
+                        continue
+                    matched_tracks.add(ti)
+                    matched_dets.add(di)
+                    track = self._tracks[ti]
+                    dt = ts - track.last_ts
+                    box = self.box_alpha * smoothed[di] + (1.0 - self.box_alpha) * preds[ti]
+                    if dt > 1e-3:
+                        v = (box - track.box) / dt
+                        track.velocity = self.velocity_beta * v + (1.0 - self.velocity_beta) * track.velocity
+                    track.box = box.astype(np.float32)
+                    self._refresh(track, class_ids[di], confidences[di], labels[di], colors[di], warn_mask[di], ts)
+                    track.hits += 1
+                    track_ids[di] = track.track_id
+                    smoothed[di] = track.box
+
+            for di in range(n):
+                if di in matched_dets:
+                    continue
+                track = Track(
+                    track_id=self._next_id,
+                    box=smoothed[di].copy(),
+                    velocity=np.zeros((4,), dtype=np.float32),
+                    class_id=int(class_ids[di]),
+                    confidence=float(confidences[di]),
+                    label=labels[di],
+                    color=colors[di],
+                    warn=bool(warn_mask[di]),
+                    last_ts=ts,
+                )
+                self._next_id += 1
+                self._tracks.append(track)
+                track_ids[di] = track.track_id
+        return track_ids, smoothed
+
+    @staticmethod
+    def _refresh(track: Track, class_id, confidence, label, color, warn, ts: float) -> None:
+        track.class_id = int(class_id)
+        track.confidence = float(confidence)
+        track.label = label
+        track.color = color
+        track.warn = bool(warn)
+        track.last_ts = ts
+
+    def predict(self, ts: float) -> TrackSnapshot:
+        with self._lock:
+            max_age = self._max_age()
+            tracks = [t for t in self._tracks if ts - t.last_ts <= max_age]
+            boxes = [self._predicted_box(t, ts, self.max_age_sec) for t in tracks]
+            return TrackSnapshot(
+                track_ids=np.asarray([t.track_id for t in tracks], dtype=np.int64),
+                boxes=np.stack(boxes).astype(np.float32) if boxes else np.zeros((0, 4), dtype=np.float32),
+                class_ids=np.asarray([t.class_id for t in tracks], dtype=np.int32),
+                confidences=np.asarray([t.confidence for t in tracks], dtype=np.float32),
+                labels=[t.label for t in tracks],
+                colors=[t.color for t in tracks],
+                warn_mask=np.asarray([t.warn for t in tracks], dtype=bool),
+            )
+
+    def new_violations(self, track_ids: np.ndarray, warn_mask: np.ndarray, ts: float,
+                       repeat_sec: float) -> List[int]:
+        """
+        Track vi phạm chưa được báo (hoặc đã báo quá repeat_sec): đánh dấu đã báo và trả id.
+        1 người vi phạm liên tục chỉ tạo 1 sự kiện thay vì mỗi frame / mỗi 5 giây.
+        """
+        ids = set(int(i) for i, w in zip(track_ids.tolist(), warn_mask.tolist()) if w)
+        if not ids:
+            return []
+        reported = []
+        with self._lock:
+            for track in self._tracks:
+                if track.track_id in ids and (track.reported_ts <= 0 or ts - track.reported_ts >= repeat_sec):
+                    track.reported_ts = ts
+                    reported.append(track.track_id)
+        return reported
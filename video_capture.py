@@ -0,0 +1,258 @@
+import os
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import cv2
+
+from async_capture import get_capture_supervisor
+from ffmpeg_capture import FFmpegCapture
+from shm_capture import ProcessCapture
+from preprocess import Letterboxer, PreparedFrame
+
+if TYPE_CHECKING:
+    # chỉ dùng cho type hint: tiến trình capture con không cần import PyQt
+    from Logging import Logger
+
+# capture decode nhanh hơn fps inference 1 chút: frame đến lệch nhịp (jitter) vẫn có frame sẵn đúng lượt gửi
+CAPTURE_FPS_HEADROOM = 1.25
+# frame đến sớm hơn interval gửi tối đa 10% vẫn được gửi (tránh trượt mất 1 nhịp -> fps inference giảm một nửa)
+SEND_INTERVAL_TOLERANCE = 0.9
+
+
+def capture_fps_for(infer_fps: float | None) -> float | None:
+    """fps capture cho camera inference tối đa infer_fps (None: không giới hạn)."""
+    return infer_fps * CAPTURE_FPS_HEADROOM if infer_fps else None
+
+
+class VideoCapture:
+
+    def __init__(self, name, logger: "Logger" = None, preprocess_size: int | None = None,
+                 capture_fps: float | None = None, capture_mode: str = "continuous",
+                 sparse_interval_sec: float = 5.0, capture_process: bool = False, capture_async: bool = False):
+        self.logger = logger
+        self.source = name
+        self.is_file = isinstance(name, str) and os.path.isfile(name)
+        self.cap = None
+        self.running = True
+        self._last_frame_ok_ts = 0.0
+        self._stall_timeout_sec = 5.0
+        self._reconnect_delay_sec = 2.0
+        self._reconnect_delay_max_sec = 30.0
+        self._ffmpeg: FFmpegCapture | None = None
+        # capture_process: decode trong tiến trình con, frame qua shared memory (không tranh GIL với UI/YOLO)
+        self._process: ProcessCapture | None = None
+        # letterbox sẵn cho YOLO trên thread capture (tuỳ chọn)
+        self._preprocess_size = preprocess_size
+        self._letterbox = Letterboxer(preprocess_size) if preprocess_size else None
+        # tốc độ capture mong muốn: ffmpeg dùng filter fps, OpenCV grab() mọi frame nhưng chỉ retrieve() theo nhịp
+        self._capture_fps = float(capture_fps) if capture_fps and capture_fps > 0 else None
+        self._capture_interval = 1.0 / self._capture_fps if self._capture_fps else 0.0
+        self._last_retrieve_ts = 0.0
+        # chế độ thưa cho camera ưu tiên thấp: "keyframe" (chỉ I-frame, cần ffmpeg) / "periodic"
+        self._capture_mode = capture_mode
+        self._sparse_interval_sec = max(0.5, float(sparse_interval_sec))
+
+        if capture_process:
+            try:
+                self._process = ProcessCapture(self.source, logger=self.logger,
+                                               preprocess_size=self._preprocess_size,
+                                               capture_fps=self._capture_fps,
+                                               capture_mode=self._capture_mode,
+                                               sparse_interval_sec=self._sparse_interval_sec)
+                self.q = None
+                self._t = None
+                return
+            except Exception as e:
+                self._process = None
+                if self.logger:
+                    self.logger.warning(f"ProcessCapture init failed, capture in-process: {e}")
+
+        # Nếu là RTSP và ffmpeg khả dụng: ưu tiên FFmpegCapture (ổn định 24/7)
+        if isinstance(self.source, str) and self.source.lower().startswith("rtsp") and FFmpegCapture.is_available():
+            try:
+                # target_width có thể set theo imgsz nếu bạn muốn; tạm dùng None để giữ nguyên
+                ffmpeg_kwargs = dict(target_width=None, logger=self.logger,
+                                     preprocess_size=self._preprocess_size,
+                                     target_fps=self._capture_fps,
+                                     capture_mode=self._capture_mode,
+                                     sparse_interval_sec=self._sparse_interval_sec)
+                if capture_async:
+                    # capture_async: ffmpeg do event loop asyncio dùng chung quản lý (không thread reader riêng)
+                    self._ffmpeg = get_capture_supervisor(logger=self.logger).open(self.source, **ffmpeg_kwargs)
+                else:
+                    self._ffmpeg = FFmpegCapture(self.source, **ffmpeg_kwargs)
+            except Exception as e:
+                self._ffmpeg = None
+                if self.logger:
+                    self.logger.warning(f"FFmpegCapture init failed, fallback OpenCV: {e}")
+
+        # Fallback OpenCV capture
+        # OpenCV không decode riêng keyframe -> "keyframe" dùng như "periodic";
+        # file video không mở lại được theo chu kỳ -> chỉ lấy 1 frame mỗi sparse_interval_sec
+        self._periodic_reopen = False
+        if self._ffmpeg is None and self._capture_mode in ("keyframe", "periodic"):
+            if self.is_file:
+                self._capture_interval = self._sparse_interval_sec
+            else:
+                self._periodic_reopen = True
+
+        if self._ffmpeg is None:
+            # mở kết nối lần đầu
+            self._open_capture()
+            self.q = queue.Queue(maxsize=1)
+            self._t = threading.Thread(target=self._reader, name=f"VideoReader-{self.source}", daemon=True)
+            self._t.start()
+        else:
+            self.q = None
+            self._t = None
+
+    # read frames as soon as they are available, keeping only most recent one
+    def _reader(self):
+        """
+        Vòng lặp đọc frame với cơ chế reconnect cho RTSP:
+        - Nếu mất kết nối (ret=False), thử mở lại sau một khoảng delay.
+        - Tránh break hẳn thread để RTSP tạm mất tín hiệu không làm crash app.
+        """
+        reconnect_delay = float(self._reconnect_delay_sec)
+        while self.running:
+            # đảm bảo cap đang mở; nếu không, thử mở lại
+            if self.cap is None or not self.cap.isOpened():
+                self._open_capture()
+                if self.cap is None or not self.cap.isOpened():
+                    time.sleep(reconnect_delay)
+                    reconnect_delay = min(reconnect_delay * 2.0, float(self._reconnect_delay_max_sec))
+                    continue
+
+            ret, frame = self._grab_frame()
+            if ret and frame is None:
+                # đã grab nhưng chưa tới nhịp capture_fps -> không decode/convert frame này
+                reconnect_delay = float(self._reconnect_delay_sec)
+                self._last_frame_ok_ts = time.monotonic()
+                continue
+            if not ret:
+                if self.logger:
+                    self.logger.warning(f"FAIL READ FRAME from {self.source}, try reconnect...")
+                else:
+                    print(f"FAIL READ FRAME from {self.source}, try reconnect...")
+                # đóng lại và chờ rồi reconnect
+                try:
+                    self.cap.release()
+                except Exception:
+                    pass
+                self.cap = None
+                time.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2.0, float(self._reconnect_delay_max_sec))
+                continue
+            # reset backoff khi đã đọc được frame
+            reconnect_delay = float(self._reconnect_delay_sec)
+            self._last_frame_ok_ts = time.monotonic()
+
+            item = self._letterbox(frame) if self._letterbox is not None else PreparedFrame(frame)
+            if not self.q.empty():
+                try:
+                    self.q.get_nowait()  # discard previous (unprocessed) frame
+                except queue.Empty:
+                    pass
+            self.q.put(item)
+
+            if self._periodic_reopen:
+                # periodic: đóng stream, ngủ tới lượt kế tiếp rồi mở lại (không decode giữa các lần)
+                try:
+                    self.cap.release()
+                except Exception:
+                    pass
+                self.cap = None
+                wake_ts = time.monotonic() + self._sparse_interval_sec
+                while self.running and time.monotonic() < wake_ts:
+                    time.sleep(0.2)
+        
+            # Không check stall ở đây (vì vừa có frame OK); stall sẽ được phát hiện bởi nhánh read() fail/timeout.
+
+    def _grab_frame(self):
+        """
+        Đọc frame theo nhịp capture_fps: luôn grab() để bám theo stream,
+        chỉ retrieve() khi tới nhịp. Trả về (ret, frame); frame=None nghĩa là frame bị bỏ qua.
+        """
+        if not self._capture_interval:
+            return self.cap.read()
+        if not self.cap.grab():
+            return False, None
+        now_ts = time.monotonic()
+        if now_ts - self._last_retrieve_ts < self._capture_interval:
+            return True, None
+        self._last_retrieve_ts = now_ts
+        return self.cap.retrieve()
+
+    def read_prepared(self, timeout: float = 0.5) -> PreparedFrame | None:
+        """
+        Frame mới nhất kèm ảnh letterbox (nếu bật preprocess_size); chờ tối đa timeout giây.
+        timeout=0: không chờ (UI thread poll bằng QTimer).
+        """
+        if self._process is not None:
+            return self._process.read_prepared(timeout=timeout)
+        if self._ffmpeg is not None:
+            return self._ffmpeg.read_prepared(timeout=timeout)
+        try:
+            if timeout <= 0:
+                return self.q.get_nowait()
+            return self.q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def read(self, timeout: float = 0.5):
+        item = self.read_prepared(timeout=timeout)
+        return item.frame if item is not None else None
+
+    def release(self):
+        try:
+            self.running = False
+            if self._process is not None:
+                self._process.release()
+                self._process = None
+            if self._ffmpeg is not None:
+                self._ffmpeg.release()
+                self._ffmpeg = None
+            if self.cap is not None:
+                self.cap.release()
+        finally:
+            if hasattr(self, '_t') and self._t is not None and self._t.is_alive():
+                try:
+                    self._t.join(timeout=0.2)
+                except Exception:
+                    pass
+
+    def _open_capture(self):
+        """Mở hoặc mở lại VideoCapture với cấu hình phù hợp (RTSP/USB/file)."""
+        try:
+            # Ưu tiên FFmpeg backend cho RTSP để ổn định hơn (nếu build OpenCV có FFmpeg)
+            if isinstance(self.source, str) and self.source.lower().startswith("rtsp"):
+                try:
+                    self.cap = cv2.VideoCapture(self.source, cv2.CAP_FFMPEG)
+                except Exception:
+                    self.cap = cv2.VideoCapture(self.source)
+            else:
+                self.cap = cv2.VideoCapture(self.source)
+
+            # set timeout nếu OpenCV build hỗ trợ (không phải build nào cũng có)
+            try:
+                self.cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 5000)
+            except Exception:
+                pass
+            try:
+                self.cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, 5000)
+            except Exception:
+                pass
+
+            if not self.is_file and self.cap is not None and self.cap.isOpened():
+                try:
+                    self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                except Exception:
+                    pass
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Error opening capture {self.source}: {e}")
+            else:
+                print(f"Error opening capture {self.source}: {e}")
+            self.cap = None
@@ -3,20 +3,32 @@ import queue
 import time
 import os
 import re
-from dataclasses import dataclass
+import json
+import shutil
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Callable, Tuple
 
 import cv2
+import numpy as np
 import torch
-from PyQt5.QtCore import QObject, pyqtSignal
-from PyQt5.QtGui import QImage
 from ultralytics import YOLO
 from ultralytics.utils.plotting import Annotator
 from datetime import datetime
 from unidecode import unidecode
 
-from Logging import Logger
+from event_clips import EventClipService
+from event_index import EventIndex, get_event_index
+from evidence_writer import EvidenceWriter, get_evidence_writer
+from preprocess import PreparedFrame
+from thumbnail_cache import ThumbnailCache, get_thumbnail_cache
+from tracker import IoUTracker
+from qt_compat import QObject, pyqtSignal
+
+if TYPE_CHECKING:
+    # engine chạy được không cần PyQt (headless_service.py); logger chỉ cần info/warning/error
+    from Logging import Logger
 
 
 INVALID_CHARS = r'[^A-Za-z0-9_.-]'
@@ -37,33 +49,532 @@ class CameraState:
     save_dir: Path
     last_warn_ts: float = 0.0
     last_warning_state: bool = False
+    tracker: Optional[IoUTracker] = None
+
+
+@dataclass
+class Detections:
+    """Kết quả thô của 1 frame (numpy, đã chuyển về CPU): box xyxy, confidence, class id."""
+    xyxy: np.ndarray
+    conf: np.ndarray
+    cls: np.ndarray
+
+    @classmethod
+    def from_result(cls, r) -> "Detections":
+        boxes = r.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls(
+                xyxy=np.zeros((0, 4), dtype=np.float32),
+                conf=np.zeros((0,), dtype=np.float32),
+                cls=np.zeros((0,), dtype=np.int32),
+            )
+        return cls(
+            xyxy=boxes.xyxy.cpu().numpy().astype(np.float32, copy=False),
+            conf=boxes.conf.cpu().numpy().astype(np.float32, copy=False),
+            cls=boxes.cls.cpu().numpy().astype(np.int32),
+        )
+
+    def unletterbox(self, ratio: float, pad: Tuple[int, int], shape) -> "Detections":
+        """Đổi box từ toạ độ ảnh letterbox về toạ độ frame gốc (shape = frame.shape)."""
+        if len(self.xyxy) == 0:
+            return self
+        left, top = pad
+        xyxy = (self.xyxy - np.array([left, top, left, top], dtype=np.float32)) / float(ratio)
+        h, w = shape[:2]
+        np.clip(xyxy[:, 0::2], 0, w, out=xyxy[:, 0::2])
+        np.clip(xyxy[:, 1::2], 0, h, out=xyxy[:, 1::2])
+        return Detections(xyxy=xyxy, conf=self.conf, cls=self.cls)
+
+
+@dataclass
+class DetectionResult:
+    """
+    Kết quả gọn cho 1 frame (sau khi lọc yolo_rate + ROI), phát qua detections_ready.
+
+    frame giữ tham chiếu tới frame BGR gốc (không copy); boxes theo toạ độ frame gốc.
+    UI tự vẽ box ở độ phân giải hiển thị, consumer không phải UI dùng trực tiếp mảng numpy.
+    """
+    camera_name: str
+    frame: np.ndarray
+    boxes: np.ndarray  # (N, 4) float32, xyxy
+    class_ids: np.ndarray  # (N,) int32
+    confidences: np.ndarray  # (N,) float32
+    labels: List[str]
+    colors: List[tuple]  # màu RGB cho từng box
+    warn_mask: np.ndarray  # (N,) bool, box nào gây cảnh báo
+    is_warning: bool
+    track_ids: Optional[np.ndarray] = None  # (N,) int64, id track của từng box (None nếu tắt tracking)
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+def render_detections(result: DetectionResult) -> np.ndarray:
+    """Vẽ box/label (+ viền cảnh báo) lên bản sao RGB của frame. Dùng khi cần ảnh bằng chứng."""
+    img = cv2.cvtColor(result.frame, cv2.COLOR_BGR2RGB)
+    annotator = Annotator(img, line_width=2, font_size=16)
+    for box, label, color in zip(result.boxes.tolist(), result.labels, result.colors):
+        annotator.box_label(box, label, color=color)
+    img = annotator.result()
+    if result.is_warning:
+        h, w, _ = img.shape
+        annotator.box_label([5, 5, w - 5, h - 5], "", color=(255, 0, 0))
+        img = annotator.result()
+    return img
+
+
+# Backend inference:
+# - "torch": ultralytics YOLO PyTorch (mặc định, half() khi có CUDA)
+# - "onnx": export .pt -> ONNX (dynamic batch), chạy bằng ONNX Runtime trên CPU
+# - "openvino": export .pt -> OpenVINO IR (dynamic batch), chạy bằng OpenVINO trên CPU
+# - "openvino_int8": như openvino nhưng lượng tử hoá tĩnh INT8 (NNCF), calibrate trên
+#   calibration_data (data.yaml hoặc thư mục ảnh, vd LastDetectionWarning/)
+# Kết quả của backend export vẫn là Results của ultralytics nên phần xử lý box giữ nguyên.
+INFERENCE_BACKENDS = {
+    "torch": None,
+    "onnx": {"format": "onnx", "suffix": ".onnx"},
+    "openvino": {"format": "openvino", "suffix": "_openvino_model"},
+    "openvino_int8": {"format": "openvino", "suffix": "_int8_openvino_model", "int8": True},
+}
+DEFAULT_MODEL_CACHE_DIR = "./model_cache"
+
+_export_lock = threading.Lock()
+
+
+def calibration_yaml(calibration_data: str, model_path: str, cache_dir: str = DEFAULT_MODEL_CACHE_DIR) -> str:
+    """
+    Dữ liệu calibrate INT8 dạng data.yaml cho ultralytics.
+    Nếu calibration_data là thư mục ảnh (vd ./LastDetectionWarning), tạo yaml tạm trỏ vào thư mục đó
+    (calibration chỉ cần ảnh, không cần label); names lấy từ model.
+    """
+    if not os.path.isdir(calibration_data):
+        return calibration_data
+    folder = Path(calibration_data).resolve()
+    names = YOLO(model_path).names
+    if not isinstance(names, dict):
+        names = {i: n for i, n in enumerate(names)}
+    lines = [f"path: {folder.as_posix()}", "train: .", "val: .", "names:"]
+    lines += [f"  {i}: {json.dumps(str(n))}" for i, n in sorted(names.items())]
+    out = Path(cache_dir) / f"calib_{safe_name(folder.name) or 'images'}.yaml"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(out)
+
+
+def export_model(
+    model_path: str,
+    backend: str,
+    cache_dir: str = DEFAULT_MODEL_CACHE_DIR,
+    logger: Optional["Logger"] = None,
+    calibration_data: Optional[str] = None,
+) -> str:
+    """
+    Trả về đường dẫn model cho backend. Với onnx/openvino: export .pt một lần và cache trên đĩa
+    (export lại nếu file .pt mới hơn bản cache). Model đã ở dạng export thì dùng trực tiếp.
+    Backend INT8 cần calibration_data (data.yaml hoặc thư mục ảnh).
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend!r}")
+    spec = INFERENCE_BACKENDS[backend]
+    src = Path(model_path)
+    if spec is None or src.suffix.lower() != ".pt":
+        return model_path
+
+    target = Path(cache_dir) / f"{src.stem}_dynamic{spec['suffix']}"
+    with _export_lock:
+        if target.exists() and (not src.exists() or target.stat().st_mtime >= src.stat().st_mtime):
+            return str(target)
+
+        if logger:
+            logger.info(f"Exporting {model_path} -> {backend} ({target})")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        export_args = {"format": spec["format"], "dynamic": True, "half": False}
+        if spec.get("int8"):
+            if not calibration_data:
+                raise ValueError(f"Backend {backend!r} requires calibration_data (data.yaml or image folder)")
+            export_args["int8"] = True
+            export_args["data"] = calibration_yaml(calibration_data, model_path, cache_dir)
+        exported = Path(YOLO(model_path).export(**export_args))
+        if target.exists():
+            if target.is_dir():
+                shutil.rmtree(target)
+            else:
+                target.unlink()
+        shutil.move(str(exported), str(target))
+        return str(target)
+
+
+SCHEDULE_POLICIES = ("round_robin", "weighted")
+# route camera: worker đã giữ model được nhận thêm camera khi số camera hơn worker rảnh nhất tối đa ngần này
+ROUTE_LOAD_SLACK = 1
+
+
+class _FairScheduler:
+    """
+    Scheduler công bằng theo camera cho YoloEngine (thay cho 1 FIFO queue dùng chung).
+
+    - Mỗi camera giữ đúng 1 slot "frame mới nhất": job mới ghi đè job cũ chưa xử lý,
+      nên camera 30 fps không thể chiếm chỗ của camera chậm.
+    - Chọn job tiếp theo theo round-robin, hoặc weighted round-robin theo priority.
+    - 2 lớp ưu tiên: camera đang "urgent" (cảnh báo gần đây) luôn được chọn trước camera thường,
+      trong cùng lớp vẫn theo policy.
+    - Job chưa được chọn vẫn nằm nguyên trong slot của camera (không bị đẩy lại cuối queue).
+    """
+
+    def __init__(self, policy: str = "round_robin"):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"Unknown schedule policy: {policy!r}")
+        self._policy = policy
+        self._cond = threading.Condition()
+        self._slots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # vòng round-robin theo thứ tự camera xuất hiện
+        self._order: List[str] = []
+        self._rr_index = 0
+        # weighted round-robin (smooth WRR): weight cấu hình + credit hiện tại
+        self._weights: Dict[str, float] = {}
+        self._credits: Dict[str, float] = {}
+        # camera ưu tiên (urgent) tới thời điểm monotonic này
+        self._urgent_until: Dict[str, float] = {}
+        # số frame bị ghi đè khi camera gửi nhanh hơn engine xử lý
+        self.replaced = 0
+
+    def set_priority(self, camera_name: str, weight: float) -> None:
+        with self._cond:
+            self._weights[camera_name] = max(0.01, float(weight))
+
+    def set_urgent(self, camera_name: str, until_ts: float) -> None:
+        """Đưa camera lên lớp ưu tiên tới until_ts (time.monotonic())."""
+        with self._cond:
+            self._urgent_until[camera_name] = float(until_ts)
+
+    def put(self, job: Dict[str, Any]) -> bool:
+        """Ghi job vào slot của camera. Trả về True nếu đã ghi đè 1 job cũ chưa xử lý."""
+        camera_name = job["camera_name"]
+        with self._cond:
+            replaced = camera_name in self._slots
+            if replaced:
+                self.replaced += 1
+            if camera_name not in self._credits:
+                self._weights.setdefault(camera_name, 1.0)
+                self._credits[camera_name] = 0.0
+                self._order.append(camera_name)
+            self._slots[camera_name] = job
+            self._cond.notify()
+            return replaced
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._slots)
+
+    def take(
+        self,
+        max_jobs: int,
+        timeout: float,
+        key: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Lấy tối đa max_jobs job theo chính sách lập lịch.
+
+        Nếu có key: chỉ gom các job cùng key với job được chọn đầu tiên,
+        các job khác key vẫn giữ nguyên slot cho lần take sau.
+        """
+        with self._cond:
+            if not self._slots:
+                self._cond.wait(timeout)
+            if not self._slots:
+                return []
+
+            first_cam = self._pick(list(self._slots.keys()))
+            first_job = self._slots.pop(first_cam)
+            jobs = [first_job]
+            first_key = key(first_job) if key is not None else None
+
+            while len(jobs) < max_jobs and self._slots:
+                candidates = [
+                    cam for cam, job in self._slots.items()
+                    if key is None or key(job) == first_key
+                ]
+                if not candidates:
+                    break
+                cam = self._pick(candidates)
+                jobs.append(self._slots.pop(cam))
+            return jobs
+
+    def _pick(self, candidates: List[str]) -> str:
+        if self._urgent_until:
+            now_ts = time.monotonic()
+            urgent = [cam for cam in candidates if self._urgent_until.get(cam, 0.0) > now_ts]
+            if urgent:
+                candidates = urgent
+        if self._policy == "weighted":
+            total = 0.0
+            best = candidates[0]
+            for cam in candidates:
+                w = self._weights.get(cam, 1.0)
+                total += w
+                self._credits[cam] = self._credits.get(cam, 0.0) + w
+                if self._credits[cam] > self._credits[best]:
+                    best = cam
+            self._credits[best] -= total
+            return best
+
+        # round-robin: camera đầu tiên có job tính từ vị trí con trỏ
+        n = len(self._order)
+        candidate_set = set(candidates)
+        for step in range(n):
+            idx = (self._rr_index + step) % n
+            cam = self._order[idx]
+            if cam in candidate_set:
+                self._rr_index = (idx + 1) % n
+                return cam
+        return candidates[0]
+
+
+class _InferenceWorker:
+    """
+    1 worker inference trong pool của YoloEngine.
+
+    - Scheduler riêng: chỉ nhận job của các camera được route tới worker này.
+    - Cache model riêng: predictor ultralytics không thread-safe, nên mỗi worker giữ
+      bản model "warm" của mình cho các model_path được route tới.
+    """
+
+    def __init__(self, index: int, schedule_policy: str, num_threads: Optional[int]):
+        self.index = index
+        self.scheduler = _FairScheduler(schedule_policy)
+        self.models: Dict[str, YOLO] = {}
+        self.lock = threading.Lock()
+        self.num_threads = num_threads
+        # camera và model_path đã route tới worker này (dùng cho model-affinity)
+        self.cameras: set = set()
+        self.model_paths: set = set()
+        self.thread: Optional[threading.Thread] = None
+        # buffer uint8 (n, img_size, img_size, 3) cấp phát sẵn để gom batch letterbox, key (n, img_size)
+        self.batch_buffers: Dict[tuple, np.ndarray] = {}
+
+
+class _RateController:
+    """
+    Điều chỉnh tần số inference của từng camera (AIMD) để latency end-to-end không vượt target.
+
+    - Mỗi period_sec: lấy latency p90 (submit -> xong post-process) của các kết quả trong kỳ.
+      Quá target_latency_ms hoặc hàng đợi dồn (pending > số camera / 2) -> base_fps *= decrease;
+      dưới 80% target -> base_fps += increase_step (tăng cộng, giảm nhân).
+    - base_fps bị chặn trên bởi năng lực ước lượng: số worker * 1000 / predict ms mỗi frame / số camera.
+    - Camera có hoạt động gần đây (có box, có cảnh báo) được weight cao hơn:
+      fps_camera = clamp(base_fps * weight / weight trung bình, min_fps, max_fps).
+    """
+
+    def __init__(self, num_workers: int, min_fps: float = 1.0, max_fps: float = 10.0, initial_fps: float = 6.0,
+                 target_latency_ms: float = 500.0, period_sec: float = 2.0, increase_step: float = 0.25,
+                 decrease: float = 0.8, activity_gain: float = 1.0):
+        self.num_workers = max(1, int(num_workers))
+        self.min_fps = float(min_fps)
+        self.max_fps = float(max_fps)
+        self.target_latency_ms = float(target_latency_ms)
+        self.period_sec = float(period_sec)
+        self.increase_step = float(increase_step)
+        self.decrease = float(decrease)
+        self.activity_gain = float(activity_gain)
+        self.base_fps = min(max(float(initial_fps), self.min_fps), self.max_fps)
+        self.latency_ms = 0.0
+        self.frame_ms = 0.0  # EWMA thời gian predict mỗi frame
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+        self._activity: Dict[str, float] = {}
+        self._last_update_ts = time.monotonic()
+
+    def observe_batch(self, infer_ms: float, n_jobs: int) -> None:
+        per_frame = infer_ms / max(1, n_jobs)
+        with self._lock:
+            self.frame_ms = per_frame if self.frame_ms <= 0 else 0.9 * self.frame_ms + 0.1 * per_frame
+
+    def observe(self, camera_name: str, total_ms: float, n_boxes: int, is_warning: bool,
+                pending: Callable[[], int]) -> None:
+        x = 2.0 if is_warning else (1.0 if n_boxes else 0.0)
+        with self._lock:
+            self._latencies.append(total_ms)
+            self._activity[camera_name] = 0.8 * self._activity.get(camera_name, 0.0) + 0.2 * x
+            if time.monotonic() - self._last_update_ts < self.period_sec:
+                return
+        # pending() lấy lock của scheduler -> gọi ngoài lock của controller
+        self._update(pending())
+
+    def _update(self, pending: int) -> None:
+        with self._lock:
+            now_ts = time.monotonic()
+            if now_ts - self._last_update_ts < self.period_sec or not self._latencies:
+                return
+            self._last_update_ts = now_ts
+            lat = sorted(self._latencies)
+            self._latencies.clear()
+            self.latency_ms = lat[int(0.9 * (len(lat) - 1))]
+
+            n_cams = max(1, len(self._activity))
+            if self.latency_ms > self.target_latency_ms or pending > max(1, n_cams // 2):
+                self.base_fps *= self.decrease
+            elif self.latency_ms < 0.8 * self.target_latency_ms:
+                self.base_fps += self.increase_step
+            cap = self.capacity_fps() / n_cams
+            if cap > 0:
+                self.base_fps = min(self.base_fps, cap)
+            self.base_fps = min(max(self.base_fps, self.min_fps), self.max_fps)
+
+    def capacity_fps(self) -> float:
+        """Tổng số frame/giây pool worker xử lý được theo predict ms đo được (0: chưa đo)."""
+        return self.num_workers * 1000.0 / self.frame_ms if self.frame_ms > 0 else 0.0
+
+    def fps(self, camera_name: str) -> float:
+        with self._lock:
+            if not self._activity:
+                return self.base_fps
+            mean_w = sum(1.0 + self.activity_gain * a for a in self._activity.values()) / len(self._activity)
+            w = 1.0 + self.activity_gain * self._activity.get(camera_name, 0.0)
+            return min(max(self.base_fps * w / mean_w, self.min_fps), self.max_fps)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "base_fps": self.base_fps,
+                "latency_p90_ms": self.latency_ms,
+                "capacity_fps": self.capacity_fps(),
+            }
+
+
+class CameraChannel(QObject):
+    """Kênh kết quả riêng của 1 camera: mỗi kết quả chỉ đánh thức đúng widget của camera đó."""
+
+    detections_ready = pyqtSignal(object)
 
 
 class YoloEngine(QObject):
     """
     Engine YOLO dùng chung cho nhiều camera.
 
-    - Cache model theo đường dẫn weight.
-    - Worker thread riêng đọc queue các job inference.
-    - Phát tín hiệu result_ready về UI cho từng camera.
+    - Pool worker inference (mặc định 1), job được route theo model_path để mỗi worker
+      giữ model warm của mình; camera luôn đi về cùng 1 worker.
+    - Mỗi worker lấy job từ scheduler công bằng theo camera.
+    - Post pool riêng (lọc box, cảnh báo, lưu ảnh) để worker không bị chặn.
+    - Giao kết quả theo camera: channel(camera_name) (Qt signal riêng) hoặc subscribe(callback);
+      detections_ready (broadcast) vẫn phát cho consumer cần tất cả camera. UI tự vẽ overlay.
     """
 
-    result_ready = pyqtSignal(str, QImage, bool, dict)
+    detections_ready = pyqtSignal(object)
 
-    def __init__(self, parent: Optional[QObject] = None):
+    def __init__(
+        self,
+        parent: Optional[QObject] = None,
+        schedule_policy: str = "round_robin",
+        num_workers: int = 1,
+        threads_per_worker: Optional[int] = None,
+        num_post_workers: int = 2,
+        backend: str = "torch",
+        model_cache_dir: str = DEFAULT_MODEL_CACHE_DIR,
+        calibration_data: Optional[str] = None,
+        rate_control: Optional[Dict[str, Any]] = None,
+        escalation: Optional[Dict[str, Any]] = None,
+        tracking: Optional[Dict[str, Any]] = None,
+        evidence: Optional[Dict[str, Any]] = None,
+        event_clips: Optional[Dict[str, Any]] = None,
+        event_index: Optional[Dict[str, Any]] = None,
+        thumbnails: Optional[Dict[str, Any]] = None,
+    ):
         super().__init__(parent)
-        self._models: Dict[str, YOLO] = {}
-        self._device = 0 if torch.cuda.is_available() else "cpu"
-        # Queue nhỏ để tránh tăng latency khi overload (hợp cho 4–6 camera)
-        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=16)
-        self._lock = threading.Lock()
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown inference backend: {backend!r}")
+        self._backend = backend
+        self._model_cache_dir = model_cache_dir
+        self._calibration_data = calibration_data
+        # backend export (onnx/openvino) chạy CPU; torch dùng GPU nếu có
+        self._use_cuda = backend == "torch" and torch.cuda.is_available()
+        self._device = 0 if self._use_cuda else "cpu"
         self._running = True
         self._camera_states: Dict[str, CameraState] = {}
-        # kích thước batch tối đa cho inference
-        self._batch_size = 4
-
-        self._worker = threading.Thread(target=self._worker_loop, name="YoloEngineWorker", daemon=True)
-        self._worker.start()
+        # kích thước batch tối đa cho 1 lần predict
+        self._batch_size = 8
+        # số job tối đa lấy ra mỗi vòng worker trước khi nhóm theo model
+        self._drain_size = 16
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "jobs": 0,
+            "infer_ms": 0.0,
+            "post_jobs": 0,
+            "post_ms": 0.0,
+            "post_wait_ms": 0.0,
+        }
+        self._priorities: Dict[str, float] = {}
+        # rate_control (tuỳ chọn): {"enabled": true, "min_fps": 1, "max_fps": 10, "target_latency_ms": 500, ...}
+        self._rate: Optional[_RateController] = None
+        rate_control = dict(rate_control or {})
+        # key lạ (gõ sai) -> TypeError ngay khi khởi tạo, giống các mục config khác
+        if rate_control and rate_control.pop("enabled", True):
+            self._rate = _RateController(num_workers=max(1, int(num_workers)), **rate_control)
+        # escalation: camera có cảnh báo / phát hiện ngã -> lên đầu hàng đợi + tăng fps trong hold_sec,
+        # rồi giảm dần về bình thường trong decay_sec. {"enabled": false} để tắt.
+        escalation = dict(escalation or {})
+        self._escalation_enabled = bool(escalation.pop("enabled", True))
+        self._escalation_hold_sec = float(escalation.pop("hold_sec", 10.0))
+        self._escalation_decay_sec = float(escalation.pop("decay_sec", 20.0))
+        self._escalation_fps_boost = float(escalation.pop("fps_boost", 2.0))
+        self._escalation_max_fps = float(escalation.pop("max_fps", self._rate.max_fps if self._rate else 10.0))
+        if escalation:
+            # key lạ (gõ sai) -> lỗi ngay khi khởi tạo, giống rate_control
+            raise TypeError(f"unknown escalation config keys: {', '.join(sorted(escalation))}")
+        self._escalated_at: Dict[str, float] = {}
+        # tracking: IoUTracker mỗi camera (track id, box mượt, box dự đoán giữa 2 lần inference,
+        # lưu bằng chứng 1 lần / người vi phạm). {"enabled": false} để tắt.
+        tracking = dict(tracking or {})
+        self._tracking_enabled = bool(tracking.pop("enabled", True))
+        self._violation_repeat_sec = float(tracking.pop("violation_repeat_sec", 60.0))
+        self._tracker_params = tracking
+        # evidence: tham số EvidenceWriter (num_workers, max_queue, jpeg_quality, fsync_interval_sec, ...)
+        self._evidence_writer: EvidenceWriter = get_evidence_writer(**(evidence or {}))
+        # event_clips: ring JPEG mỗi camera (record_frame) -> clip pre/post-roll khi lưu bằng chứng
+        # (tắt mặc định, bật bằng {"enabled": true})
+        self._clips: Optional[EventClipService] = EventClipService.from_config(event_clips)
+        # event_index: SQLite (WAL) các ảnh bằng chứng đã lưu, UI đọc thay cho quét thư mục
+        event_index = dict(event_index or {})
+        self._event_index: Optional[EventIndex] = (
+            get_event_index(**event_index) if event_index.pop("enabled", True) else None
+        )
+        # thumbnails: tạo thumbnail ngay khi lưu bằng chứng (danh sách cảnh báo trên UI không phải decode ảnh gốc)
+        thumbnails = dict(thumbnails or {})
+        self._thumbnails: Optional[ThumbnailCache] = (
+            get_thumbnail_cache(**thumbnails) if thumbnails.pop("enabled", True) else None
+        )
+
+        # Registry giao kết quả theo camera
+        self._dispatch_lock = threading.Lock()
+        self._channels: Dict[str, CameraChannel] = {}
+        self._subscribers: Dict[str, List[Callable[[DetectionResult], None]]] = {}
+
+        # Pool worker: mỗi camera 1 slot frame mới nhất trong scheduler của worker được route tới
+        # -> latency mỗi camera bị chặn trên kể cả khi 16+ camera.
+        self._route_lock = threading.Lock()
+        self._routes: Dict[str, _InferenceWorker] = {}
+        self._workers: List[_InferenceWorker] = []
+        for i in range(max(1, int(num_workers))):
+            worker = _InferenceWorker(i, schedule_policy, threads_per_worker)
+            worker.thread = threading.Thread(
+                target=self._worker_loop,
+                args=(worker,),
+                name=f"YoloEngineWorker-{i}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+        for worker in self._workers:
+            worker.thread.start()
+
+        # Post pool: lọc box, cảnh báo, lưu ảnh; mỗi thread có queue riêng
+        self._post_lock = threading.Lock()
+        self._post_routes: Dict[str, int] = {}
+        self._post_queues: List["queue.Queue"] = []
+        self._post_threads: List[threading.Thread] = []
+        for i in range(max(1, int(num_post_workers))):
+            q: "queue.Queue" = queue.Queue(maxsize=self._drain_size)
+            t = threading.Thread(target=self._post_loop, args=(q,), name=f"YoloEnginePost-{i}", daemon=True)
+            self._post_queues.append(q)
+            self._post_threads.append(t)
+            t.start()
 
     # --------- public API ----------
     def request_inference(
@@ -77,14 +588,22 @@ class YoloEngine(QObject):
         classes,
         colors,
         enable_flags,
-        logger: Optional[Logger] = None,
+        logger: Optional["Logger"] = None,
+        priority: Optional[float] = None,
+        prepared: Optional[PreparedFrame] = None,
     ) -> None:
         """
-        Đẩy một frame vào queue để engine xử lý.
-        Nếu queue đầy, drop frame cũ nhất để ưu tiên frame mới.
+        Đẩy một frame vào slot của camera để engine xử lý.
+        Nếu camera còn frame chưa xử lý, frame cũ bị thay bằng frame mới.
+        priority (tuỳ chọn): weight cho policy "weighted", mặc định 1.0.
+        prepared (tuỳ chọn): frame đã letterbox sẵn ở capture; dùng khi đúng img_size.
         """
         if frame is None:
             return
+        if prepared is not None and (prepared.tensor is None or prepared.tensor.shape[0] != int(img_size)):
+            prepared = None
+        if priority is not None:
+            self.set_camera_priority(camera_name, priority)
 
         job = {
             "camera_name": camera_name,
@@ -97,58 +616,214 @@ class YoloEngine(QObject):
             "colors": colors,
             "enable_flags": enable_flags or {},
             "logger": logger,
+            "prepared": prepared,
+            "t_submit": time.monotonic(),
         }
 
-        try:
-            self._queue.put_nowait(job)
-        except queue.Full:
-            # drop oldest rồi thử lại
-            try:
-                _ = self._queue.get_nowait()
-            except queue.Empty:
-                pass
-            try:
-                self._queue.put_nowait(job)
-            except queue.Full:
-                # nếu vẫn đầy thì bỏ qua frame này
-                if logger:
-                    logger.warning("YOLO queue overloaded, dropping frame")
+        self._route(camera_name, model_path).scheduler.put(job)
 
-    def stop(self):
-        """Dừng worker thread."""
+    def set_camera_priority(self, camera_name: str, weight: float) -> None:
+        """Đặt weight lập lịch cho camera (chỉ có tác dụng với policy "weighted")."""
+        with self._route_lock:
+            self._priorities[camera_name] = float(weight)
+            worker = self._routes.get(camera_name)
+        if worker is not None:
+            worker.scheduler.set_priority(camera_name, weight)
+
+    def channel(self, camera_name: str) -> CameraChannel:
+        """
+        Kênh Qt riêng của camera (tạo nếu chưa có). Nên gọi từ UI thread, ví dụ:
+        engine.channel(name).detections_ready.connect(widget._on_detections)
+        """
+        with self._dispatch_lock:
+            ch = self._channels.get(camera_name)
+            if ch is None:
+                ch = CameraChannel(self)
+                self._channels[camera_name] = ch
+            return ch
+
+    def subscribe(self, camera_name: str, callback: Callable[[DetectionResult], None]) -> None:
+        """Đăng ký callback (không cần Qt) cho 1 camera. Callback chạy trên post thread của engine."""
+        with self._dispatch_lock:
+            self._subscribers.setdefault(camera_name, []).append(callback)
+
+    def unsubscribe(self, camera_name: str, callback: Callable[[DetectionResult], None]) -> None:
+        with self._dispatch_lock:
+            callbacks = self._subscribers.get(camera_name, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def camera_fps(self, camera_name: str, default: Optional[float] = None) -> Optional[float]:
+        """
+        Tần số inference khuyến nghị cho camera: theo rate_control nếu bật, không thì default;
+        camera đang escalation được nhân fps_boost (giảm dần theo escalation_level).
+        """
+        base = self._rate.fps(camera_name) if self._rate is not None else default
+        if base is None:
+            return None
+        level = self.escalation_level(camera_name)
+        if level > 0.0:
+            boosted = base * (1.0 + (self._escalation_fps_boost - 1.0) * level)
+            return max(base, min(boosted, self._escalation_max_fps))
+        return base
+
+    def predicted_result(self, camera_name: str, frame, ts: Optional[float] = None) -> Optional[DetectionResult]:
+        """
+        Box các track của camera dự đoán tới thời điểm ts (mặc định: bây giờ), gắn với frame mới
+        -> UI vẽ box bám theo vật thể giữa 2 lần inference.
+        None nếu tắt tracking / chưa có kết quả / không còn track sống -> caller dùng lại detections lần trước.
+        """
+        state = self._camera_states.get(camera_name)
+        if state is None or state.tracker is None:
+            return None
+        snap = state.tracker.predict(time.monotonic() if ts is None else ts)
+        if len(snap.track_ids) == 0:
+            return None
+        boxes = snap.boxes
+        if len(boxes):
+            h, w = frame.shape[:2]
+            np.clip(boxes[:, 0::2], 0, w, out=boxes[:, 0::2])
+            np.clip(boxes[:, 1::2], 0, h, out=boxes[:, 1::2])
+        return DetectionResult(
+            camera_name=camera_name,
+            frame=frame,
+            boxes=boxes,
+            class_ids=snap.class_ids,
+            confidences=snap.confidences,
+            labels=snap.labels,
+            colors=snap.colors,
+            warn_mask=snap.warn_mask,
+            is_warning=bool(snap.warn_mask.any()),
+            track_ids=snap.track_ids,
+            meta={"predicted": True},
+        )
+
+    def record_frame(self, camera_name: str, frame, ts: Optional[float] = None) -> None:
+        """
+        Đưa frame hiển thị (mọi frame, không chỉ frame gửi inference) vào ring clip của camera.
+        Rẻ khi chưa tới lượt (record_fps); encode JPEG chạy trên thread pool của EventClipService.
+        """
+        if self._clips is not None:
+            self._clips.push(camera_name, frame, ts)
+
+    def escalation_level(self, camera_name: str) -> float:
+        """1.0 trong hold_sec sau cảnh báo gần nhất, giảm tuyến tính về 0 trong decay_sec."""
+        ts = self._escalated_at.get(camera_name)
+        if ts is None:
+            return 0.0
+        elapsed = time.monotonic() - ts
+        if elapsed <= self._escalation_hold_sec:
+            return 1.0
+        if self._escalation_decay_sec <= 0:
+            return 0.0
+        return max(0.0, 1.0 - (elapsed - self._escalation_hold_sec) / self._escalation_decay_sec)
+
+    def max_camera_fps(self, default: Optional[float] = None) -> Optional[float]:
+        """
+        fps cao nhất camera_fps() có thể trả về (capture nên decode theo mức này):
+        trần rate_control (hoặc default), nâng lên theo escalation nếu bật.
+        """
+        base = self._rate.max_fps if self._rate is not None else default
+        if base is None:
+            return None
+        if self._escalation_enabled and self._escalation_fps_boost > 1.0:
+            return max(base, min(base * self._escalation_fps_boost, self._escalation_max_fps))
+        return base
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê engine: số batch, số job, độ lấp đầy batch trung bình, frame bị ghi đè,
+        thời gian trung bình mỗi stage (predict theo batch, post-process theo job).
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_batch_occupancy"] = stats["jobs"] / stats["batches"] if stats["batches"] else 0.0
+        stats["avg_infer_ms"] = stats["infer_ms"] / stats["batches"] if stats["batches"] else 0.0
+        stats["avg_post_ms"] = stats["post_ms"] / stats["post_jobs"] if stats["post_jobs"] else 0.0
+        stats["avg_post_wait_ms"] = stats["post_wait_ms"] / stats["post_jobs"] if stats["post_jobs"] else 0.0
+        stats["pending"] = sum(w.scheduler.pending() for w in self._workers)
+        stats["replaced"] = sum(w.scheduler.replaced for w in self._workers)
+        stats["workers"] = len(self._workers)
+        if self._rate is not None:
+            stats["rate_control"] = self._rate.stats()
+        stats["evidence"] = self._evidence_writer.get_stats()
+        if self._clips is not None:
+            stats["event_clips"] = self._clips.get_stats()
+        return stats
+
+    def stop(self, timeout: float = 1.0):
+        """Dừng các worker thread."""
         self._running = False
+        for worker in self._workers:
+            if worker.thread is not None and worker.thread.is_alive():
+                worker.thread.join(timeout=timeout)
+        for t in self._post_threads:
+            if t.is_alive():
+                t.join(timeout=timeout)
+        # ghi nốt ảnh bằng chứng đang chờ (writer dùng chung nên không dừng hẳn)
+        self._evidence_writer.flush(timeout=timeout)
+        if self._clips is not None:
+            self._clips.stop(timeout=timeout)
 
     # --------- nội bộ ----------
-    def _get_model(self, model_path: str, logger: Optional[Logger]) -> YOLO:
-        with self._lock:
-            if model_path in self._models:
-                return self._models[model_path]
-
+    def _route(self, camera_name: str, model_path: str) -> _InferenceWorker:
+        """
+        Chọn worker cho camera (cố định sau lần đầu).
+        Ưu tiên worker đã giữ model_path (không load thêm model), miễn là số camera của nó không vượt
+        worker rảnh nhất quá ROUTE_LOAD_SLACK; nếu không thì chọn worker ít camera nhất (load thêm model).
+        Chỉ ưu tiên model thì 1 model dồn hết camera vào 1 worker; chỉ ưu tiên tải thì mọi worker load mọi model.
+        """
+        with self._route_lock:
+            worker = self._routes.get(camera_name)
+            if worker is not None:
+                return worker
+            least = min(len(w.cameras) for w in self._workers)
+            candidates = [w for w in self._workers if len(w.cameras) <= least + ROUTE_LOAD_SLACK]
+            worker = min(
+                candidates,
+                key=lambda w: (model_path not in w.model_paths, len(w.cameras), w.index),
+            )
+            worker.cameras.add(camera_name)
+            worker.model_paths.add(model_path)
+            self._routes[camera_name] = worker
+            if camera_name in self._priorities:
+                worker.scheduler.set_priority(camera_name, self._priorities[camera_name])
+            return worker
+
+    def _get_model(self, worker: _InferenceWorker, model_path: str, logger: Optional["Logger"]) -> YOLO:
+        with worker.lock:
+            if model_path in worker.models:
+                return worker.models[model_path]
+
+            runtime_path = export_model(
+                model_path, self._backend, self._model_cache_dir, logger, self._calibration_data
+            )
             if logger:
-                logger.info(f"Loading YOLO model: {model_path}")
-            model = YOLO(model_path)
+                logger.info(f"Loading YOLO model: {runtime_path} [{self._backend}] (worker {worker.index})")
+            model = YOLO(runtime_path, task="detect")
 
-            try:
-                model.fuse()
-                if hasattr(model, "model") and hasattr(model.model, "fuse"):
-                    model.model.fuse()
-            except Exception:
-                pass
-
-            if torch.cuda.is_available():
+            if self._backend == "torch":
                 try:
-                    model.to("cuda")
-                    if hasattr(model, "model") and hasattr(model.model, "half"):
-                        model.model.half()
+                    model.fuse()
+                    if hasattr(model, "model") and hasattr(model.model, "fuse"):
+                        model.model.fuse()
                 except Exception:
                     pass
 
-            try:
-                model.eval()
-            except Exception:
-                pass
+                if self._use_cuda:
+                    try:
+                        model.to("cuda")
+                        if hasattr(model, "model") and hasattr(model.model, "half"):
+                            model.model.half()
+                    except Exception:
+                        pass
 
-            self._models[model_path] = model
+                try:
+                    model.eval()
+                except Exception:
+                    pass
+
+            worker.models[model_path] = model
             return model
 
     def _get_camera_state(self, camera_name: str) -> CameraState:
@@ -160,64 +835,66 @@ class YoloEngine(QObject):
                 camera_name=camera_name,
                 camera_slug=slug,
                 save_dir=save_dir,
+                tracker=IoUTracker(**self._tracker_params) if self._tracking_enabled else None,
             )
         return self._camera_states[camera_name]
 
-    def _worker_loop(self):
-        torch.set_grad_enabled(False)
-        while self._running:
-            try:
-                first_job = self._queue.get(timeout=0.5)
-            except queue.Empty:
-                continue
+    @staticmethod
+    def _batch_key(job: Dict[str, Any]):
+        # yolo_rate không nằm trong key: predict với conf thấp nhất của nhóm,
+        # rồi lọc lại theo yolo_rate của từng job trong _process_single.
+        # Job đã letterbox sẵn ở capture đi nhóm riêng (predict bằng tensor).
+        return job.get("model_path"), job.get("img_size"), job.get("prepared") is not None
 
-            if first_job is None:
-                continue
+    def _group_jobs(self, jobs: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Nhóm các job đã lấy ra theo (model_path, img_size), giữ thứ tự của scheduler.
+        Mỗi nhóm là 1 lần model.predict; nhóm lớn hơn _batch_size được chia nhỏ.
+        """
+        groups: "OrderedDict[Any, List[Dict[str, Any]]]" = OrderedDict()
+        for job in jobs:
+            groups.setdefault(self._batch_key(job), []).append(job)
 
-            # Gom batch các job tương thích (cùng model_path, img_size, yolo_rate)
-            jobs = [first_job]
-            model_path = first_job["model_path"]
-            img_size = first_job["img_size"]
-            yolo_rate = first_job["yolo_rate"]
+        batches = []
+        for group in groups.values():
+            for i in range(0, len(group), self._batch_size):
+                batches.append(group[i : i + self._batch_size])
+        return batches
 
-            try:
-                while len(jobs) < self._batch_size:
-                    next_job = self._queue.get_nowait()
-                    if next_job is None:
-                        continue
-                    if (
-                        next_job.get("model_path") == model_path
-                        and next_job.get("img_size") == img_size
-                        and next_job.get("yolo_rate") == yolo_rate
-                    ):
-                        jobs.append(next_job)
-                    else:
-                        # không batch được cùng nhóm, đưa lại vào queue để xử lý sau
-                        self._queue.put(next_job)
-                        break
-            except queue.Empty:
-                pass
+    def _worker_loop(self, worker: _InferenceWorker):
+        torch.set_grad_enabled(False)
+        if worker.num_threads:
+            # số thread intra-op cho các lần predict của worker này (CPU)
+            torch.set_num_threads(int(worker.num_threads))
+        while self._running:
+            # Lấy hết job đang chờ (tối đa _drain_size) rồi nhóm theo model,
+            # thay vì dừng gom batch ở job khác nhóm đầu tiên.
+            jobs = worker.scheduler.take(self._drain_size, timeout=0.5)
+            if not jobs:
+                continue
 
-            try:
-                self._process_batch(jobs)
-            except Exception as e:
-                # nếu lỗi, cố gắng log theo logger của job đầu
-                logger = first_job.get("logger")
-                if logger:
-                    logger.error(f"YoloEngine batch job error: {e}")
+            for batch in self._group_jobs(jobs):
+                try:
+                    self._process_batch(worker, batch)
+                except Exception as e:
+                    # nếu lỗi, cố gắng log theo logger của job đầu
+                    logger = batch[0].get("logger")
+                    if logger:
+                        logger.error(f"YoloEngine batch job error: {e}")
 
-    def _process_batch(self, jobs: list[Dict[str, Any]]) -> None:
+    def _process_batch(self, worker: _InferenceWorker, jobs: list[Dict[str, Any]]) -> None:
         if not jobs:
             return
 
-        # Dùng tham số chung từ job đầu tiên cho phần predict (đã đảm bảo tương thích trong _worker_loop)
+        # model_path/img_size chung cho cả nhóm (đã nhóm trong _group_jobs);
+        # conf dùng ngưỡng thấp nhất, mỗi job tự lọc lại theo yolo_rate riêng.
         base_job = jobs[0]
         model_path = base_job["model_path"]
         img_size = base_job["img_size"]
-        yolo_rate = base_job["yolo_rate"]
-        logger: Optional[Logger] = base_job.get("logger")
+        yolo_rate = min(job["yolo_rate"] for job in jobs)
+        logger: Optional["Logger"] = base_job.get("logger")
 
-        model = self._get_model(model_path, logger)
+        model = self._get_model(worker, model_path, logger)
 
         predict_params = {
             "imgsz": img_size,
@@ -226,24 +903,69 @@ class YoloEngine(QObject):
             "verbose": False,
             "agnostic_nms": True,
         }
-        if torch.cuda.is_available():
+        if self._use_cuda:
             predict_params["half"] = True
 
-        frames = [job["frame"] for job in jobs]
-        results = model.predict(frames, **predict_params)
-
-        for job, frame, r in zip(jobs, frames, results):
-            self._process_single(job, frame, r, model)
+        t_start = time.monotonic()
+        if base_job.get("prepared") is not None:
+            # Frame đã letterbox ở thread capture: ghép batch tensor, bỏ qua preprocess của ultralytics;
+            # box trả về theo toạ độ letterbox nên đổi lại về toạ độ frame gốc.
+            results = model.predict(self._batch_tensor(worker, jobs, img_size), **predict_params)
+            dets = []
+            for job, r in zip(jobs, results):
+                prepared = job["prepared"]
+                dets.append(Detections.from_result(r).unletterbox(prepared.ratio, prepared.pad, prepared.frame.shape))
+        else:
+            frames = [job["frame"] for job in jobs]
+            results = model.predict(frames, **predict_params)
+            dets = [Detections.from_result(r) for r in results]
+        names = self._model_names(model)
+        t_end = time.monotonic()
+
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["jobs"] += len(jobs)
+            self._stats["infer_ms"] += (t_end - t_start) * 1000.0
+        if self._rate is not None:
+            self._rate.observe_batch((t_end - t_start) * 1000.0, len(jobs))
+
+        # Phần vẽ/cảnh báo chạy ở post pool -> worker quay lại predict batch kế tiếp ngay
+        for job, det in zip(jobs, dets):
+            job["t_infer_start"] = t_start
+            job["t_infer_end"] = t_end
+            self._submit_post(job, det, names)
+
+    def _batch_tensor(self, worker: _InferenceWorker, jobs: List[Dict[str, Any]], img_size: int) -> torch.Tensor:
+        """
+        Tensor BCHW float [0, 1] từ các buffer letterbox của capture.
+        1 frame: dùng thẳng buffer uint8; nhiều frame: gom vào buffer batch uint8 cấp phát sẵn của worker
+        (không cấp phát mỗi batch). Ép kiểu half/float và contiguous vẫn tạo 1 tensor mới (trên GPU nếu có).
+        """
+        n = len(jobs)
+        if n == 1:
+            batch = jobs[0]["prepared"].tensor[None]
+        else:
+            key = (n, img_size)
+            batch = worker.batch_buffers.get(key)
+            if batch is None:
+                batch = np.empty((n, img_size, img_size, 3), dtype=np.uint8)
+                worker.batch_buffers[key] = batch
+            for i, job in enumerate(jobs):
+                np.copyto(batch[i], job["prepared"].tensor)
+        t = torch.from_numpy(batch).to(self._device if self._use_cuda else "cpu", non_blocking=True)
+        t = t.permute(0, 3, 1, 2)
+        t = t.half() if self._use_cuda else t.float()
+        return t.div_(255.0).contiguous()
 
     def _process_job(self, job: Dict[str, Any]) -> None:
-        """Fallback xử lý 1 job (giữ lại cho tương thích, dùng chung với logic batch)."""
+        """Fallback xử lý 1 job đồng bộ (giữ lại cho tương thích, dùng chung với logic batch)."""
         frame = job["frame"]
         model_path = job["model_path"]
         img_size = job["img_size"]
         yolo_rate = job["yolo_rate"]
-        logger: Optional[Logger] = job.get("logger")
+        logger: Optional["Logger"] = job.get("logger")
 
-        model = self._get_model(model_path, logger)
+        model = self._get_model(self._route(job["camera_name"], model_path), model_path, logger)
 
         predict_params = {
             "imgsz": img_size,
@@ -252,49 +974,96 @@ class YoloEngine(QObject):
             "verbose": False,
             "agnostic_nms": True,
         }
-        if torch.cuda.is_available():
+        if self._use_cuda:
             predict_params["half"] = True
 
         results = model.predict(frame, **predict_params)
-        r = results[0]
-        self._process_single(job, frame, r, model)
+        self._process_single(job, Detections.from_result(results[0]), self._model_names(model))
+
+    @staticmethod
+    def _model_names(model: YOLO) -> Dict[int, str]:
+        try:
+            names = getattr(model, "names", None)
+            if isinstance(names, dict):
+                return dict(names)
+            if names is not None:
+                return {i: n for i, n in enumerate(names)}
+        except Exception:
+            pass
+        return {}
+
+    # --------- post-processing stage ----------
+    def _submit_post(self, job: Dict[str, Any], det: "Detections", names: Dict[int, str]) -> None:
+        """
+        Đẩy (job, detections) sang post pool. Camera luôn đi về cùng 1 post thread
+        nên trạng thái cảnh báo của camera không bị xử lý song song/đảo thứ tự.
+        """
+        camera_name = job["camera_name"]
+        with self._post_lock:
+            idx = self._post_routes.get(camera_name)
+            if idx is None:
+                idx = len(self._post_routes) % len(self._post_queues)
+                self._post_routes[camera_name] = idx
+        job["t_post_submit"] = time.monotonic()
+        # chờ khi post pool quá tải (backpressure), không để queue phình vô hạn
+        while self._running:
+            try:
+                self._post_queues[idx].put((job, det, names), timeout=0.5)
+                return
+            except queue.Full:
+                continue
 
-    def _process_single(self, job: Dict[str, Any], frame, r, model: YOLO) -> None:
+    def _post_loop(self, q: "queue.Queue"):
+        while self._running:
+            try:
+                item = q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            job, det, names = item
+            t_start = time.monotonic()
+            try:
+                self._process_single(job, det, names)
+            except Exception as e:
+                logger = job.get("logger")
+                if logger:
+                    logger.error(f"YoloEngine post-process error: {e}")
+            t_end = time.monotonic()
+            with self._stats_lock:
+                self._stats["post_ms"] += (t_end - t_start) * 1000.0
+                self._stats["post_wait_ms"] += (t_start - job.get("t_post_submit", t_start)) * 1000.0
+                self._stats["post_jobs"] += 1
+
+    def _process_single(self, job: Dict[str, Any], det: "Detections", names: Dict[int, str]) -> None:
+        t_post_start = time.monotonic()
         camera_name = job["camera_name"]
+        frame = job["frame"]
         roi_check = job["roi_check"]
         classes = job["classes"]
         colors = job["colors"]
         yolo_rate = job["yolo_rate"]
         enable_flags = job["enable_flags"]
-        logger: Optional[Logger] = job.get("logger")
+        logger: Optional["Logger"] = job.get("logger")
 
         state = self._get_camera_state(camera_name)
 
         x1, x2, y1, y2 = roi_check
 
-        cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        annotator = Annotator(cv2image, line_width=2, font_size=16)
-
         is_warning = False
-        boxes = r.boxes
-
-        for box in boxes:
-            try:
-                if float(box.conf) <= float(yolo_rate):
-                    continue
-            except Exception:
-                pass
-
-            b = box.xyxy[0]
-            try:
-                bx1, by1, bx2, by2 = [float(v) for v in b]
-            except Exception:
-                bx1, by1, bx2, by2 = float(b[0]), float(b[1]), float(b[2]), float(b[3])
+        keep_idx: List[int] = []
+        labels: List[str] = []
+        box_colors: List[tuple] = []
+        warn_flags: List[bool] = []
+
+        for i, ((bx1, by1, bx2, by2), conf_val, ci) in enumerate(
+            zip(det.xyxy.tolist(), det.conf.tolist(), det.cls.tolist())
+        ):
+            if conf_val <= float(yolo_rate):
+                continue
 
             if bx1 < x1 or by1 < y1 or bx2 > x2 or by2 > y2:
                 continue
 
-            ci = int(box.cls)
+            ci = int(ci)
             helmet_ok = ci == 5 and enable_flags.get("helmet", False)
             fell_ok = ci == 9 and enable_flags.get("fell", False)
             jacket_ok = ci == 8 and enable_flags.get("jacket", False)
@@ -304,15 +1073,7 @@ class YoloEngine(QObject):
             except Exception:
                 name_from_cfg = None
 
-            name_from_model = None
-            try:
-                if hasattr(model, "names") and model.names is not None:
-                    if isinstance(model.names, dict):
-                        name_from_model = model.names.get(ci)
-                    elif 0 <= ci < len(model.names):
-                        name_from_model = model.names[ci]
-            except Exception:
-                pass
+            name_from_model = names.get(ci)
 
             obj_name = (
                 name_from_cfg
@@ -320,70 +1081,168 @@ class YoloEngine(QObject):
                 else (name_from_model if name_from_model else str(ci))
             )
 
-            try:
-                conf_val = float(box.conf)
-            except Exception:
-                conf_val = 0.0
-
-            label = f"{obj_name} {conf_val:.2f}"
-            color_warn = tuple(colors[ci]) if 0 <= ci < len(colors) else (255, 0, 0)
-
-            if helmet_ok or fell_ok or jacket_ok:
-                is_warning = True
-                annotator.box_label([bx1, by1, bx2, by2], label, color=color_warn)
+            box_warn = bool(helmet_ok or fell_ok or jacket_ok)
+            is_warning = is_warning or box_warn
+            keep_idx.append(i)
+            labels.append(f"{obj_name} {conf_val:.2f}")
+            warn_flags.append(box_warn)
+            if box_warn:
+                box_colors.append(tuple(colors[ci]) if 0 <= ci < len(colors) else (255, 0, 0))
             else:
-                annotator.box_label([bx1, by1, bx2, by2], label, color=(0, 255, 0))
+                box_colors.append((0, 255, 0))
+
+        result = DetectionResult(
+            camera_name=camera_name,
+            frame=frame,
+            boxes=det.xyxy[keep_idx],
+            class_ids=det.cls[keep_idx],
+            confidences=det.conf[keep_idx],
+            labels=labels,
+            colors=box_colors,
+            warn_mask=np.asarray(warn_flags, dtype=bool),
+            is_warning=is_warning,
+        )
+
+        if state.tracker is not None:
+            result.track_ids, result.boxes = state.tracker.update(
+                result.boxes, result.class_ids, result.confidences, labels, box_colors, result.warn_mask,
+                job.get("t_submit", t_post_start),
+            )
 
-        img = annotator.result()
-        h, w, _ = img.shape
+        # cảnh báo hoặc phát hiện ngã (class 9, kể cả khi chưa bật cờ fell) -> ưu tiên camera
+        if self._escalation_enabled and (is_warning or bool((result.class_ids == 9).any())):
+            self._escalate(camera_name)
 
+        evidence_path = None
+        clip_path = None
+        violation_tracks: List[int] = []
         if is_warning:
-            annotator.box_label([5, 5, w - 5, h - 5], "", color=(255, 0, 0))
-            img = annotator.result()
             now_ts = time.time()
-            if now_ts - state.last_warn_ts > 5.0:
+            save = now_ts - state.last_warn_ts > 5.0
+            if save and state.tracker is not None:
+                # tracking: chỉ lưu khi có người vi phạm mới (hoặc đã báo quá violation_repeat_sec)
+                violation_tracks = state.tracker.new_violations(
+                    result.track_ids, result.warn_mask, time.monotonic(), self._violation_repeat_sec
+                )
+                save = bool(violation_tracks)
+            if save:
                 try:
                     ts = datetime.now().strftime("%Y%m%d%H%M%S")
                     file_path = state.save_dir / f"{state.camera_slug}_{ts}_warning.jpg"
-                    threading.Thread(
-                        target=self._save_image,
-                        args=(str(file_path), img.copy(), logger),
-                        daemon=True,
-                    ).start()
+                    if self._clips is not None:
+                        clip_path = self._clips.trigger(
+                            camera_name, self._clips.clip_path(state.camera_slug, ts), job.get("t_submit")
+                        )
+                    # chỉ render ảnh có box khi thực sự lưu bằng chứng (tối đa 1 lần / 5s / camera);
+                    # encode + ghi đĩa trên EvidenceWriter, hàng đợi đầy thì bỏ ảnh này
+                    if self._evidence_writer.submit(str(file_path), render_detections(result), key=camera_name,
+                                                    rgb=True, logger=logger,
+                                                    on_done=self._evidence_indexer(result, clip_path, violation_tracks)):
+                        evidence_path = str(file_path)
+                    elif logger:
+                        logger.warning("Evidence writer busy, warning image dropped")
                     state.last_warn_ts = time.time()
                 except Exception as e:
                     if logger:
                         logger.error(f"save image start error: {e}")
 
-        if is_warning != state.last_warning_state:
-            state.last_warning_state = is_warning
+        if violation_tracks:
+            if logger:
+                logger.warning(f"Violation detected (track {', '.join(map(str, violation_tracks))})")
+        elif is_warning != state.last_warning_state and state.tracker is None:
             if is_warning:
                 if logger:
                     logger.warning("Violation detected")
+        state.last_warning_state = is_warning
 
-        q_image = QImage(img.data, w, h, w * 3, QImage.Format_RGB888).copy()
-        meta = {
+        t_post_end = time.monotonic()
+        result.meta = {
             "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "timings": self._job_timings(job, t_post_start, t_post_end),
         }
-        self.result_ready.emit(camera_name, q_image, is_warning, meta)
+        if evidence_path:
+            result.meta["evidence_path"] = evidence_path
+        if clip_path:
+            result.meta["clip_path"] = clip_path
+        if violation_tracks:
+            result.meta["violation_track_ids"] = violation_tracks
+        if self._rate is not None:
+            self._rate.observe(camera_name, result.meta["timings"]["total_ms"], len(result.boxes), is_warning,
+                               lambda: sum(w.scheduler.pending() for w in self._workers))
+        self._dispatch(result, logger)
+
+    def _evidence_indexer(self, result: DetectionResult, clip_path: Optional[str],
+                          track_ids: List[int]) -> Optional[Callable[[str], None]]:
+        """
+        Callback của EvidenceWriter: ảnh đã ghi xong -> tạo thumbnail nền, thêm vào event index
+        (camera, lớp vi phạm, conf).
+        """
+        if self._event_index is None and self._thumbnails is None:
+            return None
+        warn = result.warn_mask
+        # label dạng "<class> <conf>" -> chỉ giữ tên lớp
+        labels = sorted({label.rsplit(" ", 1)[0] for label, w in zip(result.labels, warn.tolist()) if w})
+        confidence = float(result.confidences[warn].max()) if warn.any() else 0.0
+        ts = time.time()
+        index = self._event_index
+        thumbnails = self._thumbnails
+        camera_name = result.camera_name
+
+        def on_done(path: str) -> None:
+            if thumbnails is not None:
+                thumbnails.prefetch(path)
+            if index is not None:
+                index.add(camera_name, path, ts=ts, labels=labels, confidence=confidence, clip_path=clip_path,
+                          track_ids=track_ids)
+
+        return on_done
+
+    def _escalate(self, camera_name: str) -> None:
+        now_ts = time.monotonic()
+        self._escalated_at[camera_name] = now_ts
+        with self._route_lock:
+            worker = self._routes.get(camera_name)
+        if worker is not None:
+            worker.scheduler.set_urgent(camera_name, now_ts + self._escalation_hold_sec + self._escalation_decay_sec)
+
+    def _dispatch(self, result: DetectionResult, logger: Optional["Logger"]) -> None:
+        """Giao kết quả tới đúng camera (channel + callback), rồi broadcast detections_ready."""
+        with self._dispatch_lock:
+            ch = self._channels.get(result.camera_name)
+            callbacks = list(self._subscribers.get(result.camera_name, ()))
+        if ch is not None:
+            ch.detections_ready.emit(result)
+        for cb in callbacks:
+            try:
+                cb(result)
+            except Exception as e:
+                if logger:
+                    logger.error(f"YoloEngine subscriber error: {e}")
+        self.detections_ready.emit(result)
 
     @staticmethod
-    def _save_image(file_path: str, img_rgb, logger: Optional[Logger]):
-        try:
-            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
-            img_bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
-            cv2.imwrite(file_path, img_bgr)
-        except Exception as e:
-            if logger:
-                logger.error(f"save image error: {e}")
+    def _job_timings(job: Dict[str, Any], t_post_start: float, t_post_end: float) -> Dict[str, float]:
+        """Thời gian từng stage (ms): chờ scheduler, predict (cả batch), chờ post pool, post-process."""
+        t_submit = job.get("t_submit", t_post_start)
+        t_infer_start = job.get("t_infer_start", t_post_start)
+        t_infer_end = job.get("t_infer_end", t_post_start)
+        t_post_submit = job.get("t_post_submit", t_post_start)
+        return {
+            "queue_ms": (t_infer_start - t_submit) * 1000.0,
+            "infer_ms": (t_infer_end - t_infer_start) * 1000.0,
+            "post_wait_ms": (t_post_start - t_post_submit) * 1000.0,
+            "post_ms": (t_post_end - t_post_start) * 1000.0,
+            "total_ms": (t_post_end - t_submit) * 1000.0,
+        }
 
 
 _ENGINE_INSTANCE: Optional[YoloEngine] = None
 
 
-def get_yolo_engine() -> YoloEngine:
+def get_yolo_engine(**kwargs) -> YoloEngine:
+    """Engine dùng chung; kwargs (num_workers, ...) chỉ có tác dụng ở lần tạo đầu tiên."""
     global _ENGINE_INSTANCE
     if _ENGINE_INSTANCE is None:
-        _ENGINE_INSTANCE = YoloEngine()
+        _ENGINE_INSTANCE = YoloEngine(**kwargs)
     return _ENGINE_INSTANCE
 